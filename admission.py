@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import jsonify, request
+
+
+class UploadsBusy(Exception):
+    """Raised when an upload cannot be admitted; rendered as a 503."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many uploads in progress')
+        self.retry_after = retry_after
+
+
+class UploadGate:
+    """Bounds concurrent image decodes by count and by estimated bitmap memory.
+
+    Requests that cannot start immediately wait in a bounded queue; once the
+    queue is full, or the wait exceeds ``UPLOAD_QUEUE_TIMEOUT``, they fail fast
+    with :class:`UploadsBusy`. Limits apply per process.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._cond = threading.Condition()
+        self.max_concurrency = 1
+        self.memory_budget = 0
+        self.queue_size = 0
+        self.queue_timeout = 0
+        self.retry_after = 1
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = True
+        self.max_concurrency = app.config.get('UPLOAD_MAX_CONCURRENCY') or os.cpu_count() or 1
+        self.memory_budget = app.config.get('UPLOAD_MEMORY_BUDGET', 256 * 1024 * 1024)
+        self.queue_size = app.config.get('UPLOAD_QUEUE_SIZE', 8)
+        self.queue_timeout = app.config.get('UPLOAD_QUEUE_TIMEOUT', 10)
+        self.retry_after = app.config.get('UPLOAD_RETRY_AFTER', 5)
+        self._reset_stats()
+        app.extensions['upload_gate'] = self
+        app.register_error_handler(UploadsBusy, _uploads_busy)
+
+    def _reset_stats(self):
+        self.active = 0
+        self.memory_in_use = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _fits(self, cost):
+        if self.active >= self.max_concurrency:
+            return False
+        # A single oversized image is still admitted when nothing else runs
+        return self.active == 0 or self.memory_in_use + cost <= self.memory_budget
+
+    @contextmanager
+    def admit(self, cost):
+        """Hold a slot (and ``cost`` bytes of budget) for the duration of the block."""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        with self._cond:
+            if not self._fits(cost):
+                if self.queued >= self.queue_size:
+                    self.rejected += 1
+                    raise UploadsBusy(self.retry_after)
+                self.queued += 1
+                try:
+                    deadline = start + self.queue_timeout
+                    while not self._fits(cost):
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            if not self._fits(cost):
+                                self.rejected += 1
+                                raise UploadsBusy(self.retry_after)
+                finally:
+                    self.queued -= 1
+            waited = time.perf_counter() - start
+            self.active += 1
+            self.memory_in_use += cost
+            self.admitted += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.memory_in_use -= cost
+                self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'active': self.active,
+                'queue_depth': self.queued,
+                'memory_in_use': self.memory_in_use,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_max': self.wait_seconds_max,
+            }
+
+
+def estimate_decode_cost(img):
+    """Approximate peak bytes needed to process ``img``, from its header alone.
+
+    Pillow holds every multi-band image at 4 bytes per pixel (and palette
+    images are converted to RGB), and ``exif_transpose``/``convert`` build a
+    new bitmap while the decoded one is still alive, so the peak is two
+    full-size bitmaps. Measured peaks for 24 MP JPEGs and RGBA PNGs are
+    within half a megabyte of this when rotated, and well under it otherwise.
+    """
+    width, height = img.size
+    pixel = 1 if img.mode in ('1', 'L') else 4
+    return 2 * width * height * pixel
+
+
+def _uploads_busy(error):
+    message = 'The server is busy processing other uploads. Please try again shortly.'
+    headers = {'Retry-After': str(error.retry_after)}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': message}), 503, headers
+    return message, 503, headers
+
+
+upload_gate = UploadGate()
@@ -5,17 +5,51 @@ from extensions import db, migrate, csrf
 
 
 def create_app(config_name=None):
+    """Build the app without starting background threads.
+
+    Only the server entry points start the file worker (``wsgi.init_worker``
+    and this module's ``__main__``), so CLI commands and process pools that
+    build an app never run a thread that deletes files.
+    """
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'development')
     
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    # Processes that build their own copy of this app (static export workers)
+    app.config['CONFIG_NAME'] = config_name
     config[config_name].init_app(app)
     
+    import database
+    import replicas
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config)
     db.init_app(app)
-    migrate.init_app(app, db)
+    database.init_app(app)
+    replicas.init_app(app)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
     csrf.init_app(app)
     
+    import metrics
+    metrics.init_app(app)
+    
+    import profiling
+    profiling.init_app(app)
+    
+    import querylog
+    querylog.init_app(app)
+    
+    import startup
+    startup.init_app(app)
+    
+    import assets
+    assets.init_app(app)
+    
+    import pwa
+    pwa.init_app(app)
+    
+    import sprites
+    sprites.init_app(app)
+    
     # Import models after db initialization to avoid circular imports
     from models import Wine
     
@@ -24,6 +58,15 @@ def create_app(config_name=None):
     app.register_blueprint(wine.bp)
     app.register_blueprint(api.bp)
     
+    from admission import upload_gate
+    upload_gate.init_app(app)
+    
+    from storage import file_worker
+    file_worker.init_app(app)
+    
+    from commands import register_commands
+    register_commands(app)
+    
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
         return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
@@ -36,13 +79,20 @@ def create_app(config_name=None):
 
 
 if __name__ == '__main__':
+    from flask_migrate import upgrade
+    
     app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade()
     
     # Get server configuration from environment
     host = os.environ.get('HOST', '0.0.0.0')
     port = int(os.environ.get('PORT', 8080))
     debug = os.environ.get('FLASK_ENV', 'development') == 'development'
     
+    # With the reloader, only the child process serves requests
+    file_worker = app.extensions['file_worker']
+    if file_worker.enabled and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        file_worker.start()
+    
     app.run(debug=debug, host=host, port=port)
\ No newline at end of file
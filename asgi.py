@@ -0,0 +1,166 @@
+"""Async, read-only variant of the JSON API for ASGI servers.
+
+    uvicorn --factory asgi:create_asgi_app --workers 2
+
+Serves the read endpoints of the ``api`` blueprint with identical payloads,
+using SQLAlchemy's asyncio engine, and streams uploaded images without
+blocking the event loop. Statements come from :mod:`queries`, shared with the
+sync routes. ``/api/wines/<id>/similar`` stays on the sync app: it is CPU
+bound and needs the in-process similarity index.
+"""
+import os
+from contextlib import asynccontextmanager
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+import queries
+import sprites
+from config import basedir, config as configs
+from database import engine_options, install_sqlite_pragmas
+from models import Wine
+
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def load_settings(config_name=None):
+    config_name = config_name or os.environ.get('FLASK_ENV', 'development')
+    config_class = configs[config_name]
+    return {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
+
+
+def async_database_url(settings):
+    """``ASYNC_DATABASE_URL``, or the sync database URL with an async driver."""
+    if settings.get('ASYNC_DATABASE_URL'):
+        return make_url(settings['ASYNC_DATABASE_URL'])
+    url = make_url(settings['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {url.drivername}; set ASYNC_DATABASE_URL")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+    if backend == 'sqlite' and url.database and url.database != ':memory:' \
+            and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(basedir, 'instance', url.database))
+    return url
+
+
+def create_engine_for(settings):
+    url = async_database_url(settings)
+    options = engine_options(settings, url.render_as_string(hide_password=False))
+    # Same sizing as the sync pool, but an asyncio-aware pool class
+    if 'poolclass' in options:
+        options['poolclass'] = AsyncAdaptedQueuePool
+    engine = create_async_engine(url, **options)
+    install_sqlite_pragmas(engine.sync_engine, settings)
+    return engine
+
+
+def _int_arg(request, name, default=None):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def _paginated(request, stmt, page, per_page, with_sprites=False):
+    items, count = queries.page_statements(stmt, page, per_page)
+    async with request.app.state.sessions() as session:
+        wines = (await session.scalars(items)).all()
+        total = await session.scalar(count)
+    cells = None
+    if with_sprites:
+        cells = sprites.sprite_cells(wines, request.app.state.sprites, request.app.state.settings)
+    return JSONResponse(queries.page_payload(wines, total, page, per_page,
+                                             queries.page_count(total, per_page), sprites=cells))
+
+
+async def search(request):
+    stmt = queries.search_wines(
+        request.query_params.get('q', '').strip(),
+        _int_arg(request, 'rating'),
+        _int_arg(request, 'year_from'),
+        _int_arg(request, 'year_to'),
+    )
+    return await _paginated(request, stmt, _int_arg(request, 'page', 1), _int_arg(request, 'per_page', 20),
+                            with_sprites=True)
+
+
+async def get_wine(request):
+    async with request.app.state.sessions() as session:
+        wine = await session.get(Wine, request.path_params['wine_id'])
+    if wine is None:
+        raise HTTPException(404)
+    return JSONResponse(wine.to_dict())
+
+
+async def get_wines(request):
+    stmt = queries.list_wines(request.query_params.get('sort_by', 'date_added'),
+                              request.query_params.get('order', 'desc'))
+    return await _paginated(request, stmt, _int_arg(request, 'page', 1), _int_arg(request, 'per_page', 20))
+
+
+async def get_suggestions(request):
+    query = request.query_params.get('q', '').strip()
+    if not query or len(query) < 2:
+        return JSONResponse({'suggestions': []})
+
+    statements = queries.suggestions(query)
+    async with request.app.state.sessions() as session:
+        wine_names = (await session.scalars(statements['wine'])).all()
+        vineyard_names = (await session.scalars(statements['vineyard'])).all()
+    return JSONResponse(queries.suggestions_payload(wine_names, vineyard_names))
+
+
+async def get_stats(request):
+    async with request.app.state.sessions() as session:
+        total_wines = await session.scalar(queries.wine_count())
+        if total_wines == 0:
+            return JSONResponse(queries.stats_payload(0))
+        statements = queries.stats_statements()
+        payload = queries.stats_payload(
+            total_wines,
+            await session.scalar(statements['average_rating']),
+            (await session.execute(statements['rating_distribution'])).all(),
+            (await session.execute(statements['wines_by_year'])).all(),
+            (await session.execute(statements['top_vineyards'])).all(),
+        )
+    return JSONResponse(payload)
+
+
+async def http_error(request, exc):
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code)
+
+
+def create_asgi_app(config_name=None):
+    settings = load_settings(config_name)
+    engine = create_engine_for(settings)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    routes = [
+        Route('/api/search', search),
+        Route('/api/wines', get_wines),
+        Route('/api/wines/suggestions', get_suggestions),
+        Route('/api/wines/{wine_id:int}', get_wine),
+        Route('/api/stats', get_stats),
+        Mount('/uploads/sprites', StaticFiles(directory=sprites.sprite_folder(settings), check_dir=False)),
+        Mount('/uploads/thumbnails', StaticFiles(directory=settings['THUMBNAIL_FOLDER'], check_dir=False)),
+        Mount('/uploads', StaticFiles(directory=settings['UPLOAD_FOLDER'], check_dir=False)),
+    ]
+    app = Starlette(routes=routes, lifespan=lifespan, exception_handlers={HTTPException: http_error})
+    app.state.settings = settings
+    app.state.sprites = sprites.SpriteIndex(sprites.sprite_folder(settings))
+    app.state.engine = engine
+    app.state.sessions = async_sessionmaker(engine, expire_on_commit=False)
+    return app
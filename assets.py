@@ -0,0 +1,160 @@
+"""Fingerprinted static assets and response compression.
+
+``flask build-assets`` minifies the files in ``ASSET_SOURCES`` and writes
+content-hashed copies plus ``.gz``/``.br`` variants under ``static/dist``,
+with a manifest mapping source names to built ones. Templates link assets
+through ``asset_url()``, which falls back to the plain file when no build
+exists, so development works without a build step.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import brotli
+from flask import current_app, request, send_from_directory, url_for
+
+
+ASSET_SOURCES = ('css/style.css', 'js/main.js')
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def minify(filename, source):
+    if filename.endswith('.css'):
+        import rcssmin
+        return rcssmin.cssmin(source)
+    if filename.endswith('.js'):
+        import rjsmin
+        return rjsmin.jsmin(source)
+    return source
+
+
+def hashed_name(filename, content, length=10):
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:length]}{ext}'
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def read_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def build_assets(static_folder, sources=ASSET_SOURCES):
+    """Build every source; returns the new manifest.
+
+    Files from the previous build are kept so pages rendered before a deploy
+    can still load them; anything older is removed.
+    """
+    build_root = os.path.join(static_folder, BUILD_DIR)
+    previous = read_manifest(static_folder)
+    manifest = {}
+    for filename in sources:
+        with open(os.path.join(static_folder, filename), encoding='utf-8') as f:
+            content = minify(filename, f.read()).encode('utf-8')
+        built = hashed_name(filename, content)
+        path = os.path.join(build_root, built)
+        _write(path, content)
+        # mtime=0 keeps the gzip output reproducible for identical input
+        _write(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        _write(path + '.br', brotli.compress(content, quality=11))
+        manifest[filename] = f'{BUILD_DIR}/{built}'
+
+    keep = {os.path.join(static_folder, name) for name in list(manifest.values()) + list(previous.values())}
+    for directory, _, files in os.walk(build_root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name != MANIFEST_NAME and _source_of(path) not in keep:
+                os.remove(path)
+
+    _write(os.path.join(build_root, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def _source_of(path):
+    for _, suffix in PRECOMPRESSED:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def asset_url(filename):
+    """URL of the built copy of ``filename``, or the plain static file."""
+    manifest = current_app.extensions.get('asset_manifest', {})
+    return url_for('static', filename=manifest.get(filename, filename))
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def serve_static(filename):
+    """Flask's static view, plus long-lived caching and precompressed variants
+    for built assets."""
+    app = current_app
+    if not filename.startswith(BUILD_DIR + '/'):
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in PRECOMPRESSED:
+        if _accepts(encoding) and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """Compress large JSON and text responses for clients that accept it.
+
+    HTML pages are never compressed here: they carry the CSRF token next to
+    reflected user input, and the compressed size would leak the token.
+    """
+    config = current_app.config
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if _accepts('br'):
+        encoding, body = 'br', brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    elif _accepts('gzip'):
+        encoding, body = 'gzip', gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'])
+    else:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The encoded body differs byte for byte from the one the ETag names
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.extensions['asset_manifest'] = read_manifest(app.static_folder)
+    app.add_template_global(asset_url)
+    app.view_functions['static'] = serve_static
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.after_request(compress_response)
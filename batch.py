@@ -0,0 +1,116 @@
+"""Several ``api`` reads in one ``POST /api/batch`` round trip.
+
+Sub-requests are dispatched straight to the view functions, so they skip the
+WSGI round trip and the per-request hooks, which run once for the batch as a
+whole: a profile covers the whole batch, and its reads go to the replica
+chosen for it. Sequential sub-requests share the batch's app context and
+database session; with ``parallel`` each runs on a worker thread with its own,
+reading from the batch's replica.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from flask import current_app, g, request
+from flask.ctx import RequestContext
+from flask.globals import _cv_request
+from flask.testing import EnvironBuilder
+from werkzeug.exceptions import HTTPException, InternalServerError, NotFound
+
+from extensions import db
+
+
+BATCH_ENDPOINT = 'api.run_batch'
+# Headers that describe the batch body rather than each sub-request
+SKIPPED_HEADERS = {'Content-Type', 'Content-Length'}
+
+
+class BatchRequestError(ValueError):
+    """The batch body as a whole cannot be processed."""
+
+
+def parse_requests(payload):
+    """``(paths, parallel)`` from ``{"requests": [...], "parallel": false}``.
+
+    Each entry is a path string or an object with ``path`` and an optional
+    ``method``, which must be GET.
+    """
+    entries = payload.get('requests') if isinstance(payload, dict) else payload
+    if not isinstance(entries, list):
+        raise BatchRequestError("Expected a JSON array or an object with a 'requests' array")
+    limit = current_app.config['BATCH_MAX_REQUESTS']
+    if len(entries) > limit:
+        raise BatchRequestError(f'At most {limit} requests per batch')
+
+    paths = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            if entry.get('method', 'GET').upper() != 'GET':
+                raise BatchRequestError('Only GET requests can be batched')
+            entry = entry.get('path')
+        if not isinstance(entry, str) or not entry.startswith('/'):
+            raise BatchRequestError('Each request needs a path starting with /')
+        paths.append(entry)
+    parallel = bool(payload.get('parallel')) if isinstance(payload, dict) else False
+    return paths, parallel
+
+
+class SubRequestContext(RequestContext):
+    """Request context for one sub-request.
+
+    Popping it skips the ``teardown_request`` hooks, which belong to the batch
+    request and run when it ends, not after each sub-request.
+    """
+
+    def pop(self, exc=None):
+        token, app_ctx = self._cv_tokens.pop()
+        _cv_request.reset(token)
+        if app_ctx is not None:
+            app_ctx.pop(exc)
+
+
+def _error(path, exc):
+    return {'path': path, 'status': exc.code, 'body': {'error': exc.description}}
+
+
+def dispatch(app, path, headers, replica=None):
+    """Run one GET against the ``api`` blueprint; returns its result entry.
+
+    ``replica`` is the batch's read replica, for sub-requests running in their
+    own app context.
+    """
+    url = urlsplit(path)
+    builder = EnvironBuilder(app, url.path, query_string=url.query, method='GET', headers=headers)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    with SubRequestContext(app, environ):
+        if replica is not None:
+            g._db_replica = replica
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            if request.blueprint != 'api' or request.endpoint == BATCH_ENDPOINT:
+                raise NotFound()
+            response = app.make_response(app.view_functions[request.endpoint](**request.view_args))
+        except HTTPException as e:
+            return _error(path, e)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Batched request to %s failed', path)
+            return _error(path, InternalServerError())
+        return {'path': path, 'status': response.status_code, 'body': response.get_json(silent=True)}
+
+
+def run(paths, parallel=False):
+    """Dispatch ``paths`` and return their results in request order."""
+    app = current_app._get_current_object()
+    headers = [(name, value) for name, value in request.headers if name not in SKIPPED_HEADERS]
+    workers = min(len(paths), current_app.config['BATCH_MAX_WORKERS'])
+    if not parallel or workers < 2:
+        return [dispatch(app, path, headers) for path in paths]
+
+    # Each worker pushes its own app context, so it gets its own session
+    replica = g.get('_db_replica')
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-batch') as pool:
+        return list(pool.map(lambda path: dispatch(app, path, headers, replica), paths))
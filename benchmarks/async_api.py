@@ -0,0 +1,168 @@
+"""Compare the sync (gunicorn, threaded) and async (uvicorn) JSON APIs.
+
+Both servers run the same number of worker processes against the same
+database; the sync workers get ``--threads`` threads each. Every route is
+loaded at each concurrency level while the servers' resident memory (the
+whole process tree) is sampled, so throughput and tail latency can be read
+against the memory each deployment used.
+
+    flask --app app seed-wines --count 100000
+    python benchmarks/async_api.py --workers 2 --threads 8 --concurrency 8 32 128
+
+Linux only (memory is read from /proc).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from load_test import run_route
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+ROUTES = {
+    'api_wines': '/api/wines',
+    'api_search': '/api/search?q=reserve',
+    'api_suggestions': '/api/wines/suggestions?q=ch',
+    'api_stats': '/api/stats',
+    'api_wine': '/api/wines/1',
+}
+
+
+def server_commands(workers, threads, port):
+    return {
+        'sync': [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+                 '--worker-class', 'gthread', '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+                 'app:create_app()'],
+        'async': [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app',
+                  '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port),
+                  '--log-level', 'warning'],
+    }
+
+
+def tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and all of its descendants."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, tree_rss(self.pid))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def wait_until_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            with urllib.request.urlopen(base_url + '/api/stats', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {base_url} did not become ready')
+
+
+def benchmark_server(name, command, port, args, env):
+    base_url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        wait_until_ready(base_url, process)
+        idle_rss = tree_rss(process.pid)
+        sampler = MemorySampler(process.pid)
+        sampler.start()
+        results = {}
+        for concurrency in args.concurrency:
+            for route in args.routes:
+                result = run_route(base_url, ROUTES[route], concurrency, args.requests,
+                                   args.timeout, args.warmup)
+                results[f'{route}@{concurrency}'] = dict(result, route=route, concurrency=concurrency)
+                print(f"  {name:<6}{route:<18}c={concurrency:<5}{result['throughput_rps']:>9} rps"
+                      f"  p95 {result['p95_ms']} ms  errors {result['errors']}", file=sys.stderr)
+        sampler.stop()
+        return {'idle_rss_mb': round(idle_rss / 2 ** 20, 1),
+                'peak_rss_mb': round(sampler.peak / 2 ** 20, 1),
+                'results': results}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes per server.')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per sync worker.')
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[8, 32, 128])
+    parser.add_argument('--requests', type=int, default=300, help='Requests per route and level.')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--routes', nargs='*', choices=sorted(ROUTES), default=list(ROUTES))
+    parser.add_argument('--database-url', help='Database for both servers (default DATABASE_URL).')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--output', help='Write raw results as JSON to this path.')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, METRICS_ENABLED='False', SLOW_QUERY_LOG_ENABLED='False',
+               FILE_WORKER_ENABLED='False')
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+
+    report = {'workers': args.workers, 'threads': args.threads}
+    for offset, name in enumerate(('sync', 'async')):
+        port = args.port + offset
+        command = server_commands(args.workers, args.threads, port)[name]
+        print(f"Benchmarking {name} server...", file=sys.stderr)
+        report[name] = benchmark_server(name, command, port, args, env)
+
+    print(f"\nMemory (RSS, all processes): sync idle {report['sync']['idle_rss_mb']} MB, "
+          f"peak {report['sync']['peak_rss_mb']} MB; async idle {report['async']['idle_rss_mb']} MB, "
+          f"peak {report['async']['peak_rss_mb']} MB\n")
+    print(f"{'route':<18}{'conc':>6}{'sync rps':>10}{'async rps':>11}{'sync p95':>10}{'async p95':>11}"
+          f"{'sync err':>10}{'async err':>11}")
+    for key, sync in report['sync']['results'].items():
+        asyncr = report['async']['results'][key]
+        print(f"{sync['route']:<18}{sync['concurrency']:>6}{sync['throughput_rps']:>10}"
+              f"{asyncr['throughput_rps']:>11}{sync['p95_ms']!s:>10}{asyncr['p95_ms']!s:>11}"
+              f"{sync['errors']:>10}{asyncr['errors']:>11}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Micro-benchmarks for ``utils.save_and_process_image``.
+
+Generates its own fixture images (JPEG, PNG with alpha, HEIC) at several
+resolutions, then times the pipeline for each combination of input and
+setting (``IMAGE_QUALITY``, ``IMAGE_OPTIMIZE``, ``IMAGE_RESAMPLING``).
+Every case runs in a fresh worker process so peak RSS is attributable to
+that case alone. ``--parallel N`` additionally runs N copies at once to show
+throughput and memory under concurrent uploads.
+
+    python benchmarks/image_pipeline.py --repeat 5 --output results/images.md
+    python benchmarks/image_pipeline.py --quick
+"""
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+RESOLUTIONS = {'1MP': (1280, 960), '12MP': (4032, 3024), '24MP': (6000, 4000)}
+FORMATS = ('jpeg', 'png', 'heic')
+QUALITIES = (75, 85, 95)
+RESAMPLING = ('lanczos', 'bicubic', 'bilinear')
+
+
+def make_fixture(fmt, size, seed=0):
+    """Photo-like test image: gradients plus noise, so encoders do real work."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    width, height = size
+    base = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 40)
+    img = Image.merge('RGB', (base, noise, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        x, y = (seed + i * 97) % width, (seed + i * 53) % height
+        draw.ellipse((x, y, x + width // 6, y + height // 6), fill=(40 + i * 15, 20, 60))
+    img = img.filter(ImageFilter.GaussianBlur(1))
+
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        img.putalpha(Image.linear_gradient('L').resize(size))
+        img.save(buffer, 'PNG')
+    elif fmt == 'heic':
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+        img.save(buffer, 'HEIF', quality=90)
+    else:
+        img.save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def _run_case(case):
+    """Worker: process one fixture ``repeat`` times and report timings and peak RSS."""
+    from werkzeug.datastructures import FileStorage
+    from app import create_app
+    import utils
+
+    data = case['data']
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app = create_app('testing')
+        app.config.update(
+            UPLOAD_FOLDER=tmpdir,
+            THUMBNAIL_FOLDER=os.path.join(tmpdir, 'thumbnails'),
+            IMAGE_QUALITY=case['quality'],
+            IMAGE_OPTIMIZE=case['optimize'],
+            IMAGE_RESAMPLING=case['resample'],
+        )
+        os.makedirs(app.config['THUMBNAIL_FOLDER'])
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        timings = []
+        output_bytes = 0
+        with app.app_context():
+            started = time.time()
+            for _ in range(case['repeat']):
+                file = FileStorage(stream=io.BytesIO(data), filename=f"bench.{case['format']}")
+                start = time.perf_counter()
+                image_path, thumbnail_path = utils.save_and_process_image(file)
+                timings.append(time.perf_counter() - start)
+                if image_path is None:
+                    raise RuntimeError(f"processing failed for {case['name']}")
+                output_bytes = os.path.getsize(utils.resolve_image_path(image_path))
+            finished = time.time()
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'name': case['name'],
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'min_ms': round(min(timings) * 1000, 1),
+        'peak_rss_mb': round(peak_rss * scale / 2 ** 20, 1),
+        'rss_growth_mb': round((peak_rss - baseline_rss) * scale / 2 ** 20, 1),
+        'input_kb': round(len(data) / 1024, 1),
+        'output_kb': round(output_bytes / 1024, 1),
+        'started': started,
+        'finished': finished,
+    }
+
+
+def build_cases(args):
+    cases = []
+    fixtures = {}
+    for fmt, res in itertools.product(args.formats, args.resolutions):
+        try:
+            fixtures[(fmt, res)] = make_fixture(fmt, RESOLUTIONS[res])
+        except Exception as e:
+            print(f"Skipping {fmt} {res}: {e}", file=sys.stderr)
+
+    for (fmt, res), data in fixtures.items():
+        for quality, optimize, resample in itertools.product(
+                args.qualities, args.optimize, args.resampling):
+            cases.append({
+                'name': f'{fmt} {res} q{quality} opt={int(optimize)} {resample}',
+                'format': fmt, 'resolution': res, 'quality': quality,
+                'optimize': optimize, 'resample': resample,
+                'repeat': args.repeat, 'data': data,
+            })
+    return cases
+
+
+# Peak RSS survives fork and exec, so workers come from a fork server started
+# before the fixtures are generated; their peak then reflects only the case.
+WORKERS = multiprocessing.get_context('forkserver')
+
+
+def run_serial(cases):
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=WORKERS) as pool:
+            results.append(pool.submit(_run_case, case).result())
+        print(f"  {results[-1]['name']}: {results[-1]['median_ms']} ms", file=sys.stderr)
+    return results
+
+
+def run_parallel(cases, workers):
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=WORKERS) as pool:
+            runs = list(pool.map(_run_case, [case] * workers))
+        # Measure the window where workers were processing, not process start-up
+        wall = max(r['finished'] for r in runs) - min(r['started'] for r in runs)
+        results.append({
+            'name': case['name'],
+            'workers': workers,
+            'images_per_s': round(workers * case['repeat'] / wall, 2),
+            'median_ms': round(statistics.median(r['median_ms'] for r in runs), 1),
+            'total_peak_rss_mb': round(sum(r['peak_rss_mb'] for r in runs), 1),
+        })
+    return results
+
+
+def format_table(rows, columns):
+    header = '| ' + ' | '.join(columns) + ' |'
+    divider = '|' + '|'.join('---' for _ in columns) + '|'
+    body = ['| ' + ' | '.join(str(row.get(c, '')) for c in columns) + ' |' for row in rows]
+    return '\n'.join([header, divider] + body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--formats', nargs='*', default=list(FORMATS), choices=FORMATS)
+    parser.add_argument('--resolutions', nargs='*', choices=list(RESOLUTIONS))
+    parser.add_argument('--qualities', nargs='*', type=int)
+    parser.add_argument('--optimize', nargs='*', type=lambda v: v.lower() in ('1', 'true', 'yes'))
+    parser.add_argument('--resampling', nargs='*', choices=RESAMPLING)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case (median reported).')
+    parser.add_argument('--parallel', type=int, default=0,
+                        help='Also run each case on N concurrent processes.')
+    parser.add_argument('--quick', action='store_true',
+                        help='Default settings and 1MP/12MP inputs unless given explicitly.')
+    parser.add_argument('--output', help='Write the tables (.md) or raw results (.json).')
+    args = parser.parse_args(argv)
+    multiprocessing.forkserver.ensure_running()
+
+    if args.quick:
+        defaults = {'resolutions': ['1MP', '12MP'], 'qualities': [85],
+                    'optimize': [True], 'resampling': ['lanczos']}
+    else:
+        defaults = {'resolutions': list(RESOLUTIONS), 'qualities': list(QUALITIES),
+                    'optimize': [True, False], 'resampling': list(RESAMPLING)}
+    for name, value in defaults.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+    cases = build_cases(args)
+    print(f"Running {len(cases)} cases...", file=sys.stderr)
+    serial = run_serial(cases)
+    report = {'serial': serial}
+    for row in serial:
+        row.pop('started'), row.pop('finished')
+    text = format_table(serial, ['name', 'median_ms', 'min_ms', 'peak_rss_mb', 'rss_growth_mb',
+                                 'input_kb', 'output_kb'])
+    if args.parallel:
+        report['parallel'] = run_parallel(cases, args.parallel)
+        text += '\n\n' + format_table(report['parallel'], ['name', 'workers', 'images_per_s',
+                                                          'median_ms', 'total_peak_rss_mb'])
+    print(text)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            if args.output.endswith('.json'):
+                json.dump(report, f, indent=2)
+            else:
+                f.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Time near-duplicate label lookups in the in-memory label index.
+
+Fills a :class:`label_index.MultiIndexHash` with random 64-bit hashes plus
+a share of near copies (as a real collection of photographed labels has),
+laid out by :func:`label_index.plan_blocks` as the app does, then times
+``search`` for probes drawn from the index at each radius.
+
+    python benchmarks/label_lookup.py --size 100000 --radius 6 4
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from label_index import MultiIndexHash, plan_blocks  # noqa: E402
+
+
+def make_hashes(size, near_share, rng):
+    values = [rng.getrandbits(64) for _ in range(int(size * (1 - near_share)))]
+    while len(values) < size:
+        value = rng.choice(values)
+        for bit in rng.sample(range(64), rng.randint(1, 6)):
+            value ^= 1 << bit
+        values.append(value)
+    return values
+
+
+def time_queries(index, probes, radius):
+    timings = []
+    for probe in probes:
+        start = time.perf_counter()
+        index.search(probe, radius)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--radius', type=int, nargs='+', default=[6])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--near-share', type=float, default=0.2,
+                        help='fraction of hashes that are near copies of others')
+    parser.add_argument('--blocks', type=int, help='override the planned block count')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    values = make_hashes(args.size, args.near_share, rng)
+    probes = rng.sample(values, min(args.queries, len(values)))
+    print(f'{args.size} hashes, {len(probes)} queries')
+    print(f'{"radius":>6} {"blocks":>6} {"build s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+    for radius in args.radius:
+        blocks = args.blocks or plan_blocks(radius, args.size)
+        start = time.perf_counter()
+        index = MultiIndexHash(blocks)
+        for i, value in enumerate(values):
+            index.add(value, i)
+        build = time.perf_counter() - start
+        p50, p95 = time_queries(index, probes, radius)
+        print(f'{radius:>6} {blocks:>6} {build:>8.2f} {p50 * 1000:>8.3f} {p95 * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
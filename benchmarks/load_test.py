@@ -0,0 +1,163 @@
+"""Concurrent HTTP load test for the main read routes.
+
+Seed a database first (``flask --app app seed-wines --count 100000``), start
+the app, then run::
+
+    python benchmarks/load_test.py --base-url http://localhost:8080 \\
+        --concurrency 16 --requests 500 --output results/100k.json
+
+Pass ``--compare previous.json`` to print per-route deltas; the exit status
+is non-zero when any route's p95 regresses by more than ``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+
+
+DEFAULT_ROUTES = {
+    'index': '/',
+    'wine_list': '/wines/',
+    'wine_list_page_5': '/wines/?page=5',
+    'gallery': '/gallery',
+    'api_wines': '/api/wines',
+    'api_search': '/api/search?q=reserve',
+    'api_search_filtered': '/api/search?q=pinot&rating=4&year_from=2000',
+    'api_suggestions': '/api/wines/suggestions?q=ch',
+    'api_stats': '/api/stats',
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _fetch(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = None
+    return time.perf_counter() - start, status
+
+
+def run_route(base_url, path, concurrency, requests, timeout, warmup):
+    url = base_url.rstrip('/') + path
+    for _ in range(warmup):
+        _fetch(url, timeout)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(_):
+        nonlocal errors
+        elapsed, status = _fetch(url, timeout)
+        with lock:
+            if status is None or status >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'path': path,
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def compare(current, baseline, threshold):
+    """Print deltas against a previous run; return True if a p95 regressed."""
+    regressed = False
+    print(f"\n{'route':<22}{'p95 base':>10}{'p95 now':>10}{'delta':>9}{'rps base':>10}{'rps now':>10}")
+    for name, result in current['routes'].items():
+        old = baseline.get('routes', {}).get(name)
+        if not old or not old.get('p95_ms') or not result.get('p95_ms'):
+            continue
+        delta = (result['p95_ms'] - old['p95_ms']) / old['p95_ms']
+        flag = ''
+        if delta > threshold:
+            regressed = True
+            flag = '  REGRESSION'
+        print(f"{name:<22}{old['p95_ms']:>10}{result['p95_ms']:>10}{delta:>+9.1%}"
+              f"{old['throughput_rps']:>10}{result['throughput_rps']:>10}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--base-url', default='http://localhost:8080')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per route.')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--routes', nargs='*', choices=sorted(DEFAULT_ROUTES),
+                        help='Subset of routes to run (default all).')
+    parser.add_argument('--label', default='', help='Free-form label stored with the results.')
+    parser.add_argument('--output', help='Write results as JSON to this path.')
+    parser.add_argument('--compare', help='Previous results JSON to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative p95 increase treated as a regression.')
+    args = parser.parse_args(argv)
+
+    results = {
+        'label': args.label,
+        'timestamp': datetime.now(UTC).isoformat(),
+        'base_url': args.base_url,
+        'concurrency': args.concurrency,
+        'python': platform.python_version(),
+        'routes': {},
+    }
+    print(f"{'route':<22}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name in args.routes or DEFAULT_ROUTES:
+        result = run_route(args.base_url, DEFAULT_ROUTES[name], args.concurrency,
+                           args.requests, args.timeout, args.warmup)
+        results['routes'][name] = result
+        print(f"{name:<22}{result['throughput_rps']:>9}{result['p50_ms']!s:>9}"
+              f"{result['p95_ms']!s:>9}{result['p99_ms']!s:>9}{result['errors']:>8}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Batched JSON writes behind ``/api/wines/bulk``.
+
+Every item is validated first, then all valid items are written in a single
+transaction using executemany statements. Results come back per item, in
+request order, so a client can retry just the ones that failed.
+"""
+from datetime import datetime, UTC
+
+from flask import current_app
+
+from extensions import db
+from label_index import get_label_index
+from models import ChangeCounter, ImageUpload, Wine, WineTombstone
+from storage import file_worker, queue_image_deletions
+
+
+WINE_FIELDS = ('wine_name', 'vineyard_name', 'vintage_year', 'rating', 'notes')
+TEXT_FIELDS = ('wine_name', 'vineyard_name', 'notes')
+INTEGER_FIELDS = ('vintage_year', 'rating')
+# Keeps IN (...) lists well under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+class BulkRequestError(ValueError):
+    """The request body as a whole cannot be processed."""
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def parse_items(payload, key):
+    """The item list from ``{key: [...]}`` or a bare JSON array."""
+    items = payload.get(key) if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise BulkRequestError(f"Expected a JSON array or an object with a '{key}' array")
+    limit = current_app.config['BULK_MAX_ITEMS']
+    if len(items) > limit:
+        raise BulkRequestError(f'At most {limit} items per request')
+    return items
+
+
+def _wine_values(item):
+    """Supplied wine fields from ``item``, type-checked; returns ``(values, errors)``."""
+    values, errors = {}, []
+    for field in TEXT_FIELDS:
+        if field in item:
+            value = item[field]
+            if value is not None and not isinstance(value, str):
+                errors.append(f'{field} must be a string')
+            else:
+                values[field] = value.strip() if value else value
+    for field in INTEGER_FIELDS:
+        if field in item:
+            value = item[field]
+            if not isinstance(value, int) or isinstance(value, bool):
+                errors.append(f'{field} must be an integer')
+            else:
+                values[field] = value
+    return values, errors
+
+
+def _validate(fields, image_path, thumbnail_path):
+    wine = Wine(image_path=image_path, thumbnail_path=thumbnail_path,
+                **{field: fields.get(field) for field in WINE_FIELDS})
+    return wine.validate()
+
+
+def _load_uploads(image_ids):
+    ids = list({image_id for image_id in image_ids if isinstance(image_id, str)})
+    uploads = {}
+    for chunk in _chunks(ids):
+        for upload in db.session.scalars(db.select(ImageUpload).where(ImageUpload.id.in_(chunk))):
+            uploads[upload.id] = upload
+    return uploads
+
+
+def _claim_upload(item, uploads, claimed, errors):
+    upload = uploads.get(item.get('image_id'))
+    if upload is None:
+        errors.append('image_id must reference an uploaded image')
+    elif upload.id in claimed:
+        errors.append('image_id is used by another item in this request')
+    return upload
+
+
+def _failed(index, status, errors):
+    return {'index': index, 'status': status, 'errors': errors}
+
+
+def _release_uploads(claimed):
+    """Delete the claimed upload rows; returns the ids this transaction removed.
+
+    A concurrent bulk call or ``gc-images`` expiry may have taken some of
+    them since they were loaded. Those are missing from the result and must
+    not be attached.
+    """
+    released = set()
+    for chunk in _chunks(list(claimed)):
+        released.update(db.session.scalars(
+            db.delete(ImageUpload).where(ImageUpload.id.in_(chunk)).returning(ImageUpload.id)
+        ))
+    return released
+
+
+CLAIMED_ELSEWHERE = 'image_id was used by another request or has expired'
+
+
+def create_wines(items):
+    """Insert every valid item; returns per-item results."""
+    results = [None] * len(items)
+    uploads = _load_uploads(item.get('image_id') for item in items if isinstance(item, dict))
+    claimed = set()
+    rows, positions, row_uploads = [], [], []
+    now = datetime.now(UTC)
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = _failed(index, 'invalid', ['Item must be an object'])
+            continue
+        values, errors = _wine_values(item)
+        upload = _claim_upload(item, uploads, claimed, errors)
+        if not errors:
+            errors = _validate(values, upload.image_path, upload.thumbnail_path)
+        if errors:
+            results[index] = _failed(index, 'invalid', errors)
+            continue
+        claimed.add(upload.id)
+        row_uploads.append(upload.id)
+        rows.append({
+            **{field: values.get(field) for field in WINE_FIELDS},
+            'image_path': upload.image_path,
+            'thumbnail_path': upload.thumbnail_path,
+            'label_hash': upload.label_hash,
+            'label_features': upload.label_features,
+            'placeholder': upload.placeholder,
+            'date_added': now,
+            'date_modified': now,
+        })
+        positions.append(index)
+
+    if claimed:
+        released = _release_uploads(claimed)
+        kept = []
+        for index, row, upload_id in zip(positions, rows, row_uploads):
+            if upload_id in released:
+                kept.append((index, row))
+            else:
+                results[index] = _failed(index, 'conflict', [CLAIMED_ELSEWHERE])
+        positions, rows = [index for index, _ in kept], [row for _, row in kept]
+    if rows:
+        first_seq = ChangeCounter.reserve(db.session.connection(), len(rows))
+        for offset, row in enumerate(rows):
+            row['change_seq'] = first_seq + offset
+        # Each row has a distinct image path, which maps RETURNING rows back
+        # to items without sort_by_parameter_order (that forces one INSERT
+        # per row on SQLite)
+        inserted = dict(db.session.execute(db.insert(Wine).returning(Wine.image_path, Wine.id), rows).all())
+        ids = [inserted[row['image_path']] for row in rows]
+        db.session.commit()
+        file_worker.notify()
+        label_index = get_label_index()
+        for wine_id, row in zip(ids, rows):
+            label_index.add(wine_id, row['label_hash'])
+        for index, wine_id in zip(positions, ids):
+            results[index] = {'index': index, 'status': 'created', 'id': wine_id}
+    return results
+
+
+def _load_existing(ids, *columns):
+    existing = {}
+    for chunk in _chunks(list(set(ids))):
+        for row in db.session.execute(db.select(Wine.id, *columns).where(Wine.id.in_(chunk))):
+            existing[row.id] = row
+    return existing
+
+
+def _item_ids(items):
+    return [item['id'] for item in items
+            if isinstance(item, dict) and isinstance(item.get('id'), int)]
+
+
+def update_wines(items):
+    """Apply partial updates by ``id``; returns per-item results."""
+    results = [None] * len(items)
+    existing = _load_existing(
+        _item_ids(items),
+        Wine.image_path, Wine.thumbnail_path, *(getattr(Wine, field) for field in WINE_FIELDS),
+    )
+    uploads = _load_uploads(item.get('image_id') for item in items if isinstance(item, dict))
+    claimed, seen = set(), set()
+    updates, positions, update_uploads = [], [], []
+    now = datetime.now(UTC)
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+            results[index] = _failed(index, 'invalid', ['Item must be an object with an integer id'])
+            continue
+        wine_id = item['id']
+        current = existing.get(wine_id)
+        if current is None:
+            results[index] = _failed(index, 'not_found', [f'Wine {wine_id} does not exist'])
+            continue
+        values, errors = _wine_values(item)
+        if wine_id in seen:
+            errors.append('id appears more than once in this request')
+        upload = _claim_upload(item, uploads, claimed, errors) if 'image_id' in item else None
+        if not errors:
+            merged = {field: getattr(current, field) for field in WINE_FIELDS}
+            merged.update(values)
+            image_path = upload.image_path if upload else current.image_path
+            thumbnail_path = upload.thumbnail_path if upload else current.thumbnail_path
+            errors = _validate(merged, image_path, thumbnail_path)
+        if errors:
+            results[index] = _failed(index, 'invalid', errors)
+            continue
+
+        seen.add(wine_id)
+        update = {'id': wine_id, **values, 'date_modified': now}
+        update_uploads.append(None)
+        if upload is not None:
+            claimed.add(upload.id)
+            update_uploads[-1] = (upload.id, current.image_path, current.thumbnail_path)
+            update.update(image_path=upload.image_path, thumbnail_path=upload.thumbnail_path,
+                          label_hash=upload.label_hash, label_features=upload.label_features,
+                          placeholder=upload.placeholder)
+        updates.append(update)
+        positions.append(index)
+
+    replaced = []
+    if claimed:
+        released = _release_uploads(claimed)
+        kept = []
+        for index, update, upload in zip(positions, updates, update_uploads):
+            if upload is None or upload[0] in released:
+                kept.append((index, update))
+                if upload is not None:
+                    replaced.append(upload[1:])
+            else:
+                results[index] = _failed(index, 'conflict', [CLAIMED_ELSEWHERE])
+        positions, updates = [index for index, _ in kept], [update for _, update in kept]
+    if updates:
+        first_seq = ChangeCounter.reserve(db.session.connection(), len(updates))
+        for offset, update in enumerate(updates):
+            update['change_seq'] = first_seq + offset
+        # ORM bulk UPDATE by primary key: one executemany per distinct column set
+        db.session.execute(db.update(Wine), updates)
+        queue_image_deletions(replaced)
+        db.session.commit()
+        if replaced:
+            file_worker.notify()
+        label_index = get_label_index()
+        for update in updates:
+            if 'label_hash' in update:
+                label_index.add(update['id'], update['label_hash'])
+        for index, update in zip(positions, updates):
+            results[index] = {'index': index, 'status': 'updated', 'id': update['id']}
+    return results
+
+
+def delete_wines(ids):
+    """Delete wines by id and queue their images; returns per-item results."""
+    results = [None] * len(ids)
+    existing = _load_existing([i for i in ids if isinstance(i, int) and not isinstance(i, bool)],
+                              Wine.image_path, Wine.thumbnail_path)
+    deleted, replaced, seen = [], [], set()
+
+    for index, wine_id in enumerate(ids):
+        if not isinstance(wine_id, int) or isinstance(wine_id, bool):
+            results[index] = _failed(index, 'invalid', ['id must be an integer'])
+        elif wine_id in seen:
+            results[index] = _failed(index, 'invalid', ['id appears more than once in this request'])
+        elif wine_id not in existing:
+            results[index] = _failed(index, 'not_found', [f'Wine {wine_id} does not exist'])
+        else:
+            row = existing[wine_id]
+            replaced.append((row.image_path, row.thumbnail_path))
+            deleted.append(wine_id)
+            seen.add(wine_id)
+            results[index] = {'index': index, 'status': 'deleted', 'id': wine_id}
+
+    if deleted:
+        queue_image_deletions(replaced)
+        WineTombstone.record(db.session.connection(), deleted)
+        for chunk in _chunks(deleted):
+            db.session.execute(db.delete(Wine).where(Wine.id.in_(chunk)))
+        db.session.commit()
+        file_worker.notify()
+    return results
+
+
+def summarize(results):
+    failed = sum(1 for result in results if 'errors' in result)
+    return {'results': results, 'succeeded': len(results) - failed, 'failed': failed}
@@ -0,0 +1,247 @@
+import click
+
+
+def register_commands(app):
+    """Attach the maintenance CLI commands to ``app``."""
+
+    @app.cli.command('gc-images')
+    @click.option('--grace-hours', type=float, default=None,
+                  help='Only remove files older than this (default IMAGE_GC_GRACE_PERIOD).')
+    @click.option('--dry-run', is_flag=True, help='Report orphans without deleting them.')
+    def gc_images(grace_hours, dry_run):
+        """Remove uploaded images that no wine references."""
+        from storage import collect_orphans
+
+        grace_period = grace_hours * 3600 if grace_hours is not None else None
+        report = collect_orphans(grace_period=grace_period, dry_run=dry_run)
+
+        action = 'Would remove' if dry_run else 'Removed'
+        count = report.orphaned if dry_run else report.removed
+        click.echo(f"Scanned {report.scanned} files, {report.orphaned} orphaned.")
+        click.echo(f"{action} {count} files, {report.bytes_reclaimed / 1024:.1f} KiB reclaimed.")
+        if report.expired_uploads:
+            click.echo(f"{action} {report.expired_uploads} unfinished resumable uploads.")
+        for error in report.errors:
+            click.echo(f"Error: {error}", err=True)
+
+    @app.cli.command('drain-deletes')
+    def drain_deletes():
+        """Remove image files queued for deletion by committed transactions."""
+        from storage import drain_pending_deletes
+
+        processed = drain_pending_deletes()
+        click.echo(f"Processed {processed} pending deletes.")
+
+    @app.cli.command('backfill-label-hashes')
+    @click.option('--workers', type=int, default=None, help='Hashing processes (default CPU count).')
+    @click.option('--batch-size', type=int, default=500, help='Rows hashed and committed per batch.')
+    def backfill_label_hashes(workers, batch_size):
+        """Compute label hashes for wines saved before duplicate detection existed."""
+        from concurrent.futures import ProcessPoolExecutor
+        from extensions import db
+        from models import Wine
+        from label_index import hash_image_file
+        from utils import resolve_image_path
+
+        updated = missing = 0
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                rows = db.session.execute(
+                    db.select(Wine.id, Wine.thumbnail_path)
+                    .where(Wine.label_hash.is_(None), Wine.id > last_id)
+                    .order_by(Wine.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                paths = [resolve_image_path(row.thumbnail_path, thumbnail=True) for row in rows]
+                hashes = list(pool.map(hash_image_file, paths, chunksize=16))
+
+                values = [{'id': row.id, 'label_hash': h} for row, h in zip(rows, hashes) if h]
+                missing += len(rows) - len(values)
+                if values:
+                    db.session.execute(db.update(Wine), values)
+                    db.session.commit()
+                    updated += len(values)
+                click.echo(f"Hashed {updated} labels...")
+
+        click.echo(f"Backfilled {updated} label hashes, {missing} images unreadable.")
+
+    @app.cli.command('backfill-placeholders')
+    @click.option('--workers', type=int, default=None, help='Processes (default CPU count).')
+    @click.option('--batch-size', type=int, default=500, help='Rows processed and committed per batch.')
+    def backfill_placeholders(workers, batch_size):
+        """Compute inline image placeholders for wines saved before they existed."""
+        from concurrent.futures import ProcessPoolExecutor
+        from extensions import db
+        from models import ChangeCounter, Wine
+        from utils import placeholder_for_file, resolve_image_path
+
+        updated = missing = 0
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                rows = db.session.execute(
+                    db.select(Wine.id, Wine.thumbnail_path)
+                    .where(Wine.placeholder.is_(None), Wine.id > last_id)
+                    .order_by(Wine.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                paths = [resolve_image_path(row.thumbnail_path, thumbnail=True) for row in rows]
+                placeholders = list(pool.map(placeholder_for_file, paths, chunksize=16))
+
+                values = [{'id': row.id, 'placeholder': p} for row, p in zip(rows, placeholders) if p]
+                missing += len(rows) - len(values)
+                if values:
+                    # The placeholder is part of the API payload, so sync clients
+                    # must see these rows as changed
+                    first_seq = ChangeCounter.reserve(db.session.connection(), len(values))
+                    for offset, value in enumerate(values):
+                        value['change_seq'] = first_seq + offset
+                    db.session.execute(db.update(Wine), values)
+                    db.session.commit()
+                    updated += len(values)
+                click.echo(f"Generated {updated} placeholders...")
+
+        click.echo(f"Backfilled {updated} placeholders, {missing} images unreadable.")
+
+    @app.cli.command('build-similarity-index')
+    @click.option('--workers', type=int, default=None, help='Processes for backfilling features.')
+    @click.option('--batch-size', type=int, default=500, help='Rows backfilled per batch.')
+    def build_similarity_index(workers, batch_size):
+        """Backfill label feature vectors and rebuild the similarity matrix."""
+        from concurrent.futures import ProcessPoolExecutor
+        from flask import current_app
+        from extensions import db
+        from models import Wine
+        from similarity import build_index, extract_file_features, index_directory
+        from utils import resolve_image_path
+
+        backfilled = 0
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                rows = db.session.execute(
+                    db.select(Wine.id, Wine.thumbnail_path)
+                    .where(Wine.label_features.is_(None), Wine.id > last_id)
+                    .order_by(Wine.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                paths = [resolve_image_path(row.thumbnail_path, thumbnail=True) for row in rows]
+                features = pool.map(extract_file_features, paths, chunksize=16)
+                values = [{'id': row.id, 'label_features': f} for row, f in zip(rows, features) if f]
+                if values:
+                    db.session.execute(db.update(Wine), values)
+                    db.session.commit()
+                    backfilled += len(values)
+
+        directory = index_directory()
+        indexed = build_index(
+            directory, partition_threshold=current_app.config['SIMILARITY_PARTITION_THRESHOLD']
+        )
+        click.echo(f"Backfilled {backfilled} feature vectors, indexed {indexed} wines in {directory}.")
+
+    @app.cli.command('seed-wines')
+    @click.option('--count', type=int, default=10000, show_default=True)
+    @click.option('--batch-size', type=int, default=5000, show_default=True)
+    @click.option('--images', type=click.Choice(['shared', 'placeholder']), default='shared',
+                  show_default=True, help='One shared label image, or a cycled set of placeholders.')
+    @click.option('--seed', type=int, default=None, help='Random seed for reproducible data.')
+    def seed_wines_command(count, batch_size, images, seed):
+        """Insert synthetic wines for load testing."""
+        from seed import seed_wines
+
+        inserted = seed_wines(count, batch_size=batch_size, images=images, seed=seed,
+                              progress=lambda n: click.echo(f"Inserted {n}/{count}"))
+        click.echo(f"Seeded {inserted} wines.")
+
+    @app.cli.command('slow-queries')
+    @click.option('--limit', type=int, default=10, show_default=True, help='Statements to show.')
+    @click.option('--log', 'path', default=None, help='Log file (default SLOW_QUERY_LOG).')
+    @click.option('--plans/--no-plans', default=True, help='Show the plan of the slowest sample.')
+    def slow_queries(limit, path, plans):
+        """Summarize the slow-query log by normalized statement."""
+        from flask import current_app
+        from querylog import log_path, read_entries, summarize
+
+        summary = summarize(read_entries(path or log_path(current_app)))
+        if not summary:
+            click.echo("No slow queries logged.")
+            return
+        for row in summary[:limit]:
+            routes = ', '.join(f"{route} ({n})" for route, n in row['routes'].items())
+            click.echo(f"{row['count']:>6}x  total {row['total_ms']:.1f} ms  mean {row['mean_ms']:.1f} ms"
+                       f"  max {row['max_ms']:.1f} ms  [{routes}]")
+            click.echo(f"    {row['statement']}")
+            if plans and row['plan']:
+                for line in row['plan']:
+                    click.echo(f"      {line}")
+            click.echo()
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Minify static assets into fingerprinted, precompressed files."""
+        import os
+        from flask import current_app
+        from assets import build_assets
+
+        manifest = build_assets(current_app.static_folder)
+        for source, built in manifest.items():
+            path = os.path.join(current_app.static_folder, built)
+            sizes = ', '.join(f"{label} {os.path.getsize(path + suffix) / 1024:.1f} KiB"
+                              for label, suffix in (('raw', ''), ('gzip', '.gz'), ('br', '.br')))
+            click.echo(f"{source} -> {built} ({sizes})")
+        click.echo("Restart the app to serve the new files.")
+
+    @app.cli.command('build-sprites')
+    @click.option('--force', is_flag=True, help='Re-render every sheet, not just changed ones.')
+    def build_sprites_command(force):
+        """Pack thumbnails into the sprite sheets used by the list and search pages."""
+        from sprites import build_sprites
+
+        report = build_sprites(force=force)
+        if report is None:
+            raise click.ClickException("Another process is building sprite sheets; try again shortly.")
+        click.echo(f"Built {report.built} sheets, kept {report.kept}, removed {report.removed}.")
+
+    @app.cli.command('export-static')
+    @click.argument('output', type=click.Path(file_okay=False))
+    @click.option('--workers', type=int, default=None, help='Rendering processes (default CPU count).')
+    @click.option('--full', is_flag=True, help='Re-render every wine page, not just modified ones.')
+    @click.option('--config', 'config_name', default=None,
+                  help="Config the workers build (default: this app's config).")
+    def export_static(output, workers, full, config_name):
+        """Render the catalog as static files a plain web server or CDN can serve."""
+        import os
+        from static_export import ExportError, export_site
+
+        try:
+            report = export_site(output, workers=workers or os.cpu_count() or 1, full=full,
+                                 config_name=config_name)
+        except ExportError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Rendered {report.rendered} pages, {report.written} changed; "
+                   f"copied {report.copied} files, removed {report.removed}.")
+
+    @app.cli.command('startup-report')
+    @click.option('--limit', type=int, default=20, show_default=True, help='Modules to show.')
+    @click.option('--config', 'config_name', default=None, help='Config to build (default FLASK_ENV).')
+    def startup_report(limit, config_name):
+        """Time create_app() in a fresh interpreter and list the slowest imports."""
+        from startup import by_package, measure_startup
+
+        seconds, rows = measure_startup(config_name)
+        total = sum(row['self_us'] for row in rows)
+        click.echo(f"create_app(): {seconds * 1000:.0f} ms; {len(rows)} modules imported in "
+                   f"{total / 1000:.0f} ms (including interpreter startup)\n")
+        click.echo(f"{'time':>10}  package")
+        for package, self_us in by_package(rows)[:limit]:
+            click.echo(f"{self_us / 1000:>8.1f}ms  {package}")
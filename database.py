@@ -0,0 +1,111 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from extensions import db
+from metrics import DB_POOL_WAIT, add_collector
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config, uri=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database (or ``uri``).
+
+    Explicit ``SQLALCHEMY_ENGINE_OPTIONS`` entries win. In-memory SQLite is
+    left alone because Flask-SQLAlchemy gives it a StaticPool.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    if _is_memory_sqlite(url):
+        return options
+
+    options.setdefault('poolclass', TimedQueuePool)
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    if url.get_backend_name() != 'sqlite':
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT_MS']:
+        timeout = int(config['DB_STATEMENT_TIMEOUT_MS'])
+        connect_args = dict(options.get('connect_args') or {})
+        if url.get_driver_name() == 'asyncpg':
+            # asyncpg.connect() has no libpq ``options``; it takes server settings
+            server_settings = dict(connect_args.get('server_settings') or {})
+            server_settings.setdefault('statement_timeout', str(timeout))
+            connect_args['server_settings'] = server_settings
+        else:
+            connect_args.setdefault('options', f'-c statement_timeout={timeout}')
+        options['connect_args'] = connect_args
+    return options
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection."""
+    pragmas = {
+        'journal_mode': config['SQLITE_JOURNAL_MODE'],
+        'synchronous': config['SQLITE_SYNCHRONOUS'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        'cache_size': config['SQLITE_CACHE_SIZE'],
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS'],
+    }
+    return [f'PRAGMA {name}={value}' for name, value in pragmas.items() if value is not None]
+
+
+def _pool_metrics(engine):
+    def collect():
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            return []
+        return [
+            ('db_pool_size', 'gauge', 'Configured connection pool size.', [({}, pool.size())]),
+            ('db_pool_checked_out', 'gauge', 'Connections currently checked out.',
+             [({}, pool.checkedout())]),
+            ('db_pool_overflow', 'gauge', 'Connections open beyond the pool size.',
+             [({}, max(pool.overflow(), 0))]),
+        ]
+    return collect
+
+
+def install_sqlite_pragmas(engine, config):
+    """Run :func:`sqlite_pragmas` on each new connection of a SQLite ``engine``."""
+    if engine.dialect.name != 'sqlite':
+        return
+    statements = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def init_app(app):
+    """Apply SQLite pragmas on connect and expose pool gauges on ``/metrics``.
+
+    ``create_app`` sets ``SQLALCHEMY_ENGINE_OPTIONS`` from :func:`engine_options`
+    before ``db.init_app``; this runs after it, once the engine exists.
+    """
+    with app.app_context():
+        engine = db.engine
+    install_sqlite_pragmas(engine, app.config)
+    add_collector(app, _pool_metrics(engine))
@@ -0,0 +1,83 @@
+"""Gunicorn settings for production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment (names below). Reload
+without dropping requests:
+
+    kill -HUP <master pid>      # new workers; the preloaded app code is kept
+    kill -USR2 <master pid>     # new master running new code, alongside the old
+    kill -QUIT <old master pid> # once the new one is serving
+
+See the README's "Production Mode" section for the full sequence.
+"""
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 3000)}")
+# WEB_CONCURRENCY is the conventional override on PaaS hosts
+workers = _env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+worker_class = 'gthread'
+threads = _env_int('GUNICORN_THREADS', 4)
+
+# Load the app once in the master; workers share its memory copy-on-write
+preload_app = True
+
+# Recycle workers to cap memory growth; the jitter keeps them from all
+# restarting at once
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Workers publish their metrics here so any of them can answer /metrics for
+# the whole server (see metrics.MultiprocessStore). Each master gets its own
+# directory by default, so a USR2 upgrade doesn't mix old and new counters
+metrics_dir = os.environ.setdefault(
+    'METRICS_MULTIPROC_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                 f'wine-tracker-metrics-{os.getpid()}'),
+)
+
+# Heartbeat files on tmpfs, so a slow disk can't make workers look hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+pidfile = os.environ.get('GUNICORN_PIDFILE')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Counters start from zero with each server, as Prometheus expects
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def when_ready(server):
+    # Move everything the preloaded app allocated out of the collector's
+    # reach, so collections in the workers don't write to (and un-share)
+    # those pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from wsgi import init_worker
+    init_worker()
+
+
+def worker_exit(server, worker):
+    from wsgi import shutdown_worker
+    shutdown_worker()
@@ -0,0 +1,215 @@
+import math
+import threading
+
+from flask import current_app
+from extensions import db
+from models import Wine, WineTombstone
+
+
+HASH_SIZE = 8
+
+
+def dhash(img, hash_size=HASH_SIZE):
+    """64-bit difference hash of a PIL image, returned as 16 hex characters."""
+    from PIL import Image
+
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f'{value:0{hash_size * hash_size // 4}x}'
+
+
+def hash_image_file(path):
+    """dHash of an image on disk, or None if it cannot be read.
+
+    Top-level so it can be used with a process pool.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            return dhash(img)
+    except Exception:
+        return None
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """Multi-index hashing over 64-bit hashes using Hamming distance.
+
+    Each hash is split into ``blocks`` disjoint bit ranges, with one dict per
+    range from that block's bits to the ``(hash, item)`` pairs holding them.
+    By the pigeonhole principle, two hashes within ``r`` bits of each other
+    differ in at most ``r // blocks`` bits in some block. A query therefore
+    only looks up those few block values in each table and verifies the
+    candidates with a popcount. With ``blocks = r + 1`` each lookup is a
+    single exact match; :func:`plan_blocks` picks the count for a given size.
+    """
+
+    def __init__(self, blocks, bits=HASH_SIZE * HASH_SIZE):
+        self.size = 0
+        self.ranges = []
+        shift = bits
+        for i in range(blocks):
+            width = bits // blocks + (i < bits % blocks)
+            shift -= width
+            self.ranges.append((shift, (1 << width) - 1, width))
+        self.tables = [{} for _ in self.ranges]
+
+    def add(self, value, item):
+        self.size += 1
+        entry = (value, item)
+        for table, (shift, mask, _) in zip(self.tables, self.ranges):
+            table.setdefault((value >> shift) & mask, []).append(entry)
+
+    def search(self, value, max_distance):
+        """Return ``(distance, hash, item)`` tuples within ``max_distance``."""
+        flips = max_distance // len(self.ranges)
+        seen = set()
+        results = []
+        for table, (shift, mask, width) in zip(self.tables, self.ranges):
+            for key in _within(((value >> shift) & mask), width, flips):
+                for entry in table.get(key, ()):
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    distance = hamming(value, entry[0])
+                    if distance <= max_distance:
+                        results.append((distance, entry[0], entry[1]))
+        results.sort(key=lambda r: r[0])
+        return results
+
+
+def plan_blocks(max_distance, size, bits=HASH_SIZE * HASH_SIZE):
+    """Block count with the least expected work per query for ``size`` hashes.
+
+    Fewer, wider blocks need more lookups per table (every key within
+    ``max_distance // blocks`` bits) but leave fewer candidates to verify
+    in each bucket. At 100,000 hashes and a radius of 6 this picks 4 blocks
+    of 16 bits.
+    """
+    def cost(blocks):
+        width = bits // blocks
+        keys = sum(math.comb(width, k) for k in range(max_distance // blocks + 1))
+        return blocks * keys * (1 + size / 2 ** width)
+    return min(range(1, max_distance + 2), key=cost)
+
+
+def _within(key, width, flips):
+    """``key`` and every ``width``-bit value differing from it in up to ``flips`` bits."""
+    keys = [key]
+    frontier = [(key, 0)]
+    for _ in range(flips):
+        frontier = [(k ^ (1 << bit), bit + 1) for k, low in frontier for bit in range(low, width)]
+        keys.extend(k for k, _ in frontier)
+    return keys
+
+
+class LabelIndex:
+    """Per-process multi-index hash of label hashes, refreshed incrementally
+    from the database.
+
+    Rows changed since the last refresh are picked up through the indexed
+    ``change_seq`` column, which is handed out in commit order, and deletions
+    (from any process) through ``wine_tombstones``. Entries for re-hashed or
+    deleted wines are left in the tables and filtered out at query time. The
+    block layout is planned for the number of labels at build time, and the
+    index is rebuilt once it holds twice that many entries.
+    """
+
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.table = None
+        self.planned = 0
+        self.hashes = {}
+        self.watermark = None
+        self.deleted_seq = None
+
+    def _add(self, wine_id, label_hash):
+        if self.table is None:  # the first refresh loads it from the database
+            return
+        value = int(label_hash, 16)
+        if self.hashes.get(wine_id) == value:
+            return
+        self.hashes[wine_id] = value
+        self.table.add(value, wine_id)
+
+    def refresh(self):
+        with self._lock:
+            if self.table is not None and self.table.size > 2 * self.planned:
+                self._reset()
+            if self.deleted_seq is None:
+                # A fresh index only loads live rows; earlier deletions don't matter
+                self.deleted_seq = db.session.scalar(db.select(db.func.max(WineTombstone.change_seq))) or 0
+            else:
+                tombstones = db.select(WineTombstone.wine_id, WineTombstone.change_seq).where(
+                    WineTombstone.change_seq > self.deleted_seq
+                )
+                for wine_id, seq in db.session.execute(tombstones):
+                    self.hashes.pop(wine_id, None)
+                    self.deleted_seq = max(self.deleted_seq, seq)
+            query = db.select(Wine.id, Wine.label_hash, Wine.change_seq).where(
+                Wine.label_hash.isnot(None)
+            )
+            if self.watermark is not None:
+                query = query.where(Wine.change_seq > self.watermark)
+            rows = db.session.execute(query).all()
+            if self.table is None:
+                self.planned = max(len(rows), 1000)
+                self.table = MultiIndexHash(plan_blocks(self.max_distance, self.planned))
+            for wine_id, label_hash, seq in rows:
+                self._add(wine_id, label_hash)
+                if self.watermark is None or seq > self.watermark:
+                    self.watermark = seq
+
+    def add(self, wine_id, label_hash):
+        """Record a hash committed by this process without waiting for a refresh."""
+        if label_hash:
+            with self._lock:
+                self._add(wine_id, label_hash)
+
+    def find_similar(self, label_hash, max_distance=None, exclude_id=None):
+        """Return ``(distance, wine_id)`` pairs for labels near ``label_hash``."""
+        if not label_hash:
+            return []
+        if max_distance is None:
+            max_distance = current_app.config.get('LABEL_DUPLICATE_DISTANCE', 6)
+        self.refresh()
+        with self._lock:
+            matches = self.table.search(int(label_hash, 16), max_distance)
+            return [
+                (distance, wine_id) for distance, value, wine_id in matches
+                if wine_id != exclude_id and self.hashes.get(wine_id) == value
+            ]
+
+
+def get_label_index():
+    """Return the label index for the current app, creating it on first use."""
+    index = current_app.extensions.get('label_index')
+    if index is None:
+        index = current_app.extensions.setdefault(
+            'label_index', LabelIndex(current_app.config.get('LABEL_DUPLICATE_DISTANCE', 6))
+        )
+    return index
+
+
+def find_duplicate_wines(label_hash, exclude_id=None, limit=3):
+    """Existing wines whose label looks like ``label_hash``, closest first."""
+    # Deleted wines are dropped from the index on refresh; over-fetch a little
+    # for ones deleted since, so they cannot hide real matches
+    matches = get_label_index().find_similar(label_hash, exclude_id=exclude_id)[:limit * 2]
+    if not matches:
+        return []
+    wines = {w.id: w for w in Wine.query.filter(Wine.id.in_([m[1] for m in matches]))}
+    return [wines[wine_id] for _, wine_id in matches if wine_id in wines][:limit]
@@ -0,0 +1,385 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observing is a bisect and three additions."""
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        """``[label_values, bucket_counts, sum, count]`` for every label set."""
+        with self._lock:
+            return [[list(k), list(v[0]), v[1], v[2]] for k, v in self._values.items()]
+
+    def samples(self, snapshot=None):
+        """Exposition samples for this histogram, or for ``snapshot`` in its shape."""
+        items = self.snapshot() if snapshot is None else snapshot
+        for label_values, counts, total, count in items:
+            label_values = tuple(label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labels, label_values, ('le', le)), cumulative)
+            yield f'{self.name}_sum', _format_labels(self.labels, label_values), total
+            yield f'{self.name}_count', _format_labels(self.labels, label_values), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def render(self, collectors=(), snapshot=None, collected=None):
+        """Prometheus text exposition of every metric plus ``collectors``.
+
+        A collector is a callable returning ``(name, type, help, samples)``
+        tuples, where ``samples`` is a list of ``(labels_dict, value)``.
+        ``snapshot`` and ``collected`` replace this process's histograms and
+        collector output, e.g. with the merged state of every worker.
+        """
+        if collected is None:
+            collected = collect(collectors)
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            values = None if snapshot is None else snapshot.get(metric.name, [])
+            for name, labels, value in metric.samples(values):
+                lines.append(f'{name}{labels} {value}')
+        for name, metric_type, help, samples in collected:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f'{name}{_format_labels(names, tuple(labels.values()))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def collect(collectors):
+    """Run ``collectors`` into a list of ``(name, type, help, samples)``."""
+    return [metric for collector in collectors for metric in collector()]
+
+
+def merge_snapshots(snapshots):
+    """Sum histogram snapshots (see :meth:`Registry.snapshot`) label set by label set."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, items in snapshot.items():
+            totals = merged.setdefault(name, {})
+            for label_values, counts, total, count in items:
+                key = tuple(label_values)
+                state = totals.get(key)
+                if state is None:
+                    totals[key] = [list(label_values), list(counts), total, count]
+                else:
+                    state[1] = [a + b for a, b in zip(state[1], counts)]
+                    state[2] += total
+                    state[3] += count
+    return {name: list(totals.values()) for name, totals in merged.items()}
+
+
+@contextmanager
+def _file_lock(path, exclusive):
+    try:
+        import fcntl
+    except ImportError:  # Windows: no pre-fork server, nothing to share
+        yield
+        return
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class MultiprocessStore:
+    """Metrics shared by the worker processes of one server through a directory.
+
+    Each worker writes its histograms and collector output to ``<pid>.json``
+    every ``interval`` seconds, and ``/metrics`` merges every file, so a
+    scrape sees the whole server whichever worker answers it. A worker that
+    exits folds its histograms into ``archive.json``, so totals survive
+    ``max_requests`` recycling; its gauges leave with it. Collector samples
+    carry a ``worker`` label with the pid they came from.
+    """
+
+    ARCHIVE = 'archive.json'
+    LOCK = '.lock'
+
+    def __init__(self, directory, interval=5.0):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read(self, name):
+        try:
+            with open(self._path(name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, name, data):
+        path = self._path(name)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def write(self, collectors=()):
+        """Publish this process's current metrics."""
+        self._write(f'{os.getpid()}.json', {'histograms': registry.snapshot(),
+                                            'collected': collect(collectors)})
+
+    def read(self):
+        """``(histogram snapshot, collected)`` merged across every worker."""
+        snapshots, collected = [], {}
+        with _file_lock(self._path(self.LOCK), exclusive=False):
+            archive = self._read(self.ARCHIVE)
+            if archive:
+                snapshots.append(archive)
+            for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+                pid = entry.name[:-len('.json')]
+                if not (entry.name.endswith('.json') and pid.isdigit()):
+                    continue
+                data = self._read(entry.name)
+                if data is None:
+                    continue
+                snapshots.append(data['histograms'])
+                for name, metric_type, help, samples in data['collected']:
+                    metric = collected.setdefault(name, (name, metric_type, help, []))
+                    metric[3].extend(({**labels, 'worker': pid}, value) for labels, value in samples)
+        return merge_snapshots(snapshots), list(collected.values())
+
+    def start(self, collectors):
+        """Publish every ``interval`` seconds from a background thread."""
+        def run():
+            while not self._stop.wait(self.interval):
+                self.write(collectors)
+        self.write(collectors)
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='metrics-store', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Fold this process's histograms into the archive and drop its file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with _file_lock(self._path(self.LOCK), exclusive=True):
+            archive = self._read(self.ARCHIVE) or {}
+            self._write(self.ARCHIVE, merge_snapshots([archive, registry.snapshot()]))
+            try:
+                os.remove(self._path(f'{os.getpid()}.json'))
+            except FileNotFoundError:
+                pass
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route.',
+    labels=('method', 'endpoint', 'status')
+)
+SQL_LATENCY = registry.histogram(
+    'sql_query_duration_seconds', 'SQL statement execution time.'
+)
+SQL_PER_REQUEST = registry.histogram(
+    'sql_queries_per_request', 'SQL statements executed per request.',
+    labels=('endpoint',), buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+IMAGE_PHASE_LATENCY = registry.histogram(
+    'image_processing_seconds', 'Time spent in each image processing phase.',
+    labels=('phase',)
+)
+DB_POOL_WAIT = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled database connection.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+
+
+def _timings():
+    """Per-request timing accumulator, or None outside an instrumented request."""
+    if not has_app_context():
+        return None
+    return g.get('_timings')
+
+
+@contextmanager
+def timed(phase):
+    """Time a block as an image processing phase and add it to Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        IMAGE_PHASE_LATENCY.observe(elapsed, phase)
+        timings = _timings()
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
+
+
+_sql_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    SQL_LATENCY.observe(elapsed)
+    timings = _timings()
+    if timings is not None:
+        timings['db'] = timings.get('db', 0.0) + elapsed
+        g._sql_count = g.get('_sql_count', 0) + 1
+
+
+def _install_sql_listeners():
+    # Listening on the Engine class covers every engine (including ones
+    # created later) with a single registration per process.
+    global _sql_listeners_installed
+    if _sql_listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _sql_listeners_installed = True
+
+
+def _start_timer():
+    g._request_start = time.perf_counter()
+    g._timings = {}
+    g._sql_count = 0
+
+
+def _record_request(response):
+    start = g.get('_request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.observe(elapsed, request.method, endpoint, str(response.status_code))
+    SQL_PER_REQUEST.observe(g._sql_count, endpoint)
+
+    parts = [f'app;dur={elapsed * 1000:.1f}']
+    for name, seconds in g._timings.items():
+        if name == 'db':
+            parts.append(f'db;dur={seconds * 1000:.1f};desc="{g._sql_count} queries"')
+        else:
+            parts.append(f'{name};dur={seconds * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(parts)
+    return response
+
+
+def _upload_gate_metrics(app):
+    def collect():
+        gate = app.extensions.get('upload_gate')
+        if gate is None:
+            return []
+        stats = gate.snapshot()
+        return [
+            ('upload_queue_depth', 'gauge', 'Uploads waiting for an admission slot.',
+             [({}, stats['queue_depth'])]),
+            ('upload_active', 'gauge', 'Uploads currently being processed.',
+             [({}, stats['active'])]),
+            ('upload_memory_in_use_bytes', 'gauge', 'Estimated bitmap memory held by uploads.',
+             [({}, stats['memory_in_use'])]),
+            ('upload_admitted_total', 'counter', 'Uploads admitted.',
+             [({}, stats['admitted'])]),
+            ('upload_rejected_total', 'counter', 'Uploads rejected with 503.',
+             [({}, stats['rejected'])]),
+            ('upload_wait_seconds_total', 'counter', 'Total time uploads spent queued.',
+             [({}, stats['wait_seconds_total'])]),
+            ('upload_wait_seconds_max', 'gauge', 'Longest time an upload spent queued.',
+             [({}, stats['wait_seconds_max'])]),
+        ]
+    return collect
+
+
+def add_collector(app, collector):
+    """Expose app-specific gauges (see :meth:`Registry.render`) on ``/metrics``."""
+    app.extensions.setdefault('metrics_collectors', []).append(collector)
+
+
+def metrics_view():
+    collectors = current_app.extensions.get('metrics_collectors', [])
+    store = current_app.extensions.get('metrics_store')
+    if store is None:
+        body = registry.render(collectors)
+    else:
+        store.write(collectors)
+        snapshot, collected = store.read()
+        body = registry.render(snapshot=snapshot, collected=collected)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    _install_sql_listeners()
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if app.config.get('METRICS_MULTIPROC_DIR'):
+        # Started per worker by wsgi.init_worker
+        app.extensions['metrics_store'] = MultiprocessStore(
+            app.config['METRICS_MULTIPROC_DIR'], interval=app.config['METRICS_FLUSH_INTERVAL']
+        )
+    add_collector(app, _upload_gate_metrics(app))
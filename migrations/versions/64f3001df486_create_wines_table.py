@@ -0,0 +1,47 @@
+"""create wines table
+
+Revision ID: 64f3001df486
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '64f3001df486'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created with db.create_all() before migrations existed
+    # already have this table; adopt them instead of failing
+    if sa.inspect(op.get_bind()).has_table('wines'):
+        return
+    op.create_table('wines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('wine_name', sa.String(length=100), nullable=False),
+        sa.Column('vineyard_name', sa.String(length=100), nullable=False),
+        sa.Column('vintage_year', sa.Integer(), nullable=False),
+        sa.Column('rating', sa.Integer(), nullable=False),
+        sa.Column('notes', sa.Text(length=500), nullable=True),
+        sa.Column('image_path', sa.String(length=255), nullable=False),
+        sa.Column('thumbnail_path', sa.String(length=255), nullable=False),
+        sa.Column('date_added', sa.DateTime(), nullable=False),
+        sa.Column('date_modified', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_wines_vineyard_name'), ['vineyard_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_wines_wine_name'), ['wine_name'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_wines_wine_name'))
+        batch_op.drop_index(batch_op.f('ix_wines_vineyard_name'))
+
+    op.drop_table('wines')
@@ -0,0 +1,27 @@
+"""add wines.label_features
+
+Revision ID: 6bda4a86a911
+Revises: 7b94ac29a922
+Create Date: 2026-10-19 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6bda4a86a911'
+down_revision = '7b94ac29a922'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing wines get their vectors from `flask build-similarity-index`
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('label_features', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.drop_column('label_features')
@@ -0,0 +1,31 @@
+"""add wines.label_hash and index date_modified
+
+Revision ID: 7b94ac29a922
+Revises: d1879a256679
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b94ac29a922'
+down_revision = 'd1879a256679'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing wines get their hash from `flask backfill-label-hashes`
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('label_hash', sa.String(length=16), nullable=True))
+        batch_op.create_index(batch_op.f('ix_wines_label_hash'), ['label_hash'], unique=False)
+        batch_op.create_index(batch_op.f('ix_wines_date_modified'), ['date_modified'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_wines_date_modified'))
+        batch_op.drop_index(batch_op.f('ix_wines_label_hash'))
+        batch_op.drop_column('label_hash')
@@ -0,0 +1,32 @@
+"""add image_uploads
+
+Revision ID: b7983b641f1c
+Revises: 6bda4a86a911
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7983b641f1c'
+down_revision = '6bda4a86a911'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_uploads',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('image_path', sa.String(length=255), nullable=False),
+        sa.Column('thumbnail_path', sa.String(length=255), nullable=False),
+        sa.Column('label_hash', sa.String(length=16), nullable=True),
+        sa.Column('label_features', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('image_uploads')
@@ -0,0 +1,31 @@
+"""add wines.placeholder and image_uploads.placeholder
+
+Revision ID: cb48e5898396
+Revises: cb9a8f6c2f41
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb48e5898396'
+down_revision = 'cb9a8f6c2f41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing wines get their placeholder from `flask backfill-placeholders`
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('placeholder', sa.Text(), nullable=True))
+    with op.batch_alter_table('image_uploads', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('placeholder', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('image_uploads', schema=None) as batch_op:
+        batch_op.drop_column('placeholder')
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.drop_column('placeholder')
@@ -0,0 +1,55 @@
+"""add the change feed: wines.change_seq, change_counter, wine_tombstones
+
+Revision ID: cb9a8f6c2f41
+Revises: b7983b641f1c
+Create Date: 2026-10-19 09:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb9a8f6c2f41'
+down_revision = 'b7983b641f1c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    change_counter = op.create_table('change_counter',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('wine_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('wine_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('wine_tombstones', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_wine_tombstones_change_seq'), ['change_seq'], unique=False)
+
+    # Existing wines enter the feed in id order; the counter continues after them
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), nullable=True))
+    op.execute('UPDATE wines SET change_seq = id')
+    last = op.get_bind().execute(sa.text('SELECT COALESCE(MAX(id), 0) FROM wines')).scalar()
+    op.bulk_insert(change_counter, [{'id': 1, 'value': last}])
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.alter_column('change_seq', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_wines_change_seq'), ['change_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('wines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_wines_change_seq'))
+        batch_op.drop_column('change_seq')
+
+    with op.batch_alter_table('wine_tombstones', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_wine_tombstones_change_seq'))
+
+    op.drop_table('wine_tombstones')
+    op.drop_table('change_counter')
@@ -0,0 +1,30 @@
+"""add pending_file_deletes
+
+Revision ID: d1879a256679
+Revises: 64f3001df486
+Create Date: 2026-10-19 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1879a256679'
+down_revision = '64f3001df486'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pending_file_deletes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('image_path', sa.String(length=255), nullable=True),
+        sa.Column('thumbnail_path', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('pending_file_deletes')
@@ -1,4 +1,6 @@
+import uuid
 from datetime import datetime, UTC
+from sqlalchemy import event
 from extensions import db
 
 
@@ -13,11 +15,18 @@ class Wine(db.Model):
     notes = db.Column(db.Text(500))
     image_path = db.Column(db.String(255), nullable=False)
     thumbnail_path = db.Column(db.String(255), nullable=False)
+    label_hash = db.Column(db.String(16), index=True)
+    label_features = db.Column(db.LargeBinary)
+    # Tiny inline preview (data: URI) shown while the image loads
+    placeholder = db.Column(db.Text)
     date_added = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC))
-    date_modified = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    date_modified = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC), index=True)
+    # Position in the change feed behind /api/changes; see ChangeCounter
+    change_seq = db.Column(db.Integer, nullable=False, index=True)
     
     def __init__(self, wine_name, vineyard_name, vintage_year, rating, 
-                 image_path, thumbnail_path, notes=None):
+                 image_path, thumbnail_path, notes=None, label_hash=None,
+                 label_features=None, placeholder=None):
         self.wine_name = wine_name
         self.vineyard_name = vineyard_name
         self.vintage_year = vintage_year
@@ -25,6 +34,9 @@ class Wine(db.Model):
         self.notes = notes
         self.image_path = image_path
         self.thumbnail_path = thumbnail_path
+        self.label_hash = label_hash
+        self.label_features = label_features
+        self.placeholder = placeholder
         self.date_added = datetime.now(UTC)
         self.date_modified = datetime.now(UTC)
     
@@ -38,6 +50,7 @@ class Wine(db.Model):
             'notes': self.notes,
             'image_path': self.image_path,
             'thumbnail_path': self.thumbnail_path,
+            'placeholder': self.placeholder,
             'date_added': self.date_added.isoformat() if self.date_added else None,
             'date_modified': self.date_modified.isoformat() if self.date_modified else None
         }
@@ -76,4 +89,106 @@ class Wine(db.Model):
         return errors
     
     def __repr__(self):
-        return f'<Wine {self.wine_name} - {self.vineyard_name} ({self.vintage_year})>'
\ No newline at end of file
+        return f'<Wine {self.wine_name} - {self.vineyard_name} ({self.vintage_year})>'
+
+class ChangeCounter(db.Model):
+    """Single-row counter that hands out ``change_seq`` values.
+
+    Reserving numbers updates the row, which stays locked until the writing
+    transaction ends, so sequence numbers become visible in commit order and a
+    sync cursor never skips a change that commits late.
+    """
+    __tablename__ = 'change_counter'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def reserve(cls, connection, count=1):
+        """Reserve ``count`` consecutive sequence numbers; returns the first."""
+        table = cls.__table__
+        last = connection.execute(
+            table.update().where(table.c.id == 1).values(value=table.c.value + count).returning(table.c.value)
+        ).scalar()
+        if last is None:
+            connection.execute(table.insert().values(id=1, value=count))
+            last = count
+        return last - count + 1
+
+
+event.listen(ChangeCounter.__table__, 'after_create',
+             db.DDL('INSERT INTO change_counter (id, value) VALUES (1, 0)'))
+
+
+class WineTombstone(db.Model):
+    """Records a deleted wine so sync clients learn about the deletion."""
+    __tablename__ = 'wine_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    wine_id = db.Column(db.Integer, nullable=False)
+    change_seq = db.Column(db.Integer, nullable=False, index=True)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    
+    @classmethod
+    def record(cls, connection, wine_ids):
+        """Insert tombstones for ``wine_ids`` with fresh sequence numbers."""
+        if not wine_ids:
+            return
+        first = ChangeCounter.reserve(connection, len(wine_ids))
+        now = datetime.now(UTC)
+        connection.execute(cls.__table__.insert(), [
+            {'wine_id': wine_id, 'change_seq': first + i, 'deleted_at': now}
+            for i, wine_id in enumerate(wine_ids)
+        ])
+    
+    def __repr__(self):
+        return f'<WineTombstone {self.wine_id}>'
+
+
+# ORM writes stamp wines here; executemany paths (bulk API, seeding) reserve
+# ranges with ChangeCounter.reserve themselves
+@event.listens_for(Wine, 'before_insert')
+@event.listens_for(Wine, 'before_update')
+def _stamp_change_seq(mapper, connection, target):
+    target.change_seq = ChangeCounter.reserve(connection)
+
+
+@event.listens_for(Wine, 'after_delete')
+def _record_tombstone(mapper, connection, target):
+    WineTombstone.record(connection, [target.id])
+
+
+class PendingFileDelete(db.Model):
+    """Image files scheduled for removal once the owning transaction commits."""
+    __tablename__ = 'pending_file_deletes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    image_path = db.Column(db.String(255))
+    thumbnail_path = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    
+    def __repr__(self):
+        return f'<PendingFileDelete {self.image_path}>'
+
+
+class ImageUpload(db.Model):
+    """A processed image uploaded ahead of the bulk API call that attaches it to a wine."""
+    __tablename__ = 'image_uploads'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    image_path = db.Column(db.String(255), nullable=False)
+    thumbnail_path = db.Column(db.String(255), nullable=False)
+    label_hash = db.Column(db.String(16))
+    label_features = db.Column(db.LargeBinary)
+    placeholder = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    
+    def to_dict(self):
+        return {
+            'image_id': self.id,
+            'image_path': self.image_path,
+            'thumbnail_path': self.thumbnail_path
+        }
+    
+    def __repr__(self):
+        return f'<ImageUpload {self.id}>'
@@ -0,0 +1,144 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, UTC
+
+from flask import abort, current_app, g, render_template_string, request, send_from_directory
+
+
+PROFILE_HEADER = 'X-Profile'
+# cProfile hooks the whole interpreter (and on 3.12+ refuses a second active
+# profiler), so at most one request per process is profiled at a time
+_profiler_lock = threading.Lock()
+_FILENAME = re.compile(r'^(\d{8}T\d{6}\.\d{6})_(.+)_(\d+)ms\.prof$')
+
+INDEX_TEMPLATE = '''<!DOCTYPE html>
+<title>Request profiles</title>
+<h1>Request profiles</h1>
+<p>Download with <code>curl -OJ -H 'X-Profile: &lt;secret&gt;' URL</code>, then open with
+<code>python -m pstats FILE</code>, snakeviz or flameprof.</p>
+<table>
+  <tr><th>Captured (UTC)</th><th>Route</th><th>Duration</th><th>URL</th></tr>
+  {% for p in profiles %}
+  <tr>
+    <td>{{ p.captured }}</td><td>{{ p.route }}</td><td>{{ p.duration_ms }} ms</td>
+    <td><code>{{ url_for('profiles_download', filename=p.filename, _external=True) }}</code></td>
+  </tr>
+  {% else %}
+  <tr><td colspan="4">No profiles captured yet.</td></tr>
+  {% endfor %}
+</table>
+'''
+
+
+def profile_directory(app=None):
+    app = app or current_app
+    return app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+
+def _secret_matches(value):
+    secret = current_app.config.get('PROFILE_SECRET')
+    return bool(secret and value and hmac.compare_digest(value, secret))
+
+
+def _should_profile():
+    if _secret_matches(request.headers.get(PROFILE_HEADER)):
+        return True
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if request.endpoint in ('profiles_index', 'profiles_download') or not _should_profile():
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiling tool, e.g. coverage, is active
+        _profiler_lock.release()
+        return
+    g._profile_start = time.perf_counter()
+    g._profiler = profiler
+
+
+def _finish_profile(exc=None):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return
+    try:
+        profiler.disable()
+    finally:
+        _profiler_lock.release()
+    duration_ms = int((time.perf_counter() - g.pop('_profile_start')) * 1000)
+    route = re.sub(r'[^\w.]+', '-', request.endpoint or 'unmatched')
+    directory = profile_directory()
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(UTC).strftime('%Y%m%dT%H%M%S.%f')
+    profiler.dump_stats(os.path.join(directory, f'{stamp}_{route}_{duration_ms}ms.prof'))
+    _rotate(directory, current_app.config.get('PROFILE_MAX_FILES', 50))
+
+
+def _rotate(directory, max_files):
+    names = sorted(name for name in os.listdir(directory) if _FILENAME.match(name))
+    for name in names[:max(len(names) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def list_profiles(directory):
+    """Captured profiles, newest first."""
+    profiles = []
+    if not os.path.isdir(directory):
+        return profiles
+    for name in sorted(os.listdir(directory), reverse=True):
+        match = _FILENAME.match(name)
+        if match:
+            captured = datetime.strptime(match.group(1), '%Y%m%dT%H%M%S.%f')
+            profiles.append({
+                'filename': name,
+                'captured': captured.strftime('%Y-%m-%d %H:%M:%S'),
+                'route': match.group(2),
+                'duration_ms': int(match.group(3)),
+            })
+    return profiles
+
+
+def _require_secret():
+    # Header only: a secret in the URL would end up in access logs and history
+    if not _secret_matches(request.headers.get(PROFILE_HEADER)):
+        abort(404)
+
+
+def profiles_index():
+    _require_secret()
+    return render_template_string(INDEX_TEMPLATE, profiles=list_profiles(profile_directory()))
+
+
+def profiles_download(filename):
+    _require_secret()
+    if not _FILENAME.match(filename):
+        abort(404)
+    return send_from_directory(profile_directory(), filename, as_attachment=True)
+
+
+def init_app(app):
+    """Enable opt-in request profiling.
+
+    A request is profiled when it carries ``X-Profile: <PROFILE_SECRET>`` or is
+    picked by ``PROFILE_SAMPLE_RATE``. Reports are pstats files kept in a
+    rotating directory and listed at ``/_profiles`` (secret required).
+    """
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    app.before_request(_start_profile)
+    app.teardown_request(_finish_profile)
+    app.add_url_rule('/_profiles', 'profiles_index', profiles_index)
+    app.add_url_rule('/_profiles/<path:filename>', 'profiles_download', profiles_download)
@@ -0,0 +1,69 @@
+"""Service worker for offline use, served from ``/sw.js``.
+
+The worker is rendered from ``templates/sw.js`` so it can control the whole
+site (a script under ``/static/js/`` only controls that path) and so its
+precache manifest and cache version change whenever a precached file does.
+A changed script is what makes browsers install the new worker.
+"""
+import hashlib
+import os
+
+from flask import current_app, render_template, url_for
+
+from assets import asset_url
+
+
+SW_TEMPLATE = 'sw.js'
+# Static files the worker precaches, relative to the static folder
+PRECACHE_STATIC = ('css/style.css', 'js/main.js')
+# Pages precached as offline fallbacks for navigations
+PRECACHE_PAGES = ('main.index', 'main.gallery', 'main.search_page')
+
+
+def build_version(app):
+    """Short hash of the precached files and the worker template.
+
+    ``ASSET_VERSION`` (e.g. a commit id set at deploy time) takes precedence.
+    """
+    if app.config.get('ASSET_VERSION'):
+        return app.config['ASSET_VERSION']
+    digest = hashlib.sha256()
+    sources = [os.path.join(app.static_folder, name) for name in PRECACHE_STATIC]
+    sources.append(os.path.join(app.root_path, app.template_folder, SW_TEMPLATE))
+    for path in sources:
+        digest.update(path.encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            continue
+    return digest.hexdigest()[:12]
+
+
+def precache_manifest():
+    """URLs the worker fetches into its versioned cache on install."""
+    return ([url_for(endpoint) for endpoint in PRECACHE_PAGES]
+            + [asset_url(name) for name in PRECACHE_STATIC])
+
+
+def service_worker():
+    config = current_app.config
+    response = current_app.response_class(
+        render_template(
+            SW_TEMPLATE,
+            version=current_app.extensions['pwa_version'],
+            precache=precache_manifest(),
+            thumbnail_max_entries=config['SW_THUMBNAIL_CACHE_ENTRIES'],
+            thumbnail_max_bytes=config['SW_THUMBNAIL_CACHE_BYTES'],
+            api_max_entries=config['SW_API_CACHE_ENTRIES'],
+        ),
+        mimetype='application/javascript',
+    )
+    # Browsers must always revalidate the worker script to pick up new builds
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def init_app(app):
+    app.extensions['pwa_version'] = build_version(app)
+    app.add_url_rule('/sw.js', 'service_worker', service_worker)
@@ -0,0 +1,165 @@
+"""Query construction shared by the ``api`` blueprint and the async API.
+
+Functions here only build ``Select`` statements and shape results, so the
+same SQL runs whether it is executed on ``db.session`` or an ``AsyncSession``.
+"""
+import math
+
+from sqlalchemy import func, or_, select, text
+
+from models import Wine, WineTombstone
+
+
+SORT_FIELDS = ('date_added', 'wine_name', 'vineyard_name', 'vintage_year', 'rating')
+DEFAULT_PER_PAGE = 20
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+
+
+def search_wines(q='', rating=None, year_from=None, year_to=None):
+    stmt = select(Wine)
+    if q:
+        stmt = stmt.where(or_(
+            Wine.wine_name.ilike(f'%{q}%'),
+            Wine.vineyard_name.ilike(f'%{q}%')
+        ))
+    if rating:
+        stmt = stmt.where(Wine.rating == rating)
+    if year_from:
+        stmt = stmt.where(Wine.vintage_year >= year_from)
+    if year_to:
+        stmt = stmt.where(Wine.vintage_year <= year_to)
+    return stmt.order_by(Wine.date_added.desc())
+
+
+def list_wines(sort_by='date_added', order='desc'):
+    if sort_by not in SORT_FIELDS:
+        sort_by = 'date_added'
+    sort_field = getattr(Wine, sort_by)
+    return select(Wine).order_by(sort_field.asc() if order == 'asc' else sort_field.desc())
+
+
+def suggestions(q, limit=5):
+    """Statements for matching wine names and vineyard names."""
+    return {
+        'wine': select(Wine.wine_name).where(Wine.wine_name.ilike(f'%{q}%')).distinct().limit(limit),
+        'vineyard': select(Wine.vineyard_name).where(Wine.vineyard_name.ilike(f'%{q}%')).distinct().limit(limit),
+    }
+
+
+def suggestions_payload(wine_names, vineyard_names):
+    suggestions = [{'type': 'wine', 'value': name} for name in wine_names]
+    suggestions += [{'type': 'vineyard', 'value': name} for name in vineyard_names]
+    return {'suggestions': suggestions[:10]}
+
+
+def wine_count():
+    return select(func.count()).select_from(Wine)
+
+
+def stats_statements():
+    """Aggregates for the stats endpoint, run after :func:`wine_count`."""
+    return {
+        'average_rating': select(func.avg(Wine.rating)),
+        'rating_distribution': select(Wine.rating, func.count(Wine.id)).group_by(Wine.rating),
+        'wines_by_year': select(Wine.vintage_year, func.count(Wine.id))
+            .group_by(Wine.vintage_year).order_by(Wine.vintage_year.desc()).limit(10),
+        'top_vineyards': select(
+            Wine.vineyard_name,
+            func.count(Wine.id).label('count'),
+            func.avg(Wine.rating).label('avg_rating')
+        ).group_by(Wine.vineyard_name).order_by(text('count DESC')).limit(5),
+    }
+
+
+def stats_payload(total_wines, avg_rating=None, rating_dist=(), wines_by_year=(), top_vineyards=()):
+    if total_wines == 0:
+        return {
+            'total_wines': 0,
+            'average_rating': 0,
+            'rating_distribution': {},
+            'wines_by_year': {},
+            'top_vineyards': []
+        }
+    return {
+        'total_wines': total_wines,
+        'average_rating': round(avg_rating or 0, 2),
+        'rating_distribution': {str(r): c for r, c in rating_dist},
+        'wines_by_year': {str(y): c for y, c in wines_by_year},
+        'top_vineyards': [
+            {
+                'name': v[0],
+                'count': v[1],
+                'avg_rating': round(v[2], 2)
+            } for v in top_vineyards
+        ]
+    }
+
+
+def page_bounds(page, per_page):
+    """Clamp page arguments the way ``db.paginate(error_out=False)`` does."""
+    page = page if page is not None and page >= 1 else 1
+    per_page = per_page if per_page is not None and per_page >= 1 else DEFAULT_PER_PAGE
+    return page, per_page
+
+
+def page_statements(stmt, page, per_page):
+    """``(items, count)`` statements for one page of ``stmt``."""
+    page, per_page = page_bounds(page, per_page)
+    items = stmt.limit(per_page).offset((page - 1) * per_page)
+    count = select(func.count()).select_from(stmt.order_by(None).subquery())
+    return items, count
+
+
+def page_count(total, per_page):
+    _, per_page = page_bounds(1, per_page)
+    return math.ceil(total / per_page) if total else 0
+
+
+def page_payload(wines, total, page, per_page, pages, sprites=None):
+    """One page of wines; ``sprites`` (from :func:`sprites.sprite_cells`) adds
+    each wine's sprite sheet cell, or None, as ``sprite``."""
+    payload = {
+        'wines': [wine.to_dict() for wine in wines],
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pages
+    }
+    if sprites is not None:
+        for wine in payload['wines']:
+            wine['sprite'] = sprites.get(wine['id'])
+    return payload
+
+
+def changes_statements(since, limit):
+    """Wines and tombstones with ``change_seq`` above ``since``.
+
+    Each statement fetches one extra row so :func:`changes_payload` can tell
+    whether another page follows.
+    """
+    return {
+        'wines': select(Wine).where(Wine.change_seq > since).order_by(Wine.change_seq).limit(limit + 1),
+        'deleted': select(WineTombstone.wine_id, WineTombstone.change_seq)
+            .where(WineTombstone.change_seq > since).order_by(WineTombstone.change_seq).limit(limit + 1),
+    }
+
+
+def changes_payload(wines, tombstones, since, limit):
+    """Merge both streams into one page of at most ``limit`` changes.
+
+    A wine row only ever carries a higher sequence number than tombstones for
+    the same id, so clients apply ``deleted`` before ``wines``.
+    """
+    merged = sorted(
+        [(wine.change_seq, 'wine', wine) for wine in wines]
+        + [(seq, 'deleted', wine_id) for wine_id, seq in tombstones],
+        key=lambda change: change[0]
+    )
+    page = merged[:limit]
+    return {
+        'wines': [dict(item.to_dict(), change_seq=seq) for seq, kind, item in page if kind == 'wine'],
+        'deleted': [item for _, kind, item in page if kind == 'deleted'],
+        'next_since': page[-1][0] if page else since,
+        'has_more': len(merged) > limit
+    }
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, UTC
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+
+
+EXPLAIN_PREFIXES = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN '}
+MAX_PARAMETER_LENGTH = 500
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_PLACEHOLDER_LIST = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """Reduce a statement to its shape so differing literals group together."""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?, ...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def log_path(app):
+    return app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.log')
+
+
+def explain(conn, statement, parameters):
+    """Return the query plan for ``statement`` as a list of lines.
+
+    Runs on a separate raw cursor so the pending result set is untouched and
+    no engine events fire. On PostgreSQL the EXPLAIN is wrapped in a
+    savepoint so a failure cannot abort the caller's transaction.
+    """
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    savepoint = conn.dialect.name == 'postgresql'
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            raise
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+    # SQLite rows are (id, parent, notused, detail); PostgreSQL rows are (line,)
+    return [str(row[-1]) for row in rows]
+
+
+class SlowQueryLog:
+    """Times statements on one or more engines and logs those over a threshold.
+
+    ``engine`` is logged as ``primary``; :meth:`attach` adds further engines,
+    such as read replicas, to the same log.
+    """
+
+    def __init__(self, engine, path, threshold_ms, capture_plans=True,
+                 max_bytes=10 * 2 ** 20, backup_count=5):
+        self.engines = {}
+        self.threshold = threshold_ms / 1000
+        self.capture_plans = capture_plans
+        # A private logger keeps one handler per log even when several apps
+        # are created in the same process (tests, CLI).
+        self.logger = logging.Logger('slow_queries')
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                      delay=True, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.logger.addHandler(handler)
+        self.attach(engine, 'primary')
+
+    def attach(self, engine, name):
+        """Also log statements on ``engine``, tagged with ``name``."""
+        self.engines[engine] = name
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def close(self):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self.engines = {}
+        for handler in self.logger.handlers:
+            handler.close()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_slow_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('_slow_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if elapsed < self.threshold:
+            return
+
+        entry = {
+            'timestamp': datetime.now(UTC).isoformat(),
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement,
+            'parameters': repr(parameters)[:MAX_PARAMETER_LENGTH],
+            'executemany': executemany,
+            'engine': self.engines.get(conn.engine),
+            'route': None,
+        }
+        if has_request_context():
+            entry['route'] = request.endpoint
+            entry['method'] = request.method
+            entry['path'] = request.full_path.rstrip('?')
+        if self.capture_plans and not executemany and statement.lstrip()[:6].upper() in ('SELECT', 'WITH'):
+            entry['plan'] = explain(conn, statement, parameters)
+        self.logger.warning(json.dumps(entry))
+
+
+def read_entries(path):
+    """Yield entries from a slow-query log and its rotated backups, oldest first."""
+    paths = [f'{path}.{n}' for n in range(99, 0, -1) if os.path.exists(f'{path}.{n}')]
+    if os.path.exists(path):
+        paths.append(path)
+    for filename in paths:
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries):
+    """Group entries by normalized statement, worst total time first."""
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                  'routes': defaultdict(int), 'worst': None})
+    for entry in entries:
+        group = groups[normalize_statement(entry['statement'])]
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['routes'][entry.get('route') or '(no request)'] += 1
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['worst'] = entry
+
+    summary = []
+    for statement, group in groups.items():
+        summary.append({
+            'statement': statement,
+            'count': group['count'],
+            'total_ms': round(group['total_ms'], 2),
+            'mean_ms': round(group['total_ms'] / group['count'], 2),
+            'max_ms': group['max_ms'],
+            'routes': dict(sorted(group['routes'].items(), key=lambda item: -item[1])),
+            'plan': group['worst'].get('plan'),
+        })
+    summary.sort(key=lambda row: row['total_ms'], reverse=True)
+    return summary
+
+
+def init_app(app):
+    """Log statements slower than ``SLOW_QUERY_THRESHOLD_MS`` to a rotating file."""
+    if not app.config.get('SLOW_QUERY_LOG_ENABLED'):
+        return
+    path = log_path(app)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with app.app_context():
+        engine = db.engine
+    log = SlowQueryLog(
+        engine,
+        path,
+        threshold_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS', 100),
+        capture_plans=app.config.get('SLOW_QUERY_EXPLAIN', True),
+        max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 2 ** 20),
+        backup_count=app.config.get('SLOW_QUERY_LOG_BACKUPS', 5),
+    )
+    app.extensions['slow_query_log'] = log
+    # Reads routed to replicas (see replicas.py) never touch db.engine
+    replicas = app.extensions.get('db_replicas')
+    for i, replica in enumerate(replicas.engines if replicas else ()):
+        log.attach(replica, f'replica{i}')
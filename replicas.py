@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+STICKY_SESSION_KEY = '_db_primary_until'
+# POST endpoints that only read: /api/batch runs GET sub-requests
+READ_ONLY_ENDPOINTS = frozenset({'api.run_batch'})
+
+
+def create_replica_engines(config):
+    """One engine per URI in ``SQLALCHEMY_REPLICA_URIS``, tuned like the primary."""
+    from database import engine_options, install_sqlite_pragmas
+
+    engines = []
+    for uri in config.get('SQLALCHEMY_REPLICA_URIS') or ():
+        engine = create_engine(uri, **engine_options(config, uri))
+        install_sqlite_pragmas(engine, config)
+        engines.append(engine)
+    return engines
+
+
+class ReplicaSet:
+    """Read replicas with a cached health status.
+
+    A replica is pinged at most once per ``check_interval`` seconds; one that
+    fails a ping or raises a connection error is skipped until it passes again.
+    """
+
+    def __init__(self, engines, check_interval=10.0):
+        self.engines = list(engines)
+        self.check_interval = check_interval
+        self._healthy = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+        for engine in self.engines:
+            event.listen(engine, 'handle_error', self._on_error)
+
+    def _on_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.engine)
+
+    def mark_down(self, engine):
+        with self._lock:
+            self._healthy[engine] = False
+            self._checked_at[engine] = time.monotonic()
+
+    def _ping(self, engine):
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('SELECT 1')
+            return True
+        except Exception as e:
+            current_app.logger.warning("Read replica %s unavailable: %s", engine.url, e)
+            return False
+
+    def is_healthy(self, engine):
+        with self._lock:
+            checked_at = self._checked_at.get(engine)
+            if checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+                return self._healthy[engine]
+            # Claim the check so concurrent requests don't all ping at once
+            self._checked_at[engine] = time.monotonic()
+            self._healthy.setdefault(engine, True)
+        healthy = self._ping(engine)
+        with self._lock:
+            self._healthy[engine] = healthy
+        return healthy
+
+    def choose(self):
+        """A healthy replica engine, or None to fall back to the primary."""
+        healthy = [engine for engine in self.engines if self.is_healthy(engine)]
+        return random.choice(healthy) if healthy else None
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica chosen for the current request.
+
+    Writes (ORM flushes, DML statements and ``SELECT ... FOR UPDATE``) always
+    go to the primary, and once a request has written, its remaining reads
+    follow so it can see its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g._db_wrote = True
+                g._db_replica = None
+            elif g.get('_db_replica') is not None:
+                return g._db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+def _reads_from_replica():
+    if request.method not in SAFE_METHODS and request.endpoint not in READ_ONLY_ENDPOINTS:
+        return False
+    if request.blueprint not in current_app.config['REPLICA_READ_BLUEPRINTS']:
+        return False
+    return session.get(STICKY_SESSION_KEY, 0) <= time.time()
+
+
+def _select_replica():
+    # ``g`` can outlive a request (an app context held open around several),
+    # so always reset the routing state
+    g._db_wrote = False
+    g._db_replica = None
+    if _reads_from_replica():
+        g._db_replica = current_app.extensions['db_replicas'].choose()
+
+
+def _remember_write(response):
+    sticky = current_app.config['REPLICA_STICKY_SECONDS']
+    if g.get('_db_wrote') and sticky:
+        session[STICKY_SESSION_KEY] = time.time() + sticky
+    return response
+
+
+def _clear_replica(exc=None):
+    g.pop('_db_replica', None)
+    g.pop('_db_wrote', None)
+
+
+def init_app(app):
+    """Route read-only requests to ``SQLALCHEMY_REPLICA_URIS``.
+
+    Safe-method requests to ``REPLICA_READ_BLUEPRINTS`` read from a healthy
+    replica. For ``REPLICA_STICKY_SECONDS`` after a request that wrote, the
+    session cookie pins that client to the primary so it reads its own writes.
+    """
+    if not app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        return
+    app.extensions['db_replicas'] = ReplicaSet(
+        create_replica_engines(app.config),
+        check_interval=app.config['REPLICA_HEALTH_CHECK_INTERVAL'],
+    )
+    app.before_request(_select_replica)
+    app.after_request(_remember_write)
+    app.teardown_request(_clear_replica)
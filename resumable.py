@@ -0,0 +1,298 @@
+"""Resumable chunked uploads for label photos (a subset of tus 1.0).
+
+    POST   /api/uploads       Upload-Length, Upload-Metadata: filename <b64>[,sha256 <b64 hex>]
+                              -> 201, Location: /api/uploads/<id>
+    HEAD   /api/uploads/<id>  -> Upload-Offset, Upload-Length
+    PATCH  /api/uploads/<id>  Upload-Offset, Content-Type: application/offset+octet-stream,
+                              optional Upload-Checksum: <sha1|sha256|md5> <b64 digest>
+                              -> 204 with the new Upload-Offset, or 201 with the
+                              processed image once the last byte arrives
+    DELETE /api/uploads/<id>  -> 204
+
+Chunks are streamed to ``UPLOAD_SPOOL_FOLDER`` one block at a time, so a
+request holds at most ``BLOCK_SIZE`` bytes of the body in memory whatever
+the file size. Each upload is a ``<id>.part`` file, whose size is the offset,
+and a ``<id>.json`` record. When the file is complete it is checked against
+the optional whole-file ``sha256`` (a mismatch drops the upload) and handed to ``save_and_process_image``
+as an open file. The result is an :class:`ImageUpload`, which the add form
+and the bulk API accept by ``image_id``. The record keeps that result, so a
+client whose connection dropped before the final response can repeat the
+last PATCH and get it again.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from extensions import db
+from models import ImageUpload
+from utils import allowed_file, delete_image_files, save_and_process_image
+
+
+TUS_VERSION = '1.0.0'
+BLOCK_SIZE = 64 * 1024
+CHECKSUM_ALGORITHMS = ('sha1', 'sha256', 'md5')
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """A request the upload protocol rejects; ``status`` is the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def spool_folder(config=None):
+    config = current_app.config if config is None else config
+    return config.get('UPLOAD_SPOOL_FOLDER') or os.path.join(current_app.instance_path, 'upload_spool')
+
+
+def _paths(upload_id):
+    if not _UPLOAD_ID.match(upload_id):
+        raise UploadError('Upload not found', 404)
+    folder = spool_folder()
+    return os.path.join(folder, f'{upload_id}.json'), os.path.join(folder, f'{upload_id}.part')
+
+
+def _read_record(record_path):
+    try:
+        with open(record_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404) from None
+
+
+def _write_record(record_path, record):
+    tmp = f'{record_path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp, record_path)
+
+
+def parse_metadata(header):
+    """``Upload-Metadata`` as a dict: comma-separated ``key base64value`` pairs."""
+    metadata = {}
+    for pair in filter(None, (part.strip() for part in (header or '').split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode('utf-8') if value else ''
+        except (binascii.Error, UnicodeDecodeError):
+            raise UploadError(f'Upload-Metadata value for {key} is not valid base64') from None
+    return metadata
+
+
+def parse_checksum(header):
+    """``Upload-Checksum`` as ``(algorithm, digest bytes)``, or None."""
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(' ')
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Upload-Checksum algorithm must be one of {', '.join(CHECKSUM_ALGORITHMS)}")
+    try:
+        return algorithm, base64.b64decode(value, validate=True)
+    except binascii.Error:
+        raise UploadError('Upload-Checksum digest is not valid base64') from None
+
+
+def create_upload(length, metadata):
+    """Start an upload of ``length`` bytes; returns its id."""
+    max_size = current_app.config['CHUNKED_UPLOAD_MAX_SIZE']
+    if length is None or length <= 0:
+        raise UploadError('Upload-Length must be a positive integer')
+    if length > max_size:
+        raise UploadError(f'Uploads are limited to {max_size} bytes', 413)
+    filename = metadata.get('filename', '')
+    if not allowed_file(filename):
+        raise UploadError('Upload-Metadata must include a filename with an image extension')
+    sha256 = metadata.get('sha256', '').lower() or None
+    if sha256 is not None and not re.match(r'^[0-9a-f]{64}$', sha256):
+        raise UploadError('Upload-Metadata sha256 must be a hex SHA-256 digest')
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(spool_folder(), exist_ok=True)
+    record_path, part_path = _paths(upload_id)
+    open(part_path, 'wb').close()
+    _write_record(record_path, {'length': length, 'filename': filename, 'sha256': sha256})
+    return upload_id
+
+
+def upload_offset(upload_id):
+    """``(offset, length)`` of an upload."""
+    record_path, part_path = _paths(upload_id)
+    record = _read_record(record_path)
+    if 'image' in record:
+        return record['length'], record['length']
+    try:
+        return os.path.getsize(part_path), record['length']
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404) from None
+
+
+@contextmanager
+def _locked(path):
+    """Open ``path`` for writing with an exclusive lock; a concurrent PATCH gets 423."""
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404) from None
+    with f:
+        try:
+            import fcntl
+        except ImportError:  # Windows: a single dev server
+            yield f
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Another request is writing to this upload', 423) from None
+        yield f
+
+
+def _copy_chunk(stream, f, limit, checksum):
+    """Copy at most ``limit`` bytes from ``stream`` to ``f``, one block at a time."""
+    digest = hashlib.new(checksum[0]) if checksum else None
+    written = 0
+    while True:
+        block = stream.read(min(BLOCK_SIZE, limit - written + 1))
+        if not block:
+            break
+        written += len(block)
+        if written > limit:
+            raise UploadError('Chunk runs past Upload-Length', 413)
+        f.write(block)
+        if digest is not None:
+            digest.update(block)
+    if digest is not None and digest.digest() != checksum[1]:
+        raise UploadError('Upload-Checksum does not match the chunk', 460)
+    return written
+
+
+def append_chunk(upload_id, offset, stream, checksum=None):
+    """Write a chunk at ``offset``; returns ``(new_offset, image)`` where
+    ``image`` is the processed upload's dict once the file is complete."""
+    record_path, part_path = _paths(upload_id)
+    record = _read_record(record_path)
+    if 'image' in record:
+        return record['length'], record['image']
+
+    with _locked(part_path) as f:
+        # A request that held the lock may have just finished the upload
+        record = _read_record(record_path)
+        if 'image' in record:
+            return record['length'], record['image']
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise UploadError(f'Upload-Offset must be {current}', 409)
+        f.seek(current)
+        try:
+            current += _copy_chunk(stream, f, record['length'] - current, checksum)
+        except Exception as e:
+            # After a dropped connection, keep what arrived so the client can
+            # resume from there, unless a checksum has to vouch for the chunk
+            if checksum is None and not isinstance(e, UploadError):
+                f.flush()
+            else:
+                f.truncate(offset)
+            raise
+        f.flush()
+        os.fsync(f.fileno())
+        if current < record['length']:
+            return current, None
+        if record['sha256'] and _file_sha256(f) != record['sha256']:
+            # Some byte on disk is wrong and nothing says which, so the upload
+            # is dropped (HEAD then 404s) and the client must start over
+            _remove(part_path, record_path)
+            raise UploadError('The file does not match its sha256; start a new upload', 460)
+        image = _finish(record, f)
+        record['image'] = image
+        _write_record(record_path, record)
+    os.remove(part_path)
+    return record['length'], image
+
+
+def _file_sha256(f):
+    f.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _finish(record, f):
+    """Process a complete upload; returns the new image's dict."""
+    f.seek(0)
+    metadata = {}
+    image_path, thumbnail_path = save_and_process_image(FileStorage(stream=f, filename=record['filename']),
+                                                        metadata)
+    if not image_path:
+        raise UploadError('Error processing image')
+    upload = ImageUpload(
+        image_path=image_path,
+        thumbnail_path=thumbnail_path,
+        label_hash=metadata.get('label_hash'),
+        label_features=metadata.get('label_features'),
+        placeholder=metadata.get('placeholder')
+    )
+    try:
+        db.session.add(upload)
+        db.session.flush()
+        payload = upload.to_dict()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        delete_image_files(image_path, thumbnail_path)
+        raise
+    return payload
+
+
+def cancel_upload(upload_id):
+    record_path, part_path = _paths(upload_id)
+    _read_record(record_path)
+    _remove(part_path, record_path)
+
+
+def expire_uploads(max_age=None, dry_run=False):
+    """Remove uploads untouched for ``max_age`` seconds (default
+    ``CHUNKED_UPLOAD_EXPIRY``); returns ``(uploads, bytes)`` removed."""
+    if max_age is None:
+        max_age = current_app.config['CHUNKED_UPLOAD_EXPIRY']
+    cutoff = time.time() - max_age
+    folder = spool_folder()
+    expired = size = 0
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return 0, 0
+    for entry in entries:
+        if not entry.name.endswith('.json'):
+            continue
+        upload_id = entry.name[:-len('.json')]
+        paths = [entry.path, os.path.join(folder, f'{upload_id}.part')]
+        try:
+            stats = [os.stat(path) for path in paths if os.path.exists(path)]
+        except OSError:
+            continue
+        if max(stat.st_mtime for stat in stats) > cutoff:
+            continue
+        expired += 1
+        size += sum(stat.st_size for stat in stats)
+        if not dry_run:
+            _remove(*paths)
+    return expired, size
@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
-from models import Wine
-from extensions import db
-from sqlalchemy import or_, and_
+import io
+
+from flask import Blueprint, current_app, request, jsonify, url_for
+from werkzeug.datastructures import FileStorage
+from models import Wine, ImageUpload
+from extensions import db, csrf
+from utils import save_and_process_image, delete_image_files
+import batch
+import bulk
+import queries
+import resumable
+import sprites
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -15,35 +23,11 @@ def search():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    wines_query = Wine.query
-    
-    if query:
-        search_filter = or_(
-            Wine.wine_name.ilike(f'%{query}%'),
-            Wine.vineyard_name.ilike(f'%{query}%')
-        )
-        wines_query = wines_query.filter(search_filter)
-    
-    if rating:
-        wines_query = wines_query.filter(Wine.rating == rating)
-    
-    if year_from:
-        wines_query = wines_query.filter(Wine.vintage_year >= year_from)
-    
-    if year_to:
-        wines_query = wines_query.filter(Wine.vintage_year <= year_to)
+    stmt = queries.search_wines(query, rating, year_from, year_to)
+    pagination = db.paginate(stmt, page=page, per_page=per_page, error_out=False)
     
-    wines_query = wines_query.order_by(Wine.date_added.desc())
-    
-    pagination = wines_query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    return jsonify({
-        'wines': [wine.to_dict() for wine in pagination.items],
-        'total': pagination.total,
-        'page': page,
-        'per_page': per_page,
-        'pages': pagination.pages
-    })
+    return jsonify(queries.page_payload(pagination.items, pagination.total, page, per_page,
+                                        pagination.pages, sprites=sprites.sprite_cells(pagination.items)))
 
 
 @bp.route('/wines/<int:wine_id>')
@@ -52,6 +36,22 @@ def get_wine(wine_id):
     return jsonify(wine.to_dict())
 
 
+@bp.route('/wines/<int:wine_id>/similar')
+def get_similar_wines(wine_id):
+    from similarity import find_similar_wines
+
+    wine = Wine.query.get_or_404(wine_id)
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    return jsonify({
+        'wine_id': wine.id,
+        'similar': [
+            dict(similar.to_dict(), score=round(score, 4))
+            for similar, score in find_similar_wines(wine, limit=limit)
+        ]
+    })
+
+
 @bp.route('/wines', methods=['GET'])
 def get_wines():
     page = request.args.get('page', 1, type=int)
@@ -59,27 +59,11 @@ def get_wines():
     sort_by = request.args.get('sort_by', 'date_added')
     order = request.args.get('order', 'desc')
     
-    valid_sort_fields = ['date_added', 'wine_name', 'vineyard_name', 'vintage_year', 'rating']
-    if sort_by not in valid_sort_fields:
-        sort_by = 'date_added'
+    pagination = db.paginate(queries.list_wines(sort_by, order), page=page, per_page=per_page,
+                             error_out=False)
     
-    sort_field = getattr(Wine, sort_by)
-    if order == 'asc':
-        sort_field = sort_field.asc()
-    else:
-        sort_field = sort_field.desc()
-    
-    pagination = Wine.query.order_by(sort_field).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    return jsonify({
-        'wines': [wine.to_dict() for wine in pagination.items],
-        'total': pagination.total,
-        'page': page,
-        'per_page': per_page,
-        'pages': pagination.pages
-    })
+    return jsonify(queries.page_payload(pagination.items, pagination.total, page, per_page,
+                                        pagination.pages))
 
 
 @bp.route('/wines/suggestions')
@@ -89,65 +73,210 @@ def get_suggestions():
     if not query or len(query) < 2:
         return jsonify({'suggestions': []})
     
-    wine_suggestions = db.session.query(Wine.wine_name).filter(
-        Wine.wine_name.ilike(f'%{query}%')
-    ).distinct().limit(5).all()
-    
-    vineyard_suggestions = db.session.query(Wine.vineyard_name).filter(
-        Wine.vineyard_name.ilike(f'%{query}%')
-    ).distinct().limit(5).all()
-    
-    suggestions = []
-    for wine in wine_suggestions:
-        suggestions.append({'type': 'wine', 'value': wine[0]})
-    
-    for vineyard in vineyard_suggestions:
-        suggestions.append({'type': 'vineyard', 'value': vineyard[0]})
+    statements = queries.suggestions(query)
+    wine_names = db.session.scalars(statements['wine']).all()
+    vineyard_names = db.session.scalars(statements['vineyard']).all()
     
-    return jsonify({'suggestions': suggestions[:10]})
+    return jsonify(queries.suggestions_payload(wine_names, vineyard_names))
 
 
 @bp.route('/stats')
 def get_stats():
-    total_wines = Wine.query.count()
+    total_wines = db.session.scalar(queries.wine_count())
     
     if total_wines == 0:
-        return jsonify({
-            'total_wines': 0,
-            'average_rating': 0,
-            'rating_distribution': {},
-            'wines_by_year': {},
-            'top_vineyards': []
-        })
-    
-    avg_rating = db.session.query(db.func.avg(Wine.rating)).scalar() or 0
-    
-    rating_dist = db.session.query(
-        Wine.rating,
-        db.func.count(Wine.id)
-    ).group_by(Wine.rating).all()
-    
-    wines_by_year = db.session.query(
-        Wine.vintage_year,
-        db.func.count(Wine.id)
-    ).group_by(Wine.vintage_year).order_by(Wine.vintage_year.desc()).limit(10).all()
-    
-    top_vineyards = db.session.query(
-        Wine.vineyard_name,
-        db.func.count(Wine.id).label('count'),
-        db.func.avg(Wine.rating).label('avg_rating')
-    ).group_by(Wine.vineyard_name).order_by(db.text('count DESC')).limit(5).all()
+        return jsonify(queries.stats_payload(0))
     
-    return jsonify({
-        'total_wines': total_wines,
-        'average_rating': round(avg_rating, 2),
-        'rating_distribution': {str(r): c for r, c in rating_dist},
-        'wines_by_year': {str(y): c for y, c in wines_by_year},
-        'top_vineyards': [
-            {
-                'name': v[0],
-                'count': v[1],
-                'avg_rating': round(v[2], 2)
-            } for v in top_vineyards
-        ]
-    })
\ No newline at end of file
+    statements = queries.stats_statements()
+    return jsonify(queries.stats_payload(
+        total_wines,
+        db.session.scalar(statements['average_rating']),
+        db.session.execute(statements['rating_distribution']).all(),
+        db.session.execute(statements['wines_by_year']).all(),
+        db.session.execute(statements['top_vineyards']).all(),
+    ))
+
+
+@bp.route('/changes')
+def get_changes():
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', queries.DEFAULT_CHANGES_LIMIT, type=int)
+    if since < 0:
+        return jsonify({'error': 'since must be a sync token from a previous response, or 0'}), 400
+    limit = max(1, min(limit, queries.MAX_CHANGES_LIMIT))
+    
+    statements = queries.changes_statements(since, limit)
+    return jsonify(queries.changes_payload(
+        db.session.scalars(statements['wines']).all(),
+        db.session.execute(statements['deleted']).all(),
+        since,
+        limit,
+    ))
+
+
+@bp.route('/batch', methods=['POST'])
+@csrf.exempt
+def run_batch():
+    """Run several GET requests to this blueprint in one round trip."""
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'error': 'Expected a JSON body'}), 400
+    try:
+        paths, parallel = batch.parse_requests(payload)
+    except batch.BatchRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'responses': batch.run(paths, parallel)})
+
+
+# Write endpoints take JSON or raw image bodies only. Browsers cannot send
+# those cross-site without a CORS preflight, so they are exempt from the
+# form CSRF token that the HTML routes use.
+IMAGE_CONTENT_TYPES = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/heic': 'heic', 'image/heif': 'heif'}
+
+
+@bp.route('/images', methods=['POST'])
+@csrf.exempt
+def upload_image():
+    """Process a raw image body so bulk calls can reference it by ``image_id``."""
+    ext = IMAGE_CONTENT_TYPES.get(request.mimetype)
+    if ext is None:
+        return jsonify({'error': f"Content-Type must be one of {', '.join(IMAGE_CONTENT_TYPES)}"}), 415
+    
+    file = FileStorage(stream=io.BytesIO(request.get_data()), filename=f'upload.{ext}')
+    metadata = {}
+    image_path, thumbnail_path = save_and_process_image(file, metadata)
+    if not image_path:
+        return jsonify({'error': 'Error processing image'}), 400
+    
+    upload = ImageUpload(
+        image_path=image_path,
+        thumbnail_path=thumbnail_path,
+        label_hash=metadata.get('label_hash'),
+        label_features=metadata.get('label_features'),
+        placeholder=metadata.get('placeholder')
+    )
+    try:
+        db.session.add(upload)
+        db.session.flush()
+        payload = upload.to_dict()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        delete_image_files(image_path, thumbnail_path)
+        return jsonify({'error': f'Error saving image: {str(e)}'}), 500
+    
+    return jsonify(payload), 201
+
+
+def _tus_response(response, status=None):
+    if status is not None:
+        response.status_code = status
+    response.headers['Tus-Resumable'] = resumable.TUS_VERSION
+    response.headers['Tus-Max-Size'] = str(current_app.config['CHUNKED_UPLOAD_MAX_SIZE'])
+    response.headers['Tus-Extension'] = 'creation,checksum,termination'
+    response.headers['Tus-Checksum-Algorithm'] = ','.join(resumable.CHECKSUM_ALGORITHMS)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _upload_error(e):
+    return _tus_response(jsonify({'error': str(e)}), e.status)
+
+
+@bp.route('/uploads', methods=['POST'])
+@csrf.exempt
+def create_upload():
+    """Start a resumable upload; the client then PATCHes chunks to ``Location``."""
+    try:
+        upload_id = resumable.create_upload(request.headers.get('Upload-Length', type=int),
+                                            resumable.parse_metadata(request.headers.get('Upload-Metadata')))
+    except resumable.UploadError as e:
+        return _upload_error(e)
+    
+    response = _tus_response(jsonify({'upload_id': upload_id, 'offset': 0}), 201)
+    response.headers['Location'] = url_for('api.append_upload', upload_id=upload_id)
+    return response
+
+
+@bp.route('/uploads/<upload_id>', methods=['HEAD'])
+def upload_offset(upload_id):
+    try:
+        offset, length = resumable.upload_offset(upload_id)
+    except resumable.UploadError as e:
+        return _tus_response(current_app.response_class(), e.status)
+    
+    response = _tus_response(current_app.response_class(), 200)
+    response.headers['Upload-Offset'] = str(offset)
+    response.headers['Upload-Length'] = str(length)
+    return response
+
+
+@bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@csrf.exempt
+def append_upload(upload_id):
+    """Append a chunk; the chunk that completes the file returns the image."""
+    if request.mimetype != 'application/offset+octet-stream':
+        return _upload_error(resumable.UploadError('Content-Type must be application/offset+octet-stream', 415))
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return _upload_error(resumable.UploadError('Upload-Offset is required'))
+    try:
+        offset, image = resumable.append_chunk(upload_id, offset, request.stream,
+                                               resumable.parse_checksum(request.headers.get('Upload-Checksum')))
+    except resumable.UploadError as e:
+        return _upload_error(e)
+    
+    if image is None:
+        response = _tus_response(current_app.response_class(), 204)
+    else:
+        response = _tus_response(jsonify(image), 201)
+    response.headers['Upload-Offset'] = str(offset)
+    return response
+
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@csrf.exempt
+def cancel_upload(upload_id):
+    try:
+        resumable.cancel_upload(upload_id)
+    except resumable.UploadError as e:
+        return _upload_error(e)
+    return _tus_response(current_app.response_class(), 204)
+
+
+def _bulk_write(handler, key):
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'error': 'Expected a JSON body'}), 400
+    try:
+        items = bulk.parse_items(payload, key)
+    except bulk.BulkRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        results = handler(items)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Bulk write failed')
+        return jsonify({'error': f'Error saving wines: {str(e)}'}), 500
+    
+    return jsonify(bulk.summarize(results))
+
+
+@bp.route('/wines/bulk', methods=['POST'])
+@csrf.exempt
+def create_wines_bulk():
+    return _bulk_write(bulk.create_wines, 'wines')
+
+
+@bp.route('/wines/bulk', methods=['PATCH'])
+@csrf.exempt
+def update_wines_bulk():
+    return _bulk_write(bulk.update_wines, 'wines')
+
+
+@bp.route('/wines/bulk', methods=['DELETE'])
+@csrf.exempt
+def delete_wines_bulk():
+    return _bulk_write(bulk.delete_wines, 'ids')
@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from models import Wine
+from models import Wine, ImageUpload
 from extensions import db
 from utils import save_and_process_image, delete_image_files
+from storage import queue_image_deletion, file_worker
+from label_index import find_duplicate_wines, get_label_index
 from datetime import datetime, UTC
 
 bp = Blueprint('wine', __name__, url_prefix='/wines')
@@ -26,20 +28,33 @@ def add_wine():
         rating = request.form.get('rating', type=int)
         notes = request.form.get('notes', '').strip()
         
-        if 'image' not in request.files:
-            flash('No image file provided', 'error')
-            return redirect(request.url)
-        
-        file = request.files['image']
-        if file.filename == '':
-            flash('No image selected', 'error')
-            return redirect(request.url)
-        
-        image_path, thumbnail_path = save_and_process_image(file)
-        
-        if not image_path:
-            flash('Error processing image. Please try again.', 'error')
-            return redirect(request.url)
+        # Large photos arrive beforehand through the resumable upload API
+        upload = None
+        image_id = request.form.get('image_id')
+        if image_id:
+            upload = db.session.get(ImageUpload, image_id)
+            if upload is None:
+                flash('The uploaded image has expired. Please upload it again.', 'error')
+                return redirect(request.url)
+            image_path, thumbnail_path = upload.image_path, upload.thumbnail_path
+            metadata = {'label_hash': upload.label_hash, 'label_features': upload.label_features,
+                        'placeholder': upload.placeholder}
+        else:
+            if 'image' not in request.files:
+                flash('No image file provided', 'error')
+                return redirect(request.url)
+            
+            file = request.files['image']
+            if file.filename == '':
+                flash('No image selected', 'error')
+                return redirect(request.url)
+            
+            metadata = {}
+            image_path, thumbnail_path = save_and_process_image(file, metadata)
+            
+            if not image_path:
+                flash('Error processing image. Please try again.', 'error')
+                return redirect(request.url)
         
         wine = Wine(
             wine_name=wine_name,
@@ -48,24 +63,39 @@ def add_wine():
             rating=rating,
             notes=notes,
             image_path=image_path,
-            thumbnail_path=thumbnail_path
+            thumbnail_path=thumbnail_path,
+            label_hash=metadata.get('label_hash'),
+            label_features=metadata.get('label_features'),
+            placeholder=metadata.get('placeholder')
         )
         
         errors = wine.validate()
         if errors:
-            delete_image_files(image_path, thumbnail_path)
+            # A pre-uploaded image stays claimable until the GC expires it
+            if upload is None:
+                delete_image_files(image_path, thumbnail_path)
             for error in errors:
                 flash(error, 'error')
             return redirect(request.url)
         
+        duplicates = find_duplicate_wines(wine.label_hash)
+        
         try:
             db.session.add(wine)
+            if upload is not None:
+                db.session.delete(upload)
             db.session.commit()
+            get_label_index().add(wine.id, wine.label_hash)
+            file_worker.notify()
             flash('Wine added successfully!', 'success')
+            for duplicate in duplicates:
+                flash(f'This label looks like {duplicate.wine_name} ({duplicate.vintage_year}) '
+                      f'from {duplicate.vineyard_name}, already in your collection.', 'warning')
             return redirect(url_for('wine.view_wine', wine_id=wine.id))
         except Exception as e:
             db.session.rollback()
-            delete_image_files(image_path, thumbnail_path)
+            if upload is None:
+                delete_image_files(image_path, thumbnail_path)
             flash(f'Error saving wine: {str(e)}', 'error')
             return redirect(request.url)
     
@@ -89,34 +119,46 @@ def edit_wine(wine_id):
         wine.rating = request.form.get('rating', type=int)
         wine.notes = request.form.get('notes', '').strip()
         
-        if 'image' in request.files and request.files['image'].filename != '':
-            file = request.files['image']
-            new_image_path, new_thumbnail_path = save_and_process_image(file)
-            
-            if new_image_path:
-                old_image_path = wine.image_path
-                old_thumbnail_path = wine.thumbnail_path
-                
-                wine.image_path = new_image_path
-                wine.thumbnail_path = new_thumbnail_path
-                
-                delete_image_files(old_image_path, old_thumbnail_path)
-        
+        # Validate before touching the filesystem so a rejected edit
+        # never leaves a freshly processed image behind.
         errors = wine.validate()
         if errors:
+            db.session.rollback()
             for error in errors:
                 flash(error, 'error')
             return redirect(request.url)
-        
+
+        new_image_path = new_thumbnail_path = None
+        if 'image' in request.files and request.files['image'].filename != '':
+            file = request.files['image']
+            metadata = {}
+            new_image_path, new_thumbnail_path = save_and_process_image(file, metadata)
+
+            if not new_image_path:
+                db.session.rollback()
+                flash('Error processing image. Please try again.', 'error')
+                return redirect(request.url)
+
+            # The replaced files are removed only once this update commits
+            queue_image_deletion(wine.image_path, wine.thumbnail_path)
+            wine.image_path = new_image_path
+            wine.thumbnail_path = new_thumbnail_path
+            wine.label_hash = metadata.get('label_hash')
+            wine.label_features = metadata.get('label_features')
+            wine.placeholder = metadata.get('placeholder')
+
         try:
             wine.date_modified = datetime.now(UTC)
             db.session.commit()
-            flash('Wine updated successfully!', 'success')
-            return redirect(url_for('wine.view_wine', wine_id=wine.id))
         except Exception as e:
             db.session.rollback()
+            delete_image_files(new_image_path, new_thumbnail_path)
             flash(f'Error updating wine: {str(e)}', 'error')
             return redirect(request.url)
+
+        file_worker.notify()
+        flash('Wine updated successfully!', 'success')
+        return redirect(url_for('wine.view_wine', wine_id=wine_id))
     
     return render_template('wines/edit.html', wine=wine, current_year=datetime.now().year)
 
@@ -126,10 +168,10 @@ def delete_wine(wine_id):
     wine = Wine.query.get_or_404(wine_id)
     
     try:
-        delete_image_files(wine.image_path, wine.thumbnail_path)
-        
+        queue_image_deletion(wine.image_path, wine.thumbnail_path)
         db.session.delete(wine)
         db.session.commit()
+        file_worker.notify()
         
         flash('Wine deleted successfully!', 'success')
         return redirect(url_for('main.index'))
@@ -0,0 +1,95 @@
+import os
+import random
+from datetime import datetime, timedelta, UTC
+
+from extensions import db
+from models import ChangeCounter, Wine
+from utils import get_upload_folders
+
+
+STYLES = ['Reserve', 'Estate', 'Old Vine', 'Grand Cru', 'Single Vineyard', 'Cuvée', 'Classic',
+          'Private Selection', 'Barrel Select', 'Late Harvest']
+VARIETALS = ['Cabernet Sauvignon', 'Pinot Noir', 'Merlot', 'Syrah', 'Chardonnay', 'Riesling',
+             'Sauvignon Blanc', 'Malbec', 'Zinfandel', 'Tempranillo', 'Grenache', 'Nebbiolo',
+             'Sangiovese', 'Chenin Blanc', 'Viognier']
+PLACES = ['Napa', 'Sonoma', 'Willamette', 'Barossa', 'Marlborough', 'Mendoza', 'Rioja',
+          'Mosel', 'Piedmont', 'Tuscany', 'Bordeaux', 'Burgundy', 'Rhône', 'Douro', 'Stellenbosch']
+VINEYARD_FORMS = ['{} Valley Vineyards', 'Château {}', '{} Cellars', 'Domaine {}', '{} Estate',
+                  'Bodega {}', '{} Hills Winery', 'Tenuta {}']
+SURNAMES = ['Marchetti', 'Dubois', 'Harlan', 'Keller', 'Alvarez', 'Whitford', 'Okafor', 'Lindqvist',
+            'Moreau', 'Castellano', 'Brennan', 'Novak', 'Tanaka', 'Fischer', 'Duarte']
+DESCRIPTORS = ['blackcurrant', 'cedar', 'cherry', 'plum', 'leather', 'tobacco', 'vanilla',
+               'citrus', 'green apple', 'minerality', 'pepper', 'violet', 'oak', 'honey', 'smoke']
+
+PLACEHOLDER_COLORS = ['#5b1a2b', '#7a2e3a', '#c9b037', '#2f4f4f', '#8b4513', '#f5deb3',
+                      '#556b2f', '#4b0082', '#b22222', '#daa520']
+
+
+def _placeholder_images(count):
+    """Write ``count`` solid-colour label images and return their stored paths."""
+    from PIL import Image, ImageDraw
+
+    upload_folder, thumbnail_folder = get_upload_folders()
+    os.makedirs(thumbnail_folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        color = PLACEHOLDER_COLORS[i % len(PLACEHOLDER_COLORS)]
+        name = f'seed_placeholder_{i}.jpg'
+        img = Image.new('RGB', (600, 900), color=color)
+        ImageDraw.Draw(img).rectangle((100, 250, 500, 650), outline='white', width=12)
+        img.save(os.path.join(upload_folder, name), 'JPEG', quality=80)
+        img.thumbnail((300, 300))
+        img.save(os.path.join(thumbnail_folder, f'thumb_{name}'), 'JPEG', quality=70)
+        paths.append((f'uploads/{name}', f'uploads/thumbnails/thumb_{name}'))
+    return paths
+
+
+def generate_wine_rows(count, images, rng, start=None):
+    """Yield insert dictionaries for ``count`` plausible wines."""
+    now = start or datetime.now(UTC)
+    current_year = now.year
+    vineyards = [form.format(rng.choice(PLACES + SURNAMES)) for form in VINEYARD_FORMS for _ in range(40)]
+    for i in range(count):
+        varietal = rng.choice(VARIETALS)
+        added = now - timedelta(minutes=count - i)
+        image_path, thumbnail_path = images[i % len(images)]
+        notes = None
+        if rng.random() < 0.7:
+            notes = f"Notes of {', '.join(rng.sample(DESCRIPTORS, 3))}."
+        yield {
+            'wine_name': f'{rng.choice(STYLES)} {varietal}',
+            'vineyard_name': rng.choice(vineyards),
+            'vintage_year': rng.randint(max(1800, current_year - 60), current_year - 1),
+            'rating': rng.choices([1, 2, 3, 4, 5], weights=[2, 6, 25, 42, 25])[0],
+            'notes': notes,
+            'image_path': image_path,
+            'thumbnail_path': thumbnail_path,
+            'date_added': added,
+            'date_modified': added,
+        }
+
+
+def seed_wines(count, batch_size=5000, images='shared', seed=None, progress=None):
+    """Insert ``count`` synthetic wines using batched executemany inserts.
+
+    ``images='shared'`` points every row at one generated label;
+    ``images='placeholder'`` cycles through a small set of distinct ones.
+    Returns the number of rows inserted.
+    """
+    rng = random.Random(seed)
+    image_paths = _placeholder_images(1 if images == 'shared' else len(PLACEHOLDER_COLORS))
+    rows = generate_wine_rows(count, image_paths, rng)
+    inserted = 0
+    while inserted < count:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        first_seq = ChangeCounter.reserve(db.session.connection(), len(batch))
+        for offset, row in enumerate(batch):
+            row['change_seq'] = first_seq + offset
+        db.session.execute(db.insert(Wine), batch)
+        db.session.commit()
+        inserted += len(batch)
+        if progress:
+            progress(inserted)
+    return inserted
@@ -0,0 +1,278 @@
+import json
+import math
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+from extensions import db
+from models import Wine
+
+
+HIST_BINS = 4
+GRAY_SIZE = 8
+FEATURE_DIM = HIST_BINS ** 3 + GRAY_SIZE * GRAY_SIZE
+SCORE_BATCH = 65536
+
+
+def extract_features(img):
+    """Compact label descriptor: a joint RGB histogram plus an 8x8 grayscale layout.
+
+    Both halves are normalised separately so colour and composition weigh
+    the same, and the result is unit length so a dot product is the cosine
+    similarity.
+    """
+    from PIL import Image
+
+    rgb = np.asarray(img.convert('RGB').resize((64, 64), Image.Resampling.BILINEAR))
+    quantised = (rgb // (256 // HIST_BINS)).reshape(-1, 3).astype(np.int32)
+    bins = (quantised[:, 0] * HIST_BINS + quantised[:, 1]) * HIST_BINS + quantised[:, 2]
+    hist = np.bincount(bins, minlength=HIST_BINS ** 3).astype(np.float32)
+    hist = np.sqrt(hist / hist.sum())
+
+    gray = np.asarray(
+        img.convert('L').resize((GRAY_SIZE, GRAY_SIZE), Image.Resampling.BILINEAR),
+        dtype=np.float32
+    ).ravel()
+    gray -= gray.mean()
+    norm = np.linalg.norm(gray)
+    if norm:
+        gray /= norm
+
+    vector = np.concatenate([hist / max(np.linalg.norm(hist), 1e-6), gray])
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+def features_from_bytes(data):
+    return np.frombuffer(data, dtype=np.float32) if data else None
+
+
+def extract_file_features(path):
+    """Feature bytes for an image on disk, or None. Top-level for process pools."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            return extract_features(img).tobytes()
+    except Exception:
+        return None
+
+
+def _kmeans(data, k, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = data[rng.choice(len(data), size=min(len(data), k * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(k):
+            members = sample[labels == c]
+            if len(members):
+                centroid = members.mean(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-6)
+    return centroids
+
+
+MANIFEST_NAME = 'index.json'
+BUILD_PREFIX = 'build-'
+# Written straight into the directory before builds were versioned
+LEGACY_FILES = ('features.npy', 'ids.npy', 'centroids.npy', 'offsets.npy', 'watermark')
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_index(directory, batch_size=10000, partition_threshold=50000):
+    """Write the feature matrix for every wine with features to ``directory``.
+
+    Rows are stored contiguously, grouped by coarse partition when the
+    collection is larger than ``partition_threshold``, so each partition is a
+    single slice of the memory-mapped matrix.
+
+    Each build goes into its own ``build-*`` subdirectory, and ``index.json``
+    is switched to it only once every file is written, so a reader never
+    pairs arrays from different builds. The build before the current one is
+    kept for readers still loading it; older ones are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    has_features = Wine.label_features.isnot(None)
+    # change_seq is handed out in commit order: rows committed after this
+    # read get a higher value, so the live scan in find_similar_wines sees them
+    watermark = db.session.scalar(db.select(db.func.max(Wine.change_seq))) or 0
+    count = db.session.query(db.func.count(Wine.id)).filter(has_features).scalar() or 0
+
+    build = f'{BUILD_PREFIX}{time.time_ns()}-{os.getpid()}'
+    build_dir = os.path.join(directory, build)
+    os.makedirs(build_dir)
+    matrix = np.lib.format.open_memmap(os.path.join(build_dir, 'features.npy'), mode='w+',
+                                       dtype=np.float32, shape=(count, FEATURE_DIM))
+    ids = np.empty(count, dtype=np.int64)
+    rows = db.session.execute(
+        db.select(Wine.id, Wine.label_features).where(has_features).order_by(Wine.id)
+        .execution_options(yield_per=batch_size)
+    )
+    n = 0
+    for wine_id, data in rows:
+        if n >= count:
+            break
+        vector = features_from_bytes(data)
+        if vector is None or vector.shape[0] != FEATURE_DIM:
+            continue
+        matrix[n] = vector
+        ids[n] = wine_id
+        n += 1
+    ids = ids[:n]
+
+    offsets = np.array([0, n], dtype=np.int64)
+    centroids = np.empty((0, FEATURE_DIM), dtype=np.float32)
+    if n >= partition_threshold:
+        centroids = _kmeans(matrix[:n], int(math.sqrt(n)))
+        labels = np.concatenate([
+            np.argmax(matrix[start:start + SCORE_BATCH] @ centroids.T, axis=1)
+            for start in range(0, n, SCORE_BATCH)
+        ])
+        order = np.argsort(labels, kind='stable')
+        matrix[:n] = matrix[:n][order]
+        ids = ids[order]
+        offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1)).astype(np.int64)
+
+    matrix.flush()
+    del matrix
+    np.save(os.path.join(build_dir, 'ids.npy'), ids)
+    np.save(os.path.join(build_dir, 'centroids.npy'), centroids)
+    np.save(os.path.join(build_dir, 'offsets.npy'), offsets)
+
+    previous = read_manifest(directory)
+    _write_manifest(directory, {'build': build, 'watermark': watermark, 'count': n})
+    keep = {build, previous and previous['build']}
+    for entry in os.scandir(directory):
+        if entry.name.startswith(BUILD_PREFIX) and entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name in LEGACY_FILES:
+            os.remove(entry.path)
+    return n
+
+
+class SimilarityIndex:
+    """Read side of the on-disk feature matrix, reloaded when it is rebuilt."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._build = None
+        self.matrix = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.centroids = np.empty((0, FEATURE_DIM), dtype=np.float32)
+        self.offsets = np.array([0, 0], dtype=np.int64)
+        self.watermark = None
+
+    def _load(self):
+        manifest = read_manifest(self.directory)
+        if manifest is None or manifest['build'] == self._build:
+            return
+        with self._lock:
+            if manifest['build'] == self._build:
+                return
+            build_dir = os.path.join(self.directory, manifest['build'])
+            try:
+                # Only the matrix is memory-mapped; the other arrays are small
+                matrix = np.load(os.path.join(build_dir, 'features.npy'), mmap_mode='r')
+                ids = np.load(os.path.join(build_dir, 'ids.npy'))
+                centroids = np.load(os.path.join(build_dir, 'centroids.npy'))
+                offsets = np.load(os.path.join(build_dir, 'offsets.npy'))
+            except FileNotFoundError:
+                # Superseded and removed while we read; keep the current arrays
+                return
+            self.matrix, self.ids, self.centroids, self.offsets = matrix, ids, centroids, offsets
+            self.watermark = manifest['watermark']
+            self._build = manifest['build']
+
+    def _ranges(self, query, nprobe):
+        if len(self.centroids) == 0:
+            return [(0, len(self.ids))]
+        nearest = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        return [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in nearest]
+
+    def search(self, query, limit=10, nprobe=8):
+        """Return ``(wine_id, score)`` for the best matches in the indexed matrix."""
+        self._load()
+        if self.matrix is None or len(self.ids) == 0:
+            return []
+        best_ids, best_scores = [], []
+        for start, stop in self._ranges(query, nprobe):
+            for chunk in range(start, stop, SCORE_BATCH):
+                end = min(chunk + SCORE_BATCH, stop)
+                scores = self.matrix[chunk:end] @ query
+                if len(scores) > limit:
+                    top = np.argpartition(scores, -limit)[-limit:]
+                else:
+                    top = np.arange(len(scores))
+                best_ids.append(self.ids[chunk:end][top])
+                best_scores.append(scores[top])
+        if not best_ids:
+            return []
+        ids = np.concatenate(best_ids)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(scores)[::-1][:limit]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def index_directory():
+    return current_app.config.get('SIMILARITY_INDEX_DIR') or \
+        os.path.join(current_app.instance_path, 'similarity')
+
+
+def get_similarity_index():
+    index = current_app.extensions.get('similarity_index')
+    if index is None:
+        index = current_app.extensions.setdefault('similarity_index', SimilarityIndex(index_directory()))
+    return index
+
+
+def find_similar_wines(wine, limit=10):
+    """Wines whose labels look most like ``wine``'s, as ``(wine, score)`` pairs.
+
+    Rows changed since the index was built are scored directly from the
+    database, so new wines are found before the next rebuild. That scan is
+    capped at the ``SIMILARITY_SCAN_LIMIT`` most recently changed rows; until
+    ``flask build-similarity-index`` has run, only those are searched.
+    """
+    query = features_from_bytes(wine.label_features)
+    if query is None or query.shape[0] != FEATURE_DIM:
+        return []
+    index = get_similarity_index()
+    nprobe = current_app.config.get('SIMILARITY_NPROBE', 8)
+    candidates = dict(index.search(query, limit=limit + 1, nprobe=nprobe))
+
+    recent = (db.select(Wine.id, Wine.label_features).where(Wine.label_features.isnot(None))
+              .order_by(Wine.change_seq.desc())
+              .limit(current_app.config.get('SIMILARITY_SCAN_LIMIT', 5000)))
+    if index.watermark is not None:
+        recent = recent.where(Wine.change_seq > index.watermark)
+    # Vectors from an older feature layout cannot be scored against this one
+    rows = [(wine_id, vector) for wine_id, vector in
+            ((wine_id, features_from_bytes(data)) for wine_id, data in db.session.execute(recent))
+            if vector.shape[0] == FEATURE_DIM]
+    if rows:
+        matrix = np.stack([vector for _, vector in rows])
+        for (wine_id, _), score in zip(rows, matrix @ query):
+            candidates[wine_id] = float(score)
+
+    candidates.pop(wine.id, None)
+    ranked = sorted(candidates.items(), key=lambda item: item[1], reverse=True)[:limit]
+    wines = {w.id: w for w in Wine.query.filter(Wine.id.in_([wine_id for wine_id, _ in ranked]))}
+    return [(wines[wine_id], score) for wine_id, score in ranked if wine_id in wines]
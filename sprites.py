@@ -0,0 +1,277 @@
+"""Thumbnail sprite sheets for the wine list and search results.
+
+A page of cards would otherwise fetch one thumbnail per wine. ``flask
+build-sprites`` (and the file worker, whenever wines change) packs
+thumbnails into WebP sheets by wine id: sheet ``n`` holds ids
+``n * SPRITE_SHEET_SIZE + 1`` up to ``(n + 1) * SPRITE_SHEET_SIZE``. A sheet's
+membership never depends on other sheets, so adding, editing or deleting a
+wine changes only the sheet its id falls in, and since ids follow the list's
+``date_added`` order a page of the list spans at most two sheets. Each sheet
+is named by a hash of the wines and thumbnails it holds, so a rebuild only
+renders sheets whose contents changed.
+
+``manifest.json`` records each sheet's layout and which wine sits in which
+cell. Pages look wines up there and keep the plain thumbnail for any wine
+that no current sheet covers, e.g. one added since the last build.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from flask import abort, current_app, send_from_directory
+from extensions import db
+from models import Wine, ChangeCounter
+from utils import load_image_libraries, resolve_image_path
+
+
+# Matches the card image box (.wine-image is 200px tall and at least 280px
+# wide); .sprite-cell in style.css assumes the same 3:2 ratio
+CELL_SIZE = (300, 200)
+CELL_BACKGROUND = (248, 249, 250)
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.lock'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@dataclass
+class SpriteReport:
+    built: int = 0
+    kept: int = 0
+    removed: int = 0
+
+
+def sprite_folder(config=None):
+    config = current_app.config if config is None else config
+    return config.get('SPRITE_FOLDER') or os.path.join(config['UPLOAD_FOLDER'], 'sprites')
+
+
+def sheet_name(entries, columns, quality):
+    """Content-addressed file name for a sheet of ``(wine_id, thumbnail_path)`` pairs."""
+    digest = hashlib.sha256(f'{CELL_SIZE}:{columns}:{quality}\n'.encode('utf-8'))
+    for wine_id, thumbnail_path in entries:
+        digest.update(f'{wine_id}:{thumbnail_path}\n'.encode('utf-8'))
+    return f'sheet.{digest.hexdigest()[:16]}.webp'
+
+
+def read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'sheets': {}, 'retired': {}}
+
+
+def _write_atomic(path, save):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    save(tmp)
+    os.replace(tmp, path)
+
+
+def _dump_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def iter_buckets(size, batch_size=2000):
+    """``(wine_id, thumbnail_path)`` pairs grouped by ``(wine_id - 1) // size``.
+
+    Deleted wines leave their bucket short rather than shifting later wines
+    into it, so buckets may hold fewer than ``size`` wines.
+    """
+    rows = db.session.execute(
+        db.select(Wine.id, Wine.thumbnail_path)
+        .order_by(Wine.id)
+        .execution_options(yield_per=batch_size)
+    )
+    bucket, run = None, []
+    for wine_id, thumbnail_path in rows:
+        if (wine_id - 1) // size != bucket:
+            if run:
+                yield run
+            bucket, run = (wine_id - 1) // size, []
+        run.append((wine_id, thumbnail_path))
+    if run:
+        yield run
+
+
+def render_sheet(entries, path, columns, quality):
+    """Pack the thumbnails of ``entries`` into one WebP; returns the sheet's
+    manifest entry. Thumbnails that cannot be read leave an empty cell."""
+    Image, ImageOps = load_image_libraries()
+    width, height = CELL_SIZE
+    columns = min(columns, len(entries))
+    rows = -(-len(entries) // columns)
+    sheet = Image.new('RGB', (columns * width, rows * height), CELL_BACKGROUND)
+    cells = []
+    for index, (wine_id, thumbnail_path) in enumerate(entries):
+        try:
+            with Image.open(resolve_image_path(thumbnail_path, thumbnail=True)) as img:
+                tile = ImageOps.fit(img.convert('RGB'), CELL_SIZE)
+        except OSError:
+            continue
+        sheet.paste(tile, (index % columns * width, index // columns * height))
+        cells.append([wine_id, thumbnail_path, index])
+    _write_atomic(path, lambda tmp: sheet.save(tmp, 'WEBP', quality=quality, method=4))
+    return {'columns': columns, 'rows': rows, 'cells': cells}
+
+
+@contextmanager
+def _build_lock(folder):
+    """Yield whether this process holds the build lock; other workers skip."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: a single dev server, nothing to race
+        yield True
+        return
+    with open(os.path.join(folder, LOCK_NAME), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def build_sprites(force=False):
+    """Bring the sheets up to date with the ``wines`` table.
+
+    Returns a :class:`SpriteReport`, or None if another process is building.
+    Sheets that drop out of the manifest are kept for
+    ``SPRITE_RETAIN_SECONDS`` so recently rendered (or offline cached) pages
+    can still load them.
+    """
+    config = current_app.config
+    folder = sprite_folder()
+    os.makedirs(folder, exist_ok=True)
+    columns, quality = config['SPRITE_COLUMNS'], config['SPRITE_QUALITY']
+
+    with _build_lock(folder) as locked:
+        if not locked:
+            return None
+        previous = read_manifest(folder)
+        report = SpriteReport()
+        sheets = {}
+        for run in iter_buckets(config['SPRITE_SHEET_SIZE']):
+            name = sheet_name(run, columns, quality)
+            path = os.path.join(folder, name)
+            if not force and name in previous['sheets'] and os.path.exists(path):
+                sheets[name] = previous['sheets'][name]
+                report.kept += 1
+            else:
+                sheets[name] = render_sheet(run, path, columns, quality)
+                report.built += 1
+
+        now = time.time()
+        cutoff = now - config['SPRITE_RETAIN_SECONDS']
+        retired = {name: retired_at for name, retired_at in previous.get('retired', {}).items()
+                   if name not in sheets and retired_at > cutoff}
+        retired.update((name, now) for name in previous['sheets'] if name not in sheets)
+        for entry in os.scandir(folder):
+            if (entry.name.startswith('sheet.') and entry.name.endswith('.webp')
+                    and entry.name not in sheets and entry.name not in retired):
+                os.remove(entry.path)
+                report.removed += 1
+
+        manifest = {'sheets': sheets, 'retired': retired}
+        _write_atomic(os.path.join(folder, MANIFEST_NAME), lambda tmp: _dump_json(manifest, tmp))
+    return report
+
+
+def build_if_changed(last_seq):
+    """Rebuild if any wine changed since ``last_seq``; returns the new mark.
+
+    Every insert, update and delete of a wine advances the change counter,
+    so an unchanged counter means there is nothing to do.
+    """
+    seq = db.session.scalar(db.select(ChangeCounter.value).where(ChangeCounter.id == 1))
+    if seq == last_seq:
+        return last_seq
+    return seq if build_sprites() is not None else last_seq
+
+
+class SpriteIndex:
+    """The manifest as a wine id lookup, reloaded when the file changes."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._mtime = None
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(os.path.join(self.folder, MANIFEST_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            manifest = read_manifest(self.folder)
+            cells = {}
+            for name, sheet in manifest['sheets'].items():
+                for wine_id, thumbnail_path, index in sheet['cells']:
+                    cells[wine_id] = (thumbnail_path, name, index, sheet['columns'], sheet['rows'])
+            self._cells, self._mtime = cells, mtime
+
+    def lookup(self, wines):
+        """``{wine_id: (sheet name, cell index, columns, rows)}`` for wines
+        whose current thumbnail is in a sheet."""
+        self._refresh()
+        cells = self._cells
+        found = {}
+        for wine in wines:
+            entry = cells.get(wine.id)
+            if entry is not None and entry[0] == wine.thumbnail_path:
+                found[wine.id] = entry[1:]
+        return found
+
+
+def _percent(position, count):
+    return f'{round(position * 100 / (count - 1), 4):g}%' if count > 1 else '0%'
+
+
+def sprite_cells(wines, index=None, config=None):
+    """CSS for drawing each wine's thumbnail from its sheet, keyed by wine id.
+
+    Returns an empty dict (plain thumbnails) when sprites are off or when
+    the wines are spread over more than ``SPRITE_MAX_SHEETS_PER_PAGE``
+    sheets, e.g. search results drawn from all over the collection.
+    ``index`` and ``config`` default to the current Flask app's.
+    """
+    if config is None:
+        config = current_app.config
+        index = current_app.extensions.get('sprites')
+    if index is None or not config['SPRITES_ENABLED']:
+        return {}
+    found = index.lookup(wines)
+    if len({entry[0] for entry in found.values()}) > config['SPRITE_MAX_SHEETS_PER_PAGE']:
+        return {}
+    cells = {}
+    for wine_id, (name, cell, columns, rows) in found.items():
+        cells[wine_id] = {
+            'url': f'/uploads/sprites/{name}',
+            'size': f'{columns * 100}% {rows * 100}%',
+            'position': f'{_percent(cell % columns, columns)} {_percent(cell // columns, rows)}',
+        }
+    return cells
+
+
+def serve_sprite(filename):
+    if not (filename.startswith('sheet.') and filename.endswith('.webp')):
+        abort(404)
+    response = send_from_directory(sprite_folder(), filename)
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def init_app(app):
+    app.extensions['sprites'] = SpriteIndex(sprite_folder(app.config))
+    app.add_template_global(sprite_cells)
+    app.add_url_rule('/uploads/sprites/<path:filename>', 'sprite_sheet', serve_sprite)
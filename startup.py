@@ -0,0 +1,70 @@
+"""Cold-start helpers: the Jinja bytecode cache and an import-time report."""
+import os
+import subprocess
+import sys
+
+from jinja2 import FileSystemBytecodeCache
+
+
+# Runs in a fresh interpreter; prints the create_app() wall time on stdout
+_MEASURE = """
+import time
+start = time.perf_counter()
+from app import create_app
+create_app({config_name!r})
+print(time.perf_counter() - start)
+"""
+
+
+def bytecode_cache_dir(app):
+    return app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+
+
+def parse_importtime(output):
+    """Rows of ``python -X importtime`` output as dicts, in import order.
+
+    Times are in microseconds; ``depth`` is the nesting level of the import.
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+        })
+    return rows
+
+
+def by_package(rows):
+    """Total self time per top-level package, slowest first."""
+    totals = {}
+    for row in rows:
+        package = row['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + row['self_us']
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def measure_startup(config_name=None, cwd=None):
+    """Import and build the app in a fresh interpreter under ``-X importtime``.
+
+    Returns ``(create_app_seconds, import_rows)``.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _MEASURE.format(config_name=config_name)],
+        cwd=cwd or os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def init_app(app):
+    """Cache compiled templates on disk so new workers skip recompiling them."""
+    if not app.config.get('JINJA_BYTECODE_CACHE', True):
+        return
+    directory = bytecode_cache_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
@@ -122,7 +122,15 @@ document.addEventListener('DOMContentLoaded', function() {
 // Service Worker Registration (for PWA capabilities)
 if ('serviceWorker' in navigator) {
     window.addEventListener('load', function() {
-        navigator.serviceWorker.register('/static/js/sw.js').then(function(registration) {
+        // The worker used to live under /static/js/, where it could not control pages
+        navigator.serviceWorker.getRegistrations().then(function(registrations) {
+            registrations.forEach(function(registration) {
+                if (registration.scope.endsWith('/static/js/')) {
+                    registration.unregister();
+                }
+            });
+        });
+        navigator.serviceWorker.register('/sw.js').then(function(registration) {
             console.log('ServiceWorker registered');
         }).catch(function(err) {
             console.log('ServiceWorker registration failed: ', err);
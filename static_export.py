@@ -0,0 +1,308 @@
+"""Static snapshot of the catalog for serving from a plain web server or CDN.
+
+``flask export-static OUTPUT`` renders the read-only pages through the app's
+own views (a test client, so output matches what the live site serves) and
+writes them as files::
+
+    index.html, about/index.html, gallery/index.html
+    wines/index.html, wines/page/<n>/index.html, wines/<id>/index.html
+    api/wines.json, api/wines/page/<n>.json, api/stats.json
+    static/..., uploads/...
+
+Internal links are rewritten to the trailing-slash form (``/wines/12/``,
+``/wines/page/2/``) that any server maps to ``index.html``. Links to pages
+that need the app (adding, editing, search) are left as they are.
+
+Exports are incremental: ``.export-state.json`` records which wines were
+exported and the change counter's value, and the next run re-renders only
+wine pages whose ``change_seq`` is newer (or every page, after the templates or
+built assets change). Pages built from many wines (lists, gallery, JSON)
+are rendered every run but only rewritten when their bytes change, so sync
+tools and CDNs see just the files that differ.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from flask import current_app
+from extensions import db
+from models import ChangeCounter, Wine
+from sprites import sprite_folder
+import queries
+
+
+STATE_NAME = '.export-state.json'
+PAGES = ('/', '/about', '/gallery')
+PER_PAGE = queries.DEFAULT_PER_PAGE
+RENDER_CHUNK = 200
+
+_LIST_PAGE = re.compile(r'^/wines/\?page=(\d+)$')
+_WINE_PAGE = re.compile(r'^/wines/(\d+)$')
+_API_WINES = re.compile(r'^/api/wines\?page=(\d+)$')
+_LINK = re.compile(r'(href|action)="(/[^"]*)"')
+# A snapshot has no session to check a token against, and a fresh token per
+# render would make every page look changed
+_CSRF_INPUT = re.compile(r'\s*<input type="hidden" name="csrf_token" value="[^"]*">')
+
+
+class ExportError(Exception):
+    """A page could not be rendered for the snapshot."""
+
+
+@dataclass
+class ExportReport:
+    rendered: int = 0
+    written: int = 0
+    removed: int = 0
+    copied: int = 0
+
+
+def public_url(url):
+    """URL of ``url``'s exported copy, or None if it is not exported."""
+    if url in ('/', '/wines/'):
+        return url
+    if url in PAGES:
+        return url + '/'
+    match = _LIST_PAGE.match(url)
+    if match:
+        page = int(match.group(1))
+        return '/wines/' if page <= 1 else f'/wines/page/{page}/'
+    if _WINE_PAGE.match(url):
+        return url + '/'
+    return None
+
+
+def output_path(url):
+    """Path of ``url``'s file, relative to the export directory."""
+    if url == '/api/stats':
+        return 'api/stats.json'
+    match = _API_WINES.match(url)
+    if match:
+        page = int(match.group(1))
+        return 'api/wines.json' if page <= 1 else f'api/wines/page/{page}.json'
+    public = public_url(url)
+    if public is None:
+        raise ExportError(f'{url} is not part of the static export')
+    return public.lstrip('/') + 'index.html'
+
+
+def rewrite_links(html):
+    def replace(match):
+        public = public_url(match.group(2).replace('&amp;', '&'))
+        return f'{match.group(1)}="{public}"' if public else match.group(0)
+    return _LINK.sub(replace, html)
+
+
+def normalize(response):
+    """The response body as it should be written: links rewritten, and
+    byte-for-byte stable across runs so unchanged pages are not rewritten."""
+    if response.mimetype == 'application/json':
+        # Flask pretty-prints in debug mode; pool workers may not match the CLI's app
+        return json.dumps(response.get_json(), separators=(',', ':'), sort_keys=True).encode('utf-8')
+    body = response.get_data()
+    if response.mimetype == 'text/html':
+        html = _CSRF_INPUT.sub('', body.decode('utf-8'))
+        body = rewrite_links(html).encode('utf-8')
+    return body
+
+
+def write_if_changed(path, content):
+    """Write ``content`` atomically unless the file already holds it; returns
+    whether it wrote."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+    return True
+
+
+def render(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise ExportError(f'{url} returned {response.status_code}')
+    return normalize(response)
+
+
+def render_urls(client, urls, output):
+    """Render ``urls`` into ``output``; returns how many files changed."""
+    written = 0
+    for url in urls:
+        written += write_if_changed(os.path.join(output, output_path(url)), render(client, url))
+    return written
+
+
+# Process pool workers build their own app once and render chunks with it
+_worker_client = None
+
+
+def _init_worker(config_name):
+    global _worker_client
+    from app import create_app
+    _worker_client = create_app(config_name).test_client()
+
+
+def _render_chunk(urls, output):
+    return render_urls(_worker_client, urls, output)
+
+
+def sync_tree(source, target, skip=(), keep=()):
+    """Mirror ``source`` into ``target``, copying files whose size or mtime
+    differ and removing files that no longer exist; returns ``(copied, removed)``.
+
+    Source directories in ``skip`` and target directories in ``keep`` are
+    left alone, for folders that are mirrored separately.
+    """
+    skip = {os.path.abspath(path) for path in skip}
+    keep = {os.path.abspath(path) for path in keep}
+    copied = removed = 0
+    seen = set()
+    if os.path.isdir(source):
+        for directory, dirs, files in os.walk(source):
+            dirs[:] = [d for d in dirs
+                       if os.path.abspath(os.path.join(directory, d)) not in skip and not d.startswith('.')]
+            for name in files:
+                if name.startswith('.') or name.endswith('.tmp'):
+                    continue
+                src = os.path.join(directory, name)
+                dst = os.path.join(target, os.path.relpath(src, source))
+                seen.add(dst)
+                stat = os.stat(src)
+                try:
+                    current = os.stat(dst)
+                    if current.st_size == stat.st_size and int(current.st_mtime) == int(stat.st_mtime):
+                        continue
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(src, dst)
+                copied += 1
+    for directory, dirs, files in os.walk(target):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(directory, d)) not in keep]
+        for name in files:
+            path = os.path.join(directory, name)
+            if path not in seen:
+                os.remove(path)
+                removed += 1
+    return copied, removed
+
+
+def read_state(output):
+    try:
+        with open(os.path.join(output, STATE_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def site_version(app):
+    """Hash of the templates and built asset names; when it changes, every
+    page is stale, even for wines that did not change."""
+    digest = hashlib.sha256(json.dumps(app.extensions.get('asset_manifest', {}), sort_keys=True).encode('utf-8'))
+    for directory, dirs, files in os.walk(app.jinja_loader.searchpath[0]):
+        dirs.sort()
+        for name in sorted(files):
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(name.encode('utf-8'))
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _prune_pages(directory, last_page, suffix=''):
+    """Remove ``<n>`` (or ``<n><suffix>``) entries of ``directory`` past ``last_page``."""
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for entry in os.scandir(directory):
+        number = entry.name[:-len(suffix)] if suffix and entry.name.endswith(suffix) else entry.name
+        if number.isdigit() and int(number) > last_page:
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def export_site(output, workers=1, full=False, config_name=None):
+    """Render the catalog into ``output``; returns an :class:`ExportReport`.
+
+    With ``workers`` above one, pages are rendered by a process pool whose
+    workers each build their own app from ``config_name`` (by default the
+    current app's), so the database must be one they can reach (not an
+    in-memory SQLite database).
+    """
+    app = current_app._get_current_object()
+    if config_name is None:
+        config_name = app.config.get('CONFIG_NAME')
+    os.makedirs(output, exist_ok=True)
+    report = ExportReport()
+    version = site_version(app)
+    state = read_state(output)
+    if full or state.get('version') != version:
+        state = {}
+    last_seq = state.get('change_seq')
+
+    # Read the counter first: change_seq is handed out in commit order, so a
+    # wine committed while this export runs gets a higher value and is
+    # re-rendered by the next one
+    seq = db.session.scalar(db.select(ChangeCounter.value).where(ChangeCounter.id == 1)) or 0
+    ids = set(db.session.scalars(db.select(Wine.id)))
+    previous = set(state.get('wines', ()))
+    if last_seq is None:
+        changed = set(ids)
+    else:
+        changed = ids - previous
+        changed.update(db.session.scalars(db.select(Wine.id).where(Wine.change_seq > last_seq)))
+
+    for wine_id in previous - ids:
+        shutil.rmtree(os.path.join(output, 'wines', str(wine_id)), ignore_errors=True)
+        report.removed += 1
+
+    pages = math.ceil(len(ids) / PER_PAGE) if ids else 1
+    urls = list(PAGES) + ['/wines/', '/api/stats']
+    urls += [f'/wines/?page={page}' for page in range(2, pages + 1)]
+    urls += [f'/api/wines?page={page}' for page in range(1, pages + 1)]
+    urls += [f'/wines/{wine_id}' for wine_id in sorted(changed)]
+    report.rendered = len(urls)
+
+    if workers > 1 and len(urls) > RENDER_CHUNK:
+        chunks = [urls[i:i + RENDER_CHUNK] for i in range(0, len(urls), RENDER_CHUNK)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(config_name,)) as pool:
+            report.written = sum(pool.map(_render_chunk, chunks, [output] * len(chunks)))
+    else:
+        report.written = render_urls(app.test_client(), urls, output)
+
+    report.removed += _prune_pages(os.path.join(output, 'wines', 'page'), pages)
+    report.removed += _prune_pages(os.path.join(output, 'api', 'wines', 'page'), pages, suffix='.json')
+
+    thumbnails, sprites = app.config['THUMBNAIL_FOLDER'], sprite_folder(app.config)
+    uploads = os.path.join(output, 'uploads')
+    thumbnails_target, sprites_target = os.path.join(uploads, 'thumbnails'), os.path.join(uploads, 'sprites')
+    for source, target, skip, keep in (
+        (app.static_folder, os.path.join(output, 'static'), (), ()),
+        (app.config['UPLOAD_FOLDER'], uploads, (thumbnails, sprites), (thumbnails_target, sprites_target)),
+        (thumbnails, thumbnails_target, (), ()),
+        (sprites, sprites_target, (), ()),
+    ):
+        copied, removed = sync_tree(source, target, skip, keep)
+        report.copied += copied
+        report.removed += removed
+
+    state = {
+        'version': version,
+        'change_seq': seq,
+        'wines': sorted(ids),
+    }
+    write_if_changed(os.path.join(output, STATE_NAME), json.dumps(state).encode('utf-8'))
+    return report
@@ -0,0 +1,328 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+
+from flask import current_app
+from extensions import db
+from models import Wine, ImageUpload, PendingFileDelete
+from utils import get_upload_folders, resolve_image_path, delete_image_files
+
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.heic', '.heif')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Used instead of a set once the catalog is large enough that holding every
+    referenced path in memory matters. A false positive only means an orphan
+    survives until the next run, so it is always safe for garbage collection.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+@dataclass
+class GCReport:
+    scanned: int = 0
+    orphaned: int = 0
+    removed: int = 0
+    bytes_reclaimed: int = 0
+    expired_uploads: int = 0
+    errors: list = field(default_factory=list)
+
+
+def build_reference_index(batch_size=10000):
+    """Index every on-disk path referenced by the ``wines`` and ``image_uploads`` tables.
+
+    Uploads count whatever their age: a bulk call may still claim one, and
+    only expiring its row releases the files.
+    """
+    count = sum(db.session.scalar(db.select(db.func.count()).select_from(model)) or 0
+                for model in (Wine, ImageUpload))
+    threshold = current_app.config.get('IMAGE_GC_BLOOM_THRESHOLD', 1000000)
+    index = BloomFilter(count * 2) if count * 2 >= threshold else set()
+
+    for model in (Wine, ImageUpload):
+        rows = db.session.execute(
+            db.select(model.image_path, model.thumbnail_path).execution_options(yield_per=batch_size)
+        )
+        for image_path, thumbnail_path in rows:
+            if image_path:
+                index.add(os.path.normpath(resolve_image_path(image_path)))
+            if thumbnail_path:
+                index.add(os.path.normpath(resolve_image_path(thumbnail_path, thumbnail=True)))
+    return index
+
+
+def _iter_image_files(folder):
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(IMAGE_SUFFIXES) and entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def collect_orphans(grace_period=None, dry_run=False):
+    """Delete uploaded files no wine or upload record references and that are
+    older than ``grace_period`` seconds.
+
+    The grace period protects files written by requests that have not
+    committed yet. Images pre-uploaded for the bulk API are kept while their
+    record exists; records older than the grace period are expired and their
+    files queued for deletion. Resumable
+    uploads left unfinished for ``CHUNKED_UPLOAD_EXPIRY`` are removed from
+    the spool folder.
+    """
+    from resumable import expire_uploads
+
+    if grace_period is None:
+        grace_period = current_app.config.get('IMAGE_GC_GRACE_PERIOD', 86400)
+    cutoff = time.time() - grace_period
+    index = build_reference_index()
+    report = GCReport()
+
+    folders = []
+    for folder in get_upload_folders():
+        folder = os.path.normpath(folder)
+        if folder not in folders:
+            folders.append(folder)
+
+    for folder in folders:
+        for entry in _iter_image_files(folder):
+            report.scanned += 1
+            path = os.path.normpath(entry.path)
+            if path in index:
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            report.orphaned += 1
+            if dry_run:
+                report.bytes_reclaimed += stat.st_size
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                report.errors.append(f"{path}: {e}")
+                continue
+            report.removed += 1
+            report.bytes_reclaimed += stat.st_size
+
+    report.expired_uploads, spooled = expire_uploads(dry_run=dry_run)
+    report.bytes_reclaimed += spooled
+
+    if not dry_run:
+        # Expiring an upload row is what releases its files: they are queued
+        # in the same transaction, so a bulk call that claimed the upload
+        # first keeps them
+        expired = datetime.fromtimestamp(cutoff, UTC)
+        released = db.session.execute(
+            db.delete(ImageUpload).where(ImageUpload.created_at < expired)
+            .returning(ImageUpload.image_path, ImageUpload.thumbnail_path)
+        ).all()
+        queue_image_deletions(released)
+        db.session.commit()
+        if released:
+            file_worker.notify()
+    return report
+
+
+def queue_image_deletion(image_path, thumbnail_path):
+    """Schedule files for deletion as part of the current transaction.
+
+    Nothing is removed until the caller commits and the queue is drained, so a
+    rolled back transaction keeps both the row and its images.
+    """
+    if image_path or thumbnail_path:
+        db.session.add(PendingFileDelete(image_path=image_path, thumbnail_path=thumbnail_path))
+
+
+def queue_image_deletions(paths):
+    """Batch form of :func:`queue_image_deletion` for ``(image_path, thumbnail_path)`` pairs.
+
+    Uses one executemany INSERT instead of a flushed object per row.
+    """
+    rows = [{'image_path': image_path, 'thumbnail_path': thumbnail_path, 'created_at': datetime.now(UTC)}
+            for image_path, thumbnail_path in paths if image_path or thumbnail_path]
+    if rows:
+        db.session.execute(db.insert(PendingFileDelete), rows)
+
+
+def referenced_paths(paths, chunk_size=250):
+    """The subset of ``paths`` that a wine or a pending upload still uses.
+
+    Rows can share files (seeded catalogs point many wines at one label), so
+    a queued path is only removed once nothing references it.
+    """
+    paths = list({path for path in paths if path})
+    referenced = set()
+    for start in range(0, len(paths), chunk_size):
+        chunk = paths[start:start + chunk_size]
+        referenced.update(db.session.scalars(db.union(
+            db.select(Wine.image_path).where(Wine.image_path.in_(chunk)),
+            db.select(Wine.thumbnail_path).where(Wine.thumbnail_path.in_(chunk)),
+            db.select(ImageUpload.image_path).where(ImageUpload.image_path.in_(chunk)),
+            db.select(ImageUpload.thumbnail_path).where(ImageUpload.thumbnail_path.in_(chunk)),
+        )))
+    return referenced
+
+
+def drain_pending_deletes(batch_size=None):
+    """Remove queued files in batches; returns the number of entries processed."""
+    if batch_size is None:
+        batch_size = current_app.config.get('DELETE_QUEUE_BATCH_SIZE', 500)
+    processed = 0
+    while True:
+        batch = db.session.execute(
+            db.select(PendingFileDelete)
+            .order_by(PendingFileDelete.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not batch:
+            break
+        # Checked in the same transaction that holds the queue rows
+        keep = referenced_paths([p.image_path for p in batch] + [p.thumbnail_path for p in batch])
+        for pending in batch:
+            # Entries are dropped even if removal fails; the orphan collector
+            # retries anything left on disk.
+            delete_image_files(None if pending.image_path in keep else pending.image_path,
+                               None if pending.thumbnail_path in keep else pending.thumbnail_path)
+        db.session.execute(
+            db.delete(PendingFileDelete).where(PendingFileDelete.id.in_([p.id for p in batch]))
+        )
+        db.session.commit()
+        processed += len(batch)
+        if len(batch) < batch_size:
+            break
+    return processed
+
+
+class FileWorker:
+    """Background thread that drains the deletion queue, runs periodic GC and
+    keeps the thumbnail sprite sheets current."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._last_gc = 0
+        self._sprite_seq = -1
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the worker; the server entry point calls :meth:`start`."""
+        self.app = app
+        app.extensions['file_worker'] = self
+
+    @property
+    def enabled(self):
+        return self.app.config.get('FILE_WORKER_ENABLED', True) and not self.app.config.get('TESTING')
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._last_gc = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='file-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self):
+        """Wake the worker after a commit that queued deletions or changed
+        thumbnails."""
+        self._wake.set()
+
+    def _run(self):
+        poll_interval = self.app.config.get('DELETE_QUEUE_POLL_INTERVAL', 60)
+        gc_interval = self.app.config.get('IMAGE_GC_INTERVAL', 0)
+        while not self._stop.is_set():
+            self._wake.wait(poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.run_drain()
+            if self.app.config.get('SPRITES_ENABLED', True):
+                self.run_sprites()
+            if gc_interval > 0 and time.monotonic() - self._last_gc >= gc_interval:
+                self._last_gc = time.monotonic()
+                self.run_gc()
+
+    def run_drain(self):
+        with self.app.app_context():
+            try:
+                drain_pending_deletes()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Draining pending file deletes failed")
+            finally:
+                db.session.remove()
+
+    def run_sprites(self):
+        from sprites import build_if_changed
+
+        with self.app.app_context():
+            try:
+                self._sprite_seq = build_if_changed(self._sprite_seq)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Rebuilding sprite sheets failed")
+            finally:
+                db.session.remove()
+
+    def run_gc(self):
+        with self.app.app_context():
+            try:
+                report = collect_orphans()
+                if report.orphaned:
+                    self.app.logger.info(
+                        "Image GC removed %d orphaned files (%d bytes)",
+                        report.removed, report.bytes_reclaimed
+                    )
+            except Exception:
+                self.app.logger.exception("Image GC run failed")
+            finally:
+                db.session.remove()
+
+
+file_worker = FileWorker()
@@ -0,0 +1,232 @@
+// Service Worker for offline capabilities (rendered by pwa.py)
+const VERSION = {{ version|tojson }};
+const PRECACHE = 'wine-tracker-precache-' + VERSION;
+const PAGE_CACHE = 'wine-tracker-pages';
+const API_CACHE = 'wine-tracker-api';
+const THUMBNAIL_CACHE = 'wine-tracker-thumbnails';
+const PRECACHE_URLS = {{ precache|tojson }};
+
+const API_PATHS = ['/api/wines', '/api/search'];
+const API_MAX_ENTRIES = {{ api_max_entries|tojson }};
+// Sprite sheets are content-addressed, so they cache like thumbnails
+const THUMBNAIL_PREFIXES = ['/uploads/thumbnails/', '/uploads/sprites/'];
+const THUMBNAIL_MAX_ENTRIES = {{ thumbnail_max_entries|tojson }};
+const THUMBNAIL_MAX_BYTES = {{ thumbnail_max_bytes|tojson }};
+const NETWORK_TIMEOUT_MS = 3000;
+
+// --- LRU bookkeeping -------------------------------------------------------
+// The Cache API records neither access time nor size, so both live in
+// IndexedDB, keyed by URL, per cache name.
+
+const DB_NAME = 'wine-tracker-sw';
+const LRU_STORE = 'lru';
+
+function openDatabase() {
+    return new Promise(function(resolve, reject) {
+        const request = indexedDB.open(DB_NAME, 1);
+        request.onupgradeneeded = function() {
+            const store = request.result.createObjectStore(LRU_STORE, { keyPath: ['cache', 'url'] });
+            store.createIndex('byCache', 'cache');
+        };
+        request.onsuccess = function() { resolve(request.result); };
+        request.onerror = function() { reject(request.error); };
+    });
+}
+
+function lruTransaction(mode, work) {
+    return openDatabase().then(function(db) {
+        return new Promise(function(resolve, reject) {
+            const tx = db.transaction(LRU_STORE, mode);
+            const result = work(tx.objectStore(LRU_STORE));
+            tx.oncomplete = function() { db.close(); resolve(result); };
+            tx.onerror = function() { db.close(); reject(tx.error); };
+        });
+    });
+}
+
+function touch(cacheName, url, size) {
+    return lruTransaction('readwrite', function(store) {
+        const key = [cacheName, url];
+        const request = store.get(key);
+        request.onsuccess = function() {
+            const entry = request.result || { cache: cacheName, url: url, size: 0 };
+            entry.lastAccess = Date.now();
+            if (size !== undefined) {
+                entry.size = size;
+            }
+            store.put(entry);
+        };
+    });
+}
+
+function listEntries(cacheName) {
+    return lruTransaction('readonly', function(store) {
+        const entries = [];
+        store.index('byCache').openCursor(IDBKeyRange.only(cacheName)).onsuccess = function(event) {
+            const cursor = event.target.result;
+            if (cursor) {
+                entries.push(cursor.value);
+                cursor.continue();
+            }
+        };
+        return entries;
+    });
+}
+
+function forget(cacheName, urls) {
+    return lruTransaction('readwrite', function(store) {
+        urls.forEach(function(url) { store.delete([cacheName, url]); });
+    });
+}
+
+// Drop least recently used entries until the cache fits its caps
+function evict(cacheName, maxEntries, maxBytes) {
+    return listEntries(cacheName).then(function(entries) {
+        entries.sort(function(a, b) { return a.lastAccess - b.lastAccess; });
+        let bytes = entries.reduce(function(total, entry) { return total + entry.size; }, 0);
+        const doomed = [];
+        while (entries.length && (entries.length > maxEntries || (maxBytes && bytes > maxBytes))) {
+            const entry = entries.shift();
+            bytes -= entry.size;
+            doomed.push(entry.url);
+        }
+        if (!doomed.length) {
+            return;
+        }
+        return caches.open(cacheName).then(function(cache) {
+            return Promise.all(doomed.map(function(url) { return cache.delete(url); }));
+        }).then(function() {
+            return forget(cacheName, doomed);
+        });
+    });
+}
+
+function storeResponse(cacheName, request, response, maxEntries, maxBytes) {
+    return response.clone().blob().then(function(body) {
+        return caches.open(cacheName)
+            .then(function(cache) { return cache.put(request, response); })
+            .then(function() { return touch(cacheName, request.url, body.size); })
+            .then(function() { return evict(cacheName, maxEntries, maxBytes); });
+    });
+}
+
+// --- Strategies -------------------------------------------------------------
+
+// Thumbnails never change once written, so a cached copy is always good
+function cacheFirst(event, cacheName, maxEntries, maxBytes) {
+    const request = event.request;
+    return caches.open(cacheName).then(function(cache) {
+        return cache.match(request).then(function(cached) {
+            if (cached) {
+                event.waitUntil(touch(cacheName, request.url));
+                return cached;
+            }
+            return fetch(request).then(function(response) {
+                if (response.ok) {
+                    event.waitUntil(storeResponse(cacheName, request, response.clone(), maxEntries, maxBytes));
+                }
+                return response;
+            });
+        });
+    });
+}
+
+// Answer from the cache straight away and refresh it in the background
+function staleWhileRevalidate(event, cacheName, maxEntries) {
+    const request = event.request;
+    return caches.open(cacheName).then(function(cache) {
+        return cache.match(request).then(function(cached) {
+            const refresh = fetch(request).then(function(response) {
+                if (response.ok) {
+                    return storeResponse(cacheName, request, response.clone(), maxEntries, 0)
+                        .then(function() { return response; });
+                }
+                return response;
+            });
+            if (cached) {
+                event.waitUntil(refresh.catch(function() {}));
+                event.waitUntil(touch(cacheName, request.url));
+                return cached;
+            }
+            return refresh;
+        });
+    });
+}
+
+// Pages carry flash messages and fresh data, so prefer the network. A slow
+// response is replaced by the last copy of the same page if there is one;
+// the precached home page is only a stand-in when the network fails
+function networkFirst(event) {
+    const request = event.request;
+    const network = fetch(request).then(function(response) {
+        if (response.ok) {
+            const copy = response.clone();
+            event.waitUntil(caches.open(PAGE_CACHE).then(function(cache) { return cache.put(request, copy); }));
+        }
+        return response;
+    });
+    const timeout = new Promise(function(resolve) { setTimeout(resolve, NETWORK_TIMEOUT_MS); });
+    return Promise.race([network, timeout.then(function() { return caches.match(request); })])
+        .then(function(response) { return response || network; })
+        .catch(function() {
+            return caches.match(request).then(function(cached) {
+                return cached || caches.match(PRECACHE_URLS[0]);
+            }).then(function(cached) { return cached || Response.error(); });
+        });
+}
+
+// --- Lifecycle --------------------------------------------------------------
+
+self.addEventListener('install', function(event) {
+    event.waitUntil(
+        caches.open(PRECACHE)
+            .then(function(cache) {
+                // Bypass the HTTP cache so a new build never precaches stale files
+                return cache.addAll(PRECACHE_URLS.map(function(url) {
+                    return new Request(url, { cache: 'reload' });
+                }));
+            })
+            .then(function() { return self.skipWaiting(); })
+    );
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(
+        caches.keys().then(function(cacheNames) {
+            return Promise.all(
+                cacheNames.map(function(cacheName) {
+                    const stalePrecache = cacheName.indexOf('wine-tracker-precache-') === 0 && cacheName !== PRECACHE;
+                    // Caches left by the worker that used to live under /static/js/
+                    if (stalePrecache || cacheName === 'wine-tracker-v1') {
+                        return caches.delete(cacheName);
+                    }
+                })
+            );
+        }).then(function() { return self.clients.claim(); })
+    );
+});
+
+self.addEventListener('fetch', function(event) {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (THUMBNAIL_PREFIXES.some(function(prefix) { return url.pathname.indexOf(prefix) === 0; })) {
+        event.respondWith(cacheFirst(event, THUMBNAIL_CACHE, THUMBNAIL_MAX_ENTRIES, THUMBNAIL_MAX_BYTES));
+    } else if (API_PATHS.indexOf(url.pathname) !== -1) {
+        event.respondWith(staleWhileRevalidate(event, API_CACHE, API_MAX_ENTRIES));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(event));
+    } else if (url.pathname.indexOf('/static/') === 0) {
+        event.respondWith(
+            caches.match(request, { cacheName: PRECACHE }).then(function(cached) {
+                return cached || fetch(request);
+            })
+        );
+    }
+});
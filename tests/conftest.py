@@ -5,6 +5,7 @@ from app import create_app
 from extensions import db
 from models import Wine
 from datetime import datetime
+from tests.query_budgets import QueryCounter
 
 
 @pytest.fixture
@@ -31,6 +32,13 @@ def runner(app):
     return app.test_cli_runner()
 
 
+@pytest.fixture
+def query_counter(app):
+    """Record SQL statements per request; budgets live in tests/query_budgets.py."""
+    with QueryCounter(app, db.engine) as counter:
+        yield counter
+
+
 @pytest.fixture
 def sample_wine_data():
     """Sample wine data for testing."""
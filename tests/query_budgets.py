@@ -0,0 +1,135 @@
+"""Per-route SQL statement budgets and the helpers that enforce them.
+
+Every endpoint registered by ``routes/`` must have an entry here. Raise a
+budget only when a new query is intentional; an unexpected increase is
+usually an N+1 or a lost eager load.
+"""
+import functools
+from collections import Counter
+
+from flask import request, request_finished, request_started
+from sqlalchemy import event
+
+
+ROUTE_QUERY_BUDGETS = {
+    # routes/main.py
+    'main.index': 3,
+    'main.search_page': 0,
+    'main.gallery': 1,
+    'main.about': 0,
+    # routes/wine.py
+    'wine.list_wines': 2,
+    # +2 when the image comes from a resumable upload (load and delete it)
+    'wine.add_wine': 6,
+    'wine.view_wine': 1,
+    'wine.edit_wine': 3,
+    'wine.delete_wine': 5,
+    # routes/api.py
+    'api.search': 2,
+    'api.get_wine': 1,
+    'api.get_similar_wines': 3,
+    'api.get_wines': 2,
+    'api.get_suggestions': 2,
+    'api.get_stats': 5,
+    'api.get_changes': 2,
+    # Sub-requests count against the batch; sized for the dashboard's
+    # stats + wines + single wine batch
+    'api.run_batch': 8,
+    # Bulk endpoints: budgets hold for batches up to bulk.CHUNK_SIZE items;
+    # bulk updates add one statement per distinct set of changed columns.
+    # Writes to wines also reserve change_seq values from change_counter.
+    'api.upload_image': 1,
+    # Resumable uploads live in the spool folder; only the chunk that
+    # completes the file writes its image_uploads row
+    'api.create_upload': 0,
+    'api.upload_offset': 0,
+    'api.append_upload': 1,
+    'api.cancel_upload': 0,
+    'api.create_wines_bulk': 4,
+    'api.update_wines_bulk': 7,
+    'api.delete_wines_bulk': 5,
+}
+
+# Endpoints that never touch the database
+UNBUDGETED_ENDPOINTS = {'static', 'uploaded_file', 'uploaded_thumbnail', 'metrics',
+                       'profiles_index', 'profiles_download', 'service_worker', 'sprite_sheet'}
+
+
+class QueryCounter:
+    """Records SQL statements executed during each request of a test."""
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+        self.requests = []
+        self.outside_request = []
+        self._current = None
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        target = self._current[1] if self._current is not None else self.outside_request
+        target.append((statement, repr(parameters)))
+
+    def _on_request_started(self, sender, **extra):
+        self._current = (request.endpoint, [])
+
+    def _on_request_finished(self, sender, response, **extra):
+        if self._current is not None:
+            self.requests.append(self._current)
+            self._current = None
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        request_started.connect(self._on_request_started, self.app)
+        request_finished.connect(self._on_request_finished, self.app)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        request_started.disconnect(self._on_request_started, self.app)
+        request_finished.disconnect(self._on_request_finished, self.app)
+
+    @property
+    def count(self):
+        return sum(len(statements) for _, statements in self.requests)
+
+    def check(self, budgets=ROUTE_QUERY_BUDGETS):
+        """Return a list of budget violations for the recorded requests."""
+        problems = []
+        for endpoint, statements in self.requests:
+            if endpoint is None or endpoint in UNBUDGETED_ENDPOINTS:
+                continue
+            if endpoint not in budgets:
+                problems.append(f'{endpoint}: no query budget declared')
+                continue
+            if len(statements) > budgets[endpoint]:
+                listing = '\n    '.join(s for s, _ in statements)
+                problems.append(
+                    f'{endpoint}: {len(statements)} queries, budget {budgets[endpoint]}\n    {listing}'
+                )
+            repeated = [s for s, n in Counter(statements).items() if n > 1]
+            for statement, params in repeated:
+                problems.append(f'{endpoint}: repeated identical query (possible N+1)\n    {statement} {params}')
+        return problems
+
+    def assert_within_budget(self, budgets=ROUTE_QUERY_BUDGETS):
+        problems = self.check(budgets)
+        assert not problems, 'Query budget exceeded:\n' + '\n'.join(problems)
+
+
+def query_budget(test):
+    """Fail ``test`` if any request it makes exceeds its route's query budget.
+
+    The test must use the ``app`` or ``client`` fixture.
+    """
+    @functools.wraps(test)
+    def wrapper(*args, **kwargs):
+        from extensions import db
+
+        app = kwargs['app'] if 'app' in kwargs else kwargs['client'].application
+        with app.app_context():
+            engine = db.engine
+        with QueryCounter(app, engine) as counter:
+            result = test(*args, **kwargs)
+        counter.assert_within_budget()
+        return result
+    return wrapper
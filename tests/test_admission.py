@@ -0,0 +1,89 @@
+import threading
+import pytest
+from PIL import Image
+from admission import UploadGate, UploadsBusy, estimate_decode_cost
+
+
+def _gate(**overrides):
+    gate = UploadGate()
+    gate.enabled = True
+    gate.max_concurrency = overrides.get('max_concurrency', 1)
+    gate.memory_budget = overrides.get('memory_budget', 1000)
+    gate.queue_size = overrides.get('queue_size', 0)
+    gate.queue_timeout = overrides.get('queue_timeout', 1)
+    gate.retry_after = 7
+    return gate
+
+
+class TestUploadGate:
+    """Test upload admission control."""
+
+    def test_rejects_when_queue_full(self):
+        """Test that a full queue fails fast with UploadsBusy."""
+        gate = _gate(queue_size=0)
+        with gate.admit(10):
+            with pytest.raises(UploadsBusy) as exc_info:
+                with gate.admit(10):
+                    pass
+        assert exc_info.value.retry_after == 7
+        assert gate.snapshot()['rejected'] == 1
+        assert gate.snapshot()['active'] == 0
+
+    def test_memory_budget_limits_concurrency(self):
+        """Test that the memory budget blocks a second large decode."""
+        gate = _gate(max_concurrency=4, memory_budget=100, queue_size=0)
+        with gate.admit(60):
+            with gate.admit(40):
+                pass
+            with pytest.raises(UploadsBusy):
+                with gate.admit(50):
+                    pass
+
+    def test_queued_request_is_admitted_on_release(self):
+        """Test that a waiting request runs once a slot frees up."""
+        gate = _gate(queue_size=1, queue_timeout=5)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with gate.admit(10):
+                entered.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait(5)
+        threading.Timer(0.05, release.set).start()
+
+        with gate.admit(10):
+            snapshot = gate.snapshot()
+        holder.join()
+
+        assert snapshot['admitted'] == 2
+        assert snapshot['wait_seconds_max'] > 0
+
+    def test_decode_cost_counts_the_transpose_copy(self):
+        """Test that the estimate covers two bitmaps at Pillow's in-memory pixel size."""
+        assert estimate_decode_cost(Image.new('RGB', (100, 50))) == 2 * 100 * 50 * 4
+        assert estimate_decode_cost(Image.new('P', (100, 50))) == 2 * 100 * 50 * 4
+        assert estimate_decode_cost(Image.new('L', (100, 50))) == 2 * 100 * 50
+
+    def test_upload_route_returns_503(self, app, client, temp_upload_dir, sample_image_file):
+        """Test that a saturated gate turns an upload into a 503 with Retry-After."""
+        gate = app.extensions['upload_gate']
+        gate.max_concurrency = 1
+        gate.queue_size = 0
+        data = {
+            'wine_name': 'Test Wine',
+            'vineyard_name': 'Test Vineyard',
+            'vintage_year': 2020,
+            'rating': 4,
+            'image': (sample_image_file, 'label.jpg'),
+        }
+
+        with gate.admit(1):
+            response = client.post('/wines/add', data=data,
+                                   content_type='multipart/form-data')
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(gate.retry_after)
@@ -0,0 +1,79 @@
+import pytest
+from starlette.testclient import TestClient
+
+from app import create_app
+from asgi import create_asgi_app
+from config import TestingConfig
+from extensions import db
+from models import Wine
+
+
+@pytest.fixture
+def file_db(monkeypatch, tmp_path):
+    """Sync app and an ASGI app sharing one SQLite file with sample wines."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'wines.db'}")
+    monkeypatch.setattr(TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(TestingConfig, 'THUMBNAIL_FOLDER', str(tmp_path / 'uploads' / 'thumbnails'))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        for i, (name, vineyard, year, rating) in enumerate([
+            ('Cabernet Reserve', 'Napa Valley Vineyards', 2018, 5),
+            ('Pinot Noir', 'Willamette Cellars', 2020, 4),
+            ('Chardonnay', 'Napa Valley Vineyards', 2021, 3),
+        ]):
+            db.session.add(Wine(wine_name=name, vineyard_name=vineyard, vintage_year=year, rating=rating,
+                                image_path=f'uploads/{i}.jpg', thumbnail_path=f'uploads/thumbnails/thumb_{i}.jpg'))
+        db.session.commit()
+        with TestClient(create_asgi_app('testing')) as async_client:
+            yield app.test_client(), async_client
+        db.session.remove()
+        db.engine.dispose()
+
+
+class TestAsyncApi:
+    """Test that the ASGI API matches the sync blueprint."""
+
+    @pytest.mark.parametrize('path', [
+        '/api/wines',
+        '/api/wines?sort_by=rating&order=asc&per_page=2&page=2',
+        '/api/wines?page=0&per_page=-1',
+        '/api/search?q=napa',
+        '/api/search?q=noir&rating=4&year_from=2019&year_to=2020',
+        '/api/wines/suggestions?q=na',
+        '/api/wines/suggestions?q=n',
+        '/api/stats',
+        '/api/wines/1',
+    ])
+    def test_payloads_match_sync_api(self, file_db, path):
+        """Test that both APIs return the same JSON for the same request."""
+        sync_client, async_client = file_db
+        sync_response = sync_client.get(path)
+        async_response = async_client.get(path)
+        assert async_response.status_code == sync_response.status_code == 200
+        assert async_response.json() == sync_response.get_json()
+
+    def test_empty_stats(self, file_db):
+        """Test the stats payload for an empty collection."""
+        sync_client, async_client = file_db
+        db.session.execute(db.delete(Wine))
+        db.session.commit()
+        assert async_client.get('/api/stats').json() == sync_client.get('/api/stats').get_json()
+
+    def test_missing_wine(self, file_db):
+        """Test that an unknown wine id is a JSON 404."""
+        _, async_client = file_db
+        response = async_client.get('/api/wines/999')
+        assert response.status_code == 404
+        assert response.json() == {'error': 'Not Found'}
+
+    def test_serves_uploads(self, file_db, tmp_path):
+        """Test that uploaded images and thumbnails are served."""
+        _, async_client = file_db
+        (tmp_path / 'uploads' / 'thumbnails').mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'uploads' / 'label.jpg').write_bytes(b'image')
+        (tmp_path / 'uploads' / 'thumbnails' / 'thumb_label.jpg').write_bytes(b'thumb')
+
+        assert async_client.get('/uploads/label.jpg').content == b'image'
+        assert async_client.get('/uploads/thumbnails/thumb_label.jpg').content == b'thumb'
+        assert async_client.get('/uploads/../wines.db').status_code == 404
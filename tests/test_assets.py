@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import brotli
+import pytest
+
+import assets
+
+
+@pytest.fixture
+def built_static(app, tmp_path, monkeypatch):
+    """A static folder with one CSS and one JS source, built."""
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'js').mkdir()
+    (static / 'css' / 'style.css').write_text('body {\n    color: red;\n}\n' * 50)
+    (static / 'js' / 'main.js').write_text('// comment\nfunction hello() {\n    return 1;\n}\n')
+    monkeypatch.setattr(app, 'static_folder', str(static))
+    manifest = assets.build_assets(str(static))
+    app.extensions['asset_manifest'] = manifest
+    return static
+
+
+class TestBuildAssets:
+    """Test the fingerprinting build step."""
+
+    def test_writes_hashed_minified_files(self, built_static):
+        """Test that each source gets a hashed, minified copy and compressed variants."""
+        manifest = json.loads((built_static / 'dist' / 'manifest.json').read_text())
+        built = built_static / manifest['js/main.js']
+        content = built.read_bytes()
+
+        assert built.name.startswith('main.') and built.suffix == '.js'
+        assert b'comment' not in content
+        assert gzip.decompress((built_static / (manifest['js/main.js'] + '.gz')).read_bytes()) == content
+        assert brotli.decompress((built_static / (manifest['js/main.js'] + '.br')).read_bytes()) == content
+
+    def test_rebuild_keeps_only_previous_build(self, built_static):
+        """Test that files older than the previous build are pruned."""
+        first = assets.read_manifest(str(built_static))['css/style.css']
+        (built_static / 'css' / 'style.css').write_text('a { color: blue }')
+        second = assets.build_assets(str(built_static))['css/style.css']
+        (built_static / 'css' / 'style.css').write_text('a { color: green }')
+        assets.build_assets(str(built_static))
+
+        assert not (built_static / first).exists()
+        assert not (built_static / (first + '.br')).exists()
+        assert (built_static / second).exists()
+
+
+class TestServing:
+    """Test asset URLs, static caching and response compression."""
+
+    def test_asset_url(self, app, built_static):
+        """Test that templates link the built copy when one exists."""
+        with app.test_request_context():
+            assert assets.asset_url('css/style.css') == '/static/' + app.extensions['asset_manifest']['css/style.css']
+            assert assets.asset_url('img/logo.png') == '/static/img/logo.png'
+
+    def test_asset_url_without_build(self, app):
+        """Test the fallback to the plain file."""
+        app.extensions['asset_manifest'] = {}
+        with app.test_request_context():
+            assert assets.asset_url('css/style.css') == '/static/css/style.css'
+
+    def test_precompressed_static(self, client, app, built_static):
+        """Test that built files are served immutable, in the best accepted encoding."""
+        url = '/static/' + app.extensions['asset_manifest']['css/style.css']
+        plain = client.get(url)
+        br = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        gz = client.get(url, headers={'Accept-Encoding': 'gzip, br;q=0'})
+
+        assert plain.headers['Cache-Control'] == assets.IMMUTABLE
+        assert 'Content-Encoding' not in plain.headers
+        assert br.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(br.data) == plain.data
+        assert gz.headers['Content-Encoding'] == 'gzip'
+        assert gz.mimetype == 'text/css'
+        assert 'Accept-Encoding' in gz.headers['Vary']
+
+    def test_source_files_not_immutable(self, client):
+        """Test that unhashed static files keep ordinary caching."""
+        response = client.get('/static/css/style.css')
+        assert response.status_code == 200
+        assert 'immutable' not in response.headers.get('Cache-Control', '')
+
+    def test_compresses_large_responses(self, client, app, multiple_wines):
+        """Test that large JSON is compressed and small bodies are left alone."""
+        app.config['COMPRESS_MIN_SIZE'] = 500
+        plain = client.get('/api/wines')
+        compressed = client.get('/api/wines', headers={'Accept-Encoding': 'gzip'})
+        small = client.get('/api/wines/suggestions', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in plain.headers
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+        assert 'Content-Encoding' not in small.headers
+        assert 'Accept-Encoding' in small.headers['Vary']
+
+    def test_html_is_not_compressed(self, client, app):
+        """Test that pages carrying the CSRF token are sent uncompressed."""
+        app.config['COMPRESS_MIN_SIZE'] = 100
+
+        response = client.get('/wines/add', headers={'Accept-Encoding': 'br, gzip'})
+
+        assert response.status_code == 200
+        assert b'csrf_token' in response.data
+        assert 'Content-Encoding' not in response.headers
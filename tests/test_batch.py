@@ -0,0 +1,44 @@
+from models import Wine
+from tests.query_budgets import query_budget
+
+
+def _batch(client, payload):
+    response = client.post('/api/batch', json=payload)
+    assert response.status_code == 200
+    return response.get_json()['responses']
+
+
+class TestBatchApi:
+    """Test the batched read endpoint."""
+
+    @query_budget
+    def test_combines_responses(self, client, multiple_wines):
+        """Test that each sub-request returns what the route itself returns."""
+        wine_id = Wine.query.first().id
+        paths = ['/api/stats', '/api/wines?per_page=2', f'/api/wines/{wine_id}']
+        responses = _batch(client, {'requests': paths})
+
+        assert [r['path'] for r in responses] == paths
+        assert [r['status'] for r in responses] == [200, 200, 200]
+        for path, response in zip(paths, responses):
+            assert response['body'] == client.get(path).get_json()
+
+    def test_parallel(self, client, multiple_wines):
+        """Test that parallel sub-requests keep request order."""
+        paths = [{'path': f'/api/search?rating={rating}'} for rating in (5, 4, 3)]
+        responses = _batch(client, {'requests': paths, 'parallel': True})
+        assert [r['body']['total'] for r in responses] == [2, 2, 1]
+
+    def test_errors_per_sub_request(self, client):
+        """Test that failing sub-requests do not fail the batch."""
+        responses = _batch(client, ['/api/wines/9999', '/wines/', '/api/batch', '/api/nope'])
+        assert [r['status'] for r in responses] == [404, 404, 405, 404]
+        assert 'error' in responses[0]['body']
+
+    def test_rejects_bad_batches(self, client, app):
+        """Test request-level validation."""
+        app.config['BATCH_MAX_REQUESTS'] = 2
+        assert client.post('/api/batch', json=['/api/stats'] * 3).status_code == 400
+        assert client.post('/api/batch', json=[{'path': '/api/wines/bulk', 'method': 'DELETE'}]).status_code == 400
+        assert client.post('/api/batch', json=['api/stats']).status_code == 400
+        assert client.post('/api/batch', data='x', content_type='text/plain').status_code == 400
@@ -0,0 +1,155 @@
+import bulk
+from extensions import db
+from models import ImageUpload, PendingFileDelete, Wine, WineTombstone
+from tests.query_budgets import query_budget
+
+
+def _upload(client, sample_image_file):
+    response = client.post('/api/images', data=sample_image_file.getvalue(), content_type='image/jpeg')
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def _lose_upload(monkeypatch, image_id):
+    """Delete ``image_id`` right after the bulk call loads it, as a concurrent
+    call or ``gc-images`` expiry would."""
+    load = bulk._load_uploads
+
+    def load_then_lose(image_ids):
+        uploads = load(image_ids)
+        db.session.execute(db.delete(ImageUpload).where(ImageUpload.id == image_id))
+        return uploads
+
+    monkeypatch.setattr(bulk, '_load_uploads', load_then_lose)
+
+
+def _item(image_id, **overrides):
+    item = {'wine_name': 'Bulk Wine', 'vineyard_name': 'Bulk Vineyard', 'vintage_year': 2019,
+            'rating': 4, 'image_id': image_id}
+    item.update(overrides)
+    return item
+
+
+class TestBulkApi:
+    """Test the bulk JSON write endpoints."""
+
+    def test_upload_image(self, client, temp_upload_dir, sample_image_file):
+        """Test that a raw image body becomes a pending upload."""
+        upload = _upload(client, sample_image_file)
+        assert upload['image_path'].startswith('uploads/')
+        stored = db.session.get(ImageUpload, upload['image_id'])
+        assert stored.label_hash and stored.label_features
+
+    def test_upload_requires_image_content_type(self, client):
+        """Test that form posts are rejected."""
+        response = client.post('/api/images', data={'image': 'x'})
+        assert response.status_code == 415
+
+    @query_budget
+    def test_create(self, client, temp_upload_dir, sample_image_file):
+        """Test that valid items are inserted and invalid ones reported."""
+        first = _upload(client, sample_image_file)['image_id']
+        second = _upload(client, sample_image_file)['image_id']
+
+        response = client.post('/api/wines/bulk', json={'wines': [
+            _item(first, wine_name='First'),
+            _item('missing'),
+            _item(second, rating=9),
+            _item(second, wine_name='Second'),
+            'not an object',
+        ]})
+        body = response.get_json()
+
+        assert response.status_code == 200
+        assert (body['succeeded'], body['failed']) == (2, 3)
+        results = body['results']
+        assert [r['status'] for r in results] == ['created', 'invalid', 'invalid', 'created', 'invalid']
+        assert results[1]['errors'] == ['image_id must reference an uploaded image']
+        assert results[2]['errors'] == ['Rating must be between 1 and 5 stars']
+        assert db.session.get(Wine, results[0]['id']).wine_name == 'First'
+        assert db.session.get(Wine, results[3]['id']).label_hash
+        assert ImageUpload.query.count() == 0
+
+    def test_create_rejects_reused_image(self, client, temp_upload_dir, sample_image_file):
+        """Test that one upload cannot back two wines."""
+        image_id = _upload(client, sample_image_file)['image_id']
+        results = client.post('/api/wines/bulk', json=[_item(image_id), _item(image_id)]).get_json()['results']
+        assert [r['status'] for r in results] == ['created', 'invalid']
+
+    def test_upload_claimed_elsewhere_is_a_conflict(self, client, monkeypatch, temp_upload_dir, sample_image_file):
+        """Test that an upload taken by another request (or expired) between load and claim is not attached."""
+        taken = _upload(client, sample_image_file)['image_id']
+        free = _upload(client, sample_image_file)['image_id']
+        _lose_upload(monkeypatch, taken)
+        body = client.post('/api/wines/bulk', json=[_item(taken), _item(free, wine_name='Free')]).get_json()
+
+        assert [r['status'] for r in body['results']] == ['conflict', 'created']
+        assert [w.wine_name for w in Wine.query.all()] == ['Free']
+
+    def test_update_with_upload_claimed_elsewhere(self, client, monkeypatch, temp_upload_dir,
+                                                  multiple_wines, sample_image_file):
+        """Test that an update whose new image was taken keeps the old image, and other updates apply."""
+        taken = _upload(client, sample_image_file)['image_id']
+        wine_ids = [w['id'] for w in client.get('/api/wines').get_json()['wines'][:2]]
+        _lose_upload(monkeypatch, taken)
+        body = client.patch('/api/wines/bulk', json=[{'id': wine_ids[0], 'image_id': taken},
+                                                      {'id': wine_ids[1], 'rating': 1}]).get_json()
+
+        assert [r['status'] for r in body['results']] == ['conflict', 'updated']
+        assert db.session.get(Wine, wine_ids[1]).rating == 1
+        assert PendingFileDelete.query.count() == 0
+
+    def test_create_many(self, client, app, temp_upload_dir, sample_image_file):
+        """Test that a batch larger than one chunk is written in one call."""
+        app.config['BULK_MAX_ITEMS'] = 2000
+        uploads = [ImageUpload(image_path=f'uploads/{i}.jpg', thumbnail_path=f'uploads/thumbnails/{i}.jpg')
+                   for i in range(1200)]
+        db.session.add_all(uploads)
+        db.session.commit()
+
+        body = client.post('/api/wines/bulk', json=[_item(u.id, wine_name=f'Wine {i}')
+                                                     for i, u in enumerate(uploads)]).get_json()
+        assert body['succeeded'] == 1200
+        assert Wine.query.count() == 1200
+        assert [r['index'] for r in body['results']] == list(range(1200))
+
+    def test_limits_and_bad_bodies(self, client, app):
+        """Test request-level validation."""
+        app.config['BULK_MAX_ITEMS'] = 2
+        assert client.post('/api/wines/bulk', json=[{}, {}, {}]).status_code == 400
+        assert client.post('/api/wines/bulk', json={'wine': []}).status_code == 400
+        assert client.post('/api/wines/bulk', data='[]', content_type='text/plain').status_code == 400
+
+    @query_budget
+    def test_update(self, client, temp_upload_dir, multiple_wines, sample_image_file):
+        """Test partial updates, image replacement and per-item errors."""
+        ids = [w.id for w in Wine.query.order_by(Wine.id)]
+        image_id = _upload(client, sample_image_file)['image_id']
+
+        body = client.patch('/api/wines/bulk', json={'wines': [
+            {'id': ids[0], 'rating': 1},
+            {'id': ids[1], 'image_id': image_id, 'notes': '  New notes  '},
+            {'id': ids[2], 'vintage_year': 1700},
+            {'id': 9999, 'rating': 3},
+            {'id': ids[0], 'rating': 2},
+        ]}).get_json()
+
+        assert [r['status'] for r in body['results']] == ['updated', 'updated', 'invalid', 'not_found', 'invalid']
+        db.session.expire_all()
+        assert db.session.get(Wine, ids[0]).rating == 1
+        second = db.session.get(Wine, ids[1])
+        assert second.notes == 'New notes'
+        assert second.image_path != 'uploads/caymus.jpg'
+        assert PendingFileDelete.query.filter_by(image_path='uploads/caymus.jpg').count() == 1
+        assert db.session.get(Wine, ids[2]).vintage_year == 2017
+
+    @query_budget
+    def test_delete(self, client, multiple_wines):
+        """Test that deletes queue image removal and report unknown ids."""
+        ids = [w.id for w in Wine.query.order_by(Wine.id)]
+        body = client.delete('/api/wines/bulk', json={'ids': [ids[0], ids[1], ids[0], 9999, 'x']}).get_json()
+
+        assert [r['status'] for r in body['results']] == ['deleted', 'deleted', 'invalid', 'not_found', 'invalid']
+        assert Wine.query.count() == 3
+        assert PendingFileDelete.query.count() == 2
+        assert sorted(t.wine_id for t in WineTombstone.query) == ids[:2]
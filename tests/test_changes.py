@@ -0,0 +1,90 @@
+from extensions import db
+from models import ChangeCounter, Wine, WineTombstone
+from seed import seed_wines
+from tests.query_budgets import query_budget
+
+
+def _sync(client, since=0, **params):
+    response = client.get('/api/changes', query_string=dict(params, since=since))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+class TestChangeSequence:
+    """Test that every write path stamps wines with a change sequence."""
+
+    def test_orm_writes_are_stamped(self, app, multiple_wines):
+        """Test that inserts get increasing numbers and updates move a wine forward."""
+        wines = Wine.query.order_by(Wine.id).all()
+        seqs = [wine.change_seq for wine in wines]
+        assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+
+        wines[0].rating = 1
+        db.session.commit()
+        assert wines[0].change_seq > seqs[-1]
+
+    def test_delete_writes_tombstone(self, app, sample_wine):
+        """Test that deleting a wine leaves a tombstone after its last change."""
+        wine_id, seq = sample_wine.id, sample_wine.change_seq
+        db.session.delete(sample_wine)
+        db.session.commit()
+
+        tombstone = WineTombstone.query.one()
+        assert tombstone.wine_id == wine_id
+        assert tombstone.change_seq > seq
+
+    def test_seed_reserves_ranges(self, app, temp_upload_dir):
+        """Test that batched seeding takes one block of numbers per batch."""
+        seed_wines(25, batch_size=10, seed=1)
+        seqs = db.session.scalars(db.select(Wine.change_seq).order_by(Wine.id)).all()
+        assert seqs == list(range(seqs[0], seqs[0] + 25))
+        assert db.session.get(ChangeCounter, 1).value == seqs[-1]
+
+
+class TestChangesApi:
+    """Test the delta-sync endpoint."""
+
+    @query_budget
+    def test_full_then_incremental_sync(self, client, multiple_wines):
+        """Test that a synced client only receives later changes."""
+        first = _sync(client)
+        assert len(first['wines']) == 5
+        assert first['deleted'] == [] and first['has_more'] is False
+
+        token = first['next_since']
+        assert _sync(client, token) == {'wines': [], 'deleted': [], 'next_since': token, 'has_more': False}
+
+        edited, removed = Wine.query.order_by(Wine.id).limit(2).all()
+        edited.rating = 1
+        removed_id = removed.id
+        db.session.delete(removed)
+        db.session.commit()
+
+        delta = _sync(client, token)
+        assert [(w['id'], w['rating']) for w in delta['wines']] == [(edited.id, 1)]
+        assert delta['deleted'] == [removed_id]
+        assert delta['next_since'] > token
+
+    def test_pages_through_cursor(self, client, multiple_wines):
+        """Test that small pages cover every change exactly once."""
+        db.session.delete(Wine.query.order_by(Wine.id).first())
+        db.session.commit()
+
+        seen, deleted, since, pages = [], [], 0, 0
+        while True:
+            page = _sync(client, since, limit=2)
+            seen += [w['id'] for w in page['wines']]
+            deleted += page['deleted']
+            since = page['next_since']
+            pages += 1
+            if not page['has_more']:
+                break
+
+        assert pages == 3
+        assert sorted(seen) == sorted(w.id for w in Wine.query)
+        assert len(deleted) == 1
+
+    def test_invalid_since(self, client):
+        """Test that a negative token is rejected."""
+        response = client.get('/api/changes?since=-1')
+        assert response.status_code == 400
@@ -0,0 +1,78 @@
+import pytest
+
+from app import create_app
+from config import Config, TestingConfig
+from database import TimedQueuePool, engine_options
+from extensions import db
+from metrics import DB_POOL_WAIT
+
+
+def _config(uri, **overrides):
+    values = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    values.update(SQLALCHEMY_DATABASE_URI=uri, **overrides)
+    return values
+
+
+def _wait_count():
+    return sum(value for name, _, value in DB_POOL_WAIT.samples() if name.endswith('_count'))
+
+
+@pytest.fixture
+def file_db_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        f"sqlite:///{tmp_path / 'wines.db'}")
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+class TestEngineOptions:
+    """Test per-database engine tuning."""
+
+    def test_memory_sqlite_untouched(self):
+        """Test that in-memory SQLite keeps Flask-SQLAlchemy's static pool."""
+        assert engine_options(_config('sqlite:///:memory:')) == {}
+
+    def test_postgresql_pool_and_timeout(self):
+        """Test that PostgreSQL gets a sized, pre-pinged pool and a statement timeout."""
+        options = engine_options(_config('postgresql://u:p@localhost/wines', DB_POOL_SIZE=12,
+                                         DB_STATEMENT_TIMEOUT_MS=5000))
+        assert options['poolclass'] is TimedQueuePool
+        assert options['pool_size'] == 12
+        assert options['pool_pre_ping'] is True
+        assert options['pool_recycle'] == Config.DB_POOL_RECYCLE
+        assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+
+    def test_asyncpg_statement_timeout(self):
+        """Test that the asyncpg driver gets the timeout as a server setting."""
+        options = engine_options(_config('postgresql+asyncpg://u:p@localhost/wines', DB_STATEMENT_TIMEOUT_MS=5000))
+        assert options['connect_args'] == {'server_settings': {'statement_timeout': '5000'}}
+
+    def test_explicit_options_win(self):
+        """Test that SQLALCHEMY_ENGINE_OPTIONS overrides the tuned defaults."""
+        options = engine_options(_config('postgresql://u:p@localhost/wines', DB_STATEMENT_TIMEOUT_MS=0,
+                                         SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 2}))
+        assert options['pool_size'] == 2
+        assert 'connect_args' not in options
+
+    def test_sqlite_file_pragmas(self, file_db_app):
+        """Test that file databases run in WAL mode with the configured pragmas."""
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql('PRAGMA cache_size').scalar() == Config.SQLITE_CACHE_SIZE
+
+    def test_pool_metrics(self, file_db_app):
+        """Test that checkout waits and pool gauges are exported."""
+        before = _wait_count()
+        response = file_db_app.test_client().get('/api/stats')
+        assert response.status_code == 200
+        assert _wait_count() > before
+
+        body = file_db_app.test_client().get('/metrics').get_data(as_text=True)
+        assert 'db_pool_checkout_wait_seconds_bucket' in body
+        assert f'db_pool_size {Config.DB_POOL_SIZE}' in body
+        assert 'db_pool_checked_out ' in body
@@ -0,0 +1,154 @@
+import os
+import random
+from datetime import datetime
+
+import pytest
+from io import BytesIO
+from PIL import Image, ImageDraw
+from models import Wine
+from extensions import db
+from label_index import LabelIndex, MultiIndexHash, dhash, find_duplicate_wines, hamming, plan_blocks
+
+
+def _label_image(color='navy', text_box=(20, 30, 80, 60)):
+    img = Image.new('RGB', (200, 300), color='white')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((10, 10, 190, 290), outline=color, width=6)
+    draw.rectangle(text_box, fill=color)
+    return img
+
+
+def _upload(img, name='label.jpg'):
+    img_io = BytesIO()
+    img.save(img_io, 'JPEG')
+    img_io.seek(0)
+    return img_io, name
+
+
+class TestMultiIndexHash:
+    """Test the multi-index hash used for near-duplicate lookups."""
+
+    @pytest.mark.parametrize('blocks, max_distance', [(7, 6), (7, 3), (3, 6), (1, 2)])
+    def test_search_matches_brute_force(self, blocks, max_distance):
+        """Test that search returns exactly the brute-force neighbours, for radii above and below blocks - 1."""
+        rng = random.Random(42)
+        values = [rng.getrandbits(64) for _ in range(2000)]
+        # Near copies of a few hashes, so every radius has matches to find
+        for i in range(50):
+            flipped = values[i]
+            for bit in rng.sample(range(64), rng.randint(1, 8)):
+                flipped ^= 1 << bit
+            values.append(flipped)
+        index = MultiIndexHash(blocks)
+        for i, value in enumerate(values):
+            index.add(value, i)
+
+        for probe in values[:50]:
+            expected = sorted(i for i, v in enumerate(values) if hamming(v, probe) <= max_distance)
+            found = sorted(item for _, _, item in index.search(probe, max_distance))
+            assert found == expected
+
+    def test_dhash_tolerates_recompression(self):
+        """Test that a re-encoded copy hashes to a nearby value."""
+        img = _label_image()
+        img_io = BytesIO()
+        img.save(img_io, 'JPEG', quality=40)
+        img_io.seek(0)
+        recompressed = Image.open(img_io)
+
+        distance = hamming(int(dhash(img), 16), int(dhash(recompressed), 16))
+        assert distance <= 4
+
+
+class TestDuplicateDetection:
+    """Test duplicate label warnings when adding wines."""
+
+    def _post_wine(self, client, img, name):
+        data = {
+            'wine_name': name,
+            'vineyard_name': 'Test Vineyard',
+            'vintage_year': 2020,
+            'rating': 4,
+            'image': _upload(img),
+        }
+        return client.post('/wines/add', data=data, follow_redirects=True,
+                           content_type='multipart/form-data')
+
+    def test_add_wine_stores_label_hash(self, app, client, temp_upload_dir):
+        """Test that adding a wine records its label hash."""
+        self._post_wine(client, _label_image(), 'First Bottle')
+        wine = Wine.query.filter_by(wine_name='First Bottle').one()
+        assert wine.label_hash is not None
+        assert len(wine.label_hash) == 16
+
+    def test_add_wine_warns_on_duplicate(self, app, client, temp_upload_dir):
+        """Test that logging the same label twice produces a warning."""
+        self._post_wine(client, _label_image(), 'First Bottle')
+        response = self._post_wine(client, _label_image(), 'Second Bottle')
+
+        assert b'alert-warning' in response.data
+        assert b'looks like First Bottle' in response.data
+
+    def test_add_wine_no_warning_for_different_label(self, app, client, temp_upload_dir):
+        """Test that unrelated labels do not trigger a warning."""
+        self._post_wine(client, _label_image(), 'First Bottle')
+        other = _label_image(color='darkred', text_box=(120, 200, 180, 280))
+        response = self._post_wine(client, other.transpose(Image.Transpose.FLIP_TOP_BOTTOM),
+                                   'Other Bottle')
+
+        assert b'alert-warning' not in response.data
+
+    def test_deleted_wine_does_not_hide_matches(self, app):
+        """Test that a deleted near-duplicate is dropped from the index, not just from the results."""
+        def add(name, label_hash):
+            wine = Wine(wine_name=name, vineyard_name='Test Vineyard', vintage_year=2020, rating=4,
+                        image_path=f'uploads/{name}.jpg', thumbnail_path=f'uploads/thumbnails/{name}.jpg',
+                        label_hash=label_hash)
+            db.session.add(wine)
+            db.session.commit()
+            return wine
+        deleted = add('Deleted', 'ffff0000ffff0000')
+        add('Kept', 'ffff0000ffff0001')
+        assert [w.wine_name for w in find_duplicate_wines('ffff0000ffff0000', limit=1)] == ['Deleted']
+
+        db.session.delete(deleted)
+        db.session.commit()
+
+        assert [w.wine_name for w in find_duplicate_wines('ffff0000ffff0000', limit=1)] == ['Kept']
+
+    def test_late_commit_with_earlier_timestamp_is_indexed(self, app):
+        """Test that refresh follows change_seq, so a row stamped before the last refresh still arrives."""
+        def add(name, label_hash, modified=None):
+            wine = Wine(wine_name=name, vineyard_name='Test Vineyard', vintage_year=2020, rating=4,
+                        image_path=f'uploads/{name}.jpg', thumbnail_path=f'uploads/thumbnails/{name}.jpg',
+                        label_hash=label_hash)
+            if modified is not None:
+                wine.date_added = wine.date_modified = modified
+            db.session.add(wine)
+            db.session.commit()
+            return wine
+        add('First', '0f0f0f0f0f0f0f0f')
+        assert find_duplicate_wines('f0f0f0f0f0f0f0f0') == []
+
+        add('Late', 'f0f0f0f0f0f0f0f0', modified=datetime(2000, 1, 1))
+
+        assert [w.wine_name for w in find_duplicate_wines('f0f0f0f0f0f0f0f0')] == ['Late']
+
+    def test_index_is_planned_for_its_size(self, app):
+        """Test that a fresh index picks its block layout for the configured radius and row count."""
+        index = LabelIndex(6)
+        index.refresh()
+        assert len(index.table.ranges) == plan_blocks(6, 1000)
+        assert plan_blocks(6, 100000) == 4
+
+    def test_backfill_command(self, app, runner, temp_upload_dir, sample_wine):
+        """Test that the backfill command hashes existing thumbnails."""
+        thumb = os.path.join(app.config['THUMBNAIL_FOLDER'], 'thumb_test_image.jpg')
+        _label_image().save(thumb, 'JPEG')
+
+        result = runner.invoke(args=['backfill-label-hashes', '--workers', '1'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Backfilled 1 label hashes' in result.output
+        db.session.expire_all()
+        assert db.session.get(Wine, sample_wine.id).label_hash is not None
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+from app import create_app
+from config import TestingConfig
+from metrics import Histogram, MultiprocessStore, registry
+
+
+class TestInstrumentation:
+    """Test request instrumentation and the Prometheus endpoint."""
+
+    def test_histogram_samples_are_cumulative(self):
+        """Test that bucket counts accumulate up to +Inf."""
+        histogram = Histogram('test_seconds', 'Test.', labels=('route',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, 'a')
+        histogram.observe(0.5, 'a')
+        histogram.observe(5, 'a')
+
+        samples = {(name, labels): value for name, labels, value in histogram.samples()}
+        assert samples[('test_seconds_bucket', '{route="a",le="0.1"}')] == 1
+        assert samples[('test_seconds_bucket', '{route="a",le="1.0"}')] == 2
+        assert samples[('test_seconds_bucket', '{route="a",le="+Inf"}')] == 3
+        assert samples[('test_seconds_count', '{route="a"}')] == 3
+
+    def test_server_timing_header(self, client, multiple_wines):
+        """Test that responses report total and database time."""
+        response = client.get('/api/stats')
+        header = response.headers['Server-Timing']
+        assert header.startswith('app;dur=')
+        assert 'db;dur=' in header
+        assert 'desc="5 queries"' in header
+
+    def test_server_timing_image_phases(self, client, temp_upload_dir, sample_image_file):
+        """Test that uploads report decode, resize and encode time."""
+        data = {
+            'wine_name': 'Test Wine',
+            'vineyard_name': 'Test Vineyard',
+            'vintage_year': 2020,
+            'rating': 4,
+            'image': (sample_image_file, 'label.jpg'),
+        }
+        response = client.post('/wines/add', data=data, content_type='multipart/form-data')
+        header = response.headers['Server-Timing']
+        for phase in ('decode', 'resize', 'encode'):
+            assert f'{phase};dur=' in header
+
+    def test_metrics_endpoint(self, client):
+        """Test the Prometheus text endpoint."""
+        client.get('/api/wines')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        body = response.get_data(as_text=True)
+        assert '# TYPE http_request_duration_seconds histogram' in body
+        assert 'endpoint="api.get_wines"' in body
+        assert 'upload_queue_depth 0' in body
+
+
+def _count(snapshot, name='sql_query_duration_seconds'):
+    return sum(item[3] for item in snapshot.get(name, []))
+
+
+class TestMultiprocessMetrics:
+    """Test sharing /metrics between worker processes."""
+
+    def test_store_merges_workers_and_survives_exit(self, tmp_path):
+        """Test that every worker's histograms are summed and kept after a worker exits."""
+        store = MultiprocessStore(str(tmp_path))
+        collectors = [lambda: [('test_gauge', 'gauge', 'Test.', [({}, 7)])]]
+        store.write(collectors)
+        own = _count(registry.snapshot())
+        # A second worker with the same counts
+        shutil.copy(tmp_path / f'{os.getpid()}.json', tmp_path / '99999.json')
+
+        snapshot, collected = store.read()
+        assert _count(snapshot) == 2 * own
+        assert sorted(labels['worker'] for labels, _ in collected[0][3]) == sorted([str(os.getpid()), '99999'])
+
+        store.stop()
+        snapshot, collected = store.read()
+        assert not (tmp_path / f'{os.getpid()}.json').exists()
+        assert _count(snapshot) == 2 * own
+        assert [labels['worker'] for labels, _ in collected[0][3]] == ['99999']
+
+    def test_endpoint_reports_every_worker(self, monkeypatch, tmp_path):
+        """Test that /metrics includes other workers' requests when a directory is configured."""
+        monkeypatch.setattr(TestingConfig, 'METRICS_MULTIPROC_DIR', str(tmp_path))
+        app = create_app('testing')
+        client = app.test_client()
+        client.get('/about')
+        app.extensions['metrics_store'].write(app.extensions['metrics_collectors'])
+        shutil.copy(tmp_path / f'{os.getpid()}.json', tmp_path / '99999.json')
+
+        body = client.get('/metrics').get_data(as_text=True)
+
+        line = next(line for line in body.splitlines()
+                    if line.startswith('http_request_duration_seconds_count{') and 'main.about' in line)
+        assert int(line.rsplit(' ', 1)[1]) >= 2
+        assert 'worker="99999"' in body
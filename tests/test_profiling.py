@@ -0,0 +1,124 @@
+import pstats
+import threading
+
+import pytest
+
+from app import create_app
+from config import TestingConfig
+from extensions import db
+from profiling import list_profiles
+
+
+@pytest.fixture
+def profiled_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'PROFILING_ENABLED', True, raising=False)
+    monkeypatch.setattr(TestingConfig, 'PROFILE_SECRET', 'sesame', raising=False)
+    monkeypatch.setattr(TestingConfig, 'PROFILE_DIR', str(tmp_path), raising=False)
+    monkeypatch.setattr(TestingConfig, 'PROFILE_MAX_FILES', 3, raising=False)
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class TestProfiling:
+    """Test opt-in request profiling."""
+
+    def test_disabled_by_default(self, app, client):
+        """Test that profiling routes are not registered unless enabled."""
+        assert client.get('/_profiles', headers={'X-Profile': 'anything'}).status_code == 404
+
+    def test_unprofiled_request_writes_nothing(self, profiled_app, tmp_path):
+        """Test that requests without the secret header are not profiled."""
+        client = profiled_app.test_client()
+        client.get('/api/stats')
+        client.get('/api/stats', headers={'X-Profile': 'wrong'})
+        assert list(tmp_path.iterdir()) == []
+
+    def test_secret_header_captures_profile(self, profiled_app, tmp_path):
+        """Test that the secret header writes a readable pstats file."""
+        client = profiled_app.test_client()
+        assert client.get('/api/stats', headers={'X-Profile': 'sesame'}).status_code == 200
+
+        profiles = list_profiles(str(tmp_path))
+        assert len(profiles) == 1
+        assert profiles[0]['route'] == 'api.get_stats'
+        stats = pstats.Stats(str(tmp_path / profiles[0]['filename']))
+        assert stats.total_calls > 0
+
+    def test_batch_is_one_profile(self, profiled_app, tmp_path):
+        """Test that a profiled batch writes one profile covering every sub-request."""
+        client = profiled_app.test_client()
+        response = client.post('/api/batch', json={'requests': ['/api/stats', '/api/wines']},
+                               headers={'X-Profile': 'sesame'})
+        assert response.status_code == 200
+
+        profiles = list_profiles(str(tmp_path))
+        assert [p['route'] for p in profiles] == ['api.run_batch']
+        stats = pstats.Stats(str(tmp_path / profiles[0]['filename']))
+        views = {func[2] for func in stats.stats}
+        assert {'get_stats', 'get_wines'} <= views
+
+    def test_overlapping_requests_profile_one(self, profiled_app, tmp_path):
+        """Test that a request arriving while another is profiled runs unprofiled."""
+        entered, release = threading.Event(), threading.Event()
+
+        def slow():
+            entered.set()
+            release.wait(5)
+            return 'done'
+
+        profiled_app.add_url_rule('/_slow', 'slow', slow)
+        responses = []
+        first = threading.Thread(target=lambda: responses.append(
+            profiled_app.test_client().get('/_slow', headers={'X-Profile': 'sesame'})))
+        first.start()
+        try:
+            assert entered.wait(5)
+            second = profiled_app.test_client().get('/api/stats', headers={'X-Profile': 'sesame'})
+        finally:
+            release.set()
+            first.join(5)
+
+        assert second.status_code == 200
+        assert responses[0].status_code == 200
+        assert [p['route'] for p in list_profiles(str(tmp_path))] == ['slow']
+
+    def test_sample_rate(self, profiled_app, tmp_path):
+        """Test that a sample rate of one profiles every request."""
+        profiled_app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        profiled_app.test_client().get('/about')
+        assert [p['route'] for p in list_profiles(str(tmp_path))] == ['main.about']
+
+    def test_directory_is_rotated(self, profiled_app, tmp_path):
+        """Test that only the newest PROFILE_MAX_FILES profiles are kept."""
+        client = profiled_app.test_client()
+        for _ in range(5):
+            client.get('/about', headers={'X-Profile': 'sesame'})
+        assert len(list_profiles(str(tmp_path))) == 3
+
+    def test_index_requires_secret(self, profiled_app):
+        """Test that the profile index is hidden without the secret."""
+        client = profiled_app.test_client()
+        client.get('/about', headers={'X-Profile': 'sesame'})
+        assert client.get('/_profiles').status_code == 404
+        assert client.get('/_profiles?secret=sesame').status_code == 404
+
+        response = client.get('/_profiles', headers={'X-Profile': 'sesame'})
+        assert response.status_code == 200
+        assert b'main.about' in response.data
+        assert b'sesame' not in response.data
+
+    def test_download(self, profiled_app, tmp_path):
+        """Test that a listed profile can be downloaded."""
+        client = profiled_app.test_client()
+        client.get('/about', headers={'X-Profile': 'sesame'})
+        filename = list_profiles(str(tmp_path))[0]['filename']
+
+        response = client.get(f'/_profiles/{filename}', headers={'X-Profile': 'sesame'})
+        assert response.status_code == 200
+        assert response.data == (tmp_path / filename).read_bytes()
+        assert client.get(f'/_profiles/{filename}?secret=sesame').status_code == 404
+        assert client.get('/_profiles/../config.py', headers={'X-Profile': 'sesame'}).status_code == 404
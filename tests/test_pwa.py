@@ -0,0 +1,52 @@
+import json
+import re
+
+import pwa
+from app import create_app
+
+
+def _constant(script, name):
+    return json.loads(re.search(rf'const {name} = (.+);', script).group(1))
+
+
+class TestServiceWorker:
+    """Test the rendered service worker."""
+
+    def test_served_from_root(self, client):
+        """Test that the worker is served with a site-wide scope and no caching."""
+        response = client.get('/sw.js')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/javascript'
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    def test_precache_manifest(self, client, app):
+        """Test that the manifest lists the pages and static files to precache."""
+        app.extensions['asset_manifest'] = {'js/main.js': 'dist/js/main.0123456789.js'}
+        script = client.get('/sw.js').get_data(as_text=True)
+        assert _constant(script, 'PRECACHE_URLS') == [
+            '/', '/gallery', '/search', '/static/css/style.css', '/static/dist/js/main.0123456789.js'
+        ]
+        assert _constant(script, 'VERSION') == app.extensions['pwa_version']
+        assert _constant(script, 'THUMBNAIL_MAX_BYTES') == app.config['SW_THUMBNAIL_CACHE_BYTES']
+
+    def test_version_follows_content(self, app, tmp_path, monkeypatch):
+        """Test that editing a precached file changes the build version."""
+        static = tmp_path / 'static'
+        (static / 'css').mkdir(parents=True)
+        (static / 'js').mkdir()
+        (static / 'css' / 'style.css').write_text('body {}')
+        (static / 'js' / 'main.js').write_text('')
+        monkeypatch.setattr(app, 'static_folder', str(static))
+
+        before = pwa.build_version(app)
+        assert pwa.build_version(app) == before
+        (static / 'css' / 'style.css').write_text('body { color: red }')
+        assert pwa.build_version(app) != before
+
+    def test_asset_version_override(self, monkeypatch):
+        """Test that a deploy-time version replaces the content hash."""
+        from config import TestingConfig
+        monkeypatch.setattr(TestingConfig, 'ASSET_VERSION', 'abc123')
+        app = create_app('testing')
+        assert app.test_client().get('/sw.js').get_data(as_text=True).startswith(
+            '// Service Worker for offline capabilities (rendered by pwa.py)\nconst VERSION = "abc123";')
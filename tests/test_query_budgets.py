@@ -0,0 +1,59 @@
+import pytest
+from models import Wine
+from tests.query_budgets import ROUTE_QUERY_BUDGETS, UNBUDGETED_ENDPOINTS, query_budget
+
+
+class TestQueryBudgets:
+    """Keep SQL statements per request within the declared budgets."""
+
+    def test_every_route_has_a_budget(self, app):
+        """Test that each registered endpoint declares a query budget."""
+        endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+        missing = endpoints - set(ROUTE_QUERY_BUDGETS) - UNBUDGETED_ENDPOINTS
+        assert not missing, f'Add query budgets for: {sorted(missing)}'
+
+    def test_detects_repeated_queries(self, app, client, query_counter, multiple_wines):
+        """Test that an N+1 pattern is reported even within budget."""
+        @app.route('/_n_plus_one')
+        def n_plus_one():
+            for wine in Wine.query.all():
+                Wine.query.filter_by(vineyard_name='Penfolds').count()
+            return ''
+
+        client.get('/_n_plus_one')
+        problems = query_counter.check({'n_plus_one': 100})
+        assert any('repeated identical query' in p for p in problems)
+
+    @query_budget
+    def test_main_pages(self, client, multiple_wines):
+        for path in ('/', '/search', '/gallery', '/about'):
+            assert client.get(path).status_code == 200
+
+    @query_budget
+    def test_wine_pages(self, client, multiple_wines):
+        assert client.get('/wines/').status_code == 200
+        assert client.get('/wines/add').status_code == 200
+        assert client.get(f'/wines/{Wine.query.first().id}').status_code == 200
+        assert client.get(f'/wines/{Wine.query.first().id}/edit').status_code == 200
+
+    @query_budget
+    def test_wine_writes(self, client, temp_upload_dir, sample_wine, sample_image_file):
+        data = {
+            'wine_name': 'Test Wine',
+            'vineyard_name': 'Test Vineyard',
+            'vintage_year': 2020,
+            'rating': 4,
+            'notes': '',
+        }
+        client.post('/wines/add', data=dict(data, image=(sample_image_file, 'label.jpg')),
+                    content_type='multipart/form-data')
+        client.post(f'/wines/{sample_wine.id}/edit', data=data)
+        client.post(f'/wines/{sample_wine.id}/delete')
+
+    @query_budget
+    def test_api_routes(self, client, multiple_wines):
+        wine_id = Wine.query.first().id
+        for path in ('/api/search?q=opus', '/api/wines', f'/api/wines/{wine_id}',
+                     f'/api/wines/{wine_id}/similar', '/api/wines/suggestions?q=ca',
+                     '/api/stats'):
+            assert client.get(path).status_code == 200
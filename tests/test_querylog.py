@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from extensions import db
+from models import Wine
+from querylog import SlowQueryLog, normalize_statement, read_entries, summarize
+
+
+@pytest.fixture
+def slow_log(app, tmp_path):
+    path = tmp_path / 'slow.log'
+    log = SlowQueryLog(db.engine, str(path), threshold_ms=0)
+    yield path
+    log.close()
+
+
+class TestSlowQueryLog:
+    """Test the slow-query log and its summary."""
+
+    def test_normalize_statement(self):
+        """Test that literals and expanded IN lists collapse to placeholders."""
+        a = normalize_statement("SELECT * FROM wines WHERE id IN (?, ?, ?) LIMIT 20")
+        b = normalize_statement("SELECT *\n  FROM wines WHERE id IN (?, ?) LIMIT 50")
+        assert a == b == 'SELECT * FROM wines WHERE id IN (?, ...) LIMIT ?'
+        assert normalize_statement("WHERE name = 'it''s'") == 'WHERE name = ?'
+
+    def test_logs_route_parameters_and_plan(self, client, multiple_wines, slow_log):
+        """Test that entries record the route, parameters and SQLite query plan."""
+        client.get('/api/search?q=cabernet')
+
+        entries = [e for e in read_entries(str(slow_log)) if e['route'] == 'api.search']
+        assert entries
+        entry = next(e for e in entries if 'LIKE' in e['statement'].upper())
+        assert '%cabernet%' in entry['parameters']
+        assert entry['method'] == 'GET'
+        assert entry['plan'] and any('wines' in line for line in entry['plan'])
+
+    def test_threshold(self, app, multiple_wines, tmp_path):
+        """Test that fast statements are not logged."""
+        path = tmp_path / 'slow.log'
+        log = SlowQueryLog(db.engine, str(path), threshold_ms=60_000)
+        try:
+            Wine.query.all()
+        finally:
+            log.close()
+        assert not path.exists()
+
+    def test_explain_does_not_disturb_results(self, app, multiple_wines, slow_log):
+        """Test that capturing a plan leaves the original result set intact."""
+        assert len(Wine.query.all()) == len(multiple_wines)
+
+    def test_summarize_groups_by_statement(self):
+        """Test that the summary aggregates and orders by total time."""
+        entries = [
+            {'statement': 'SELECT a FROM t WHERE x = 1', 'duration_ms': 5, 'route': 'r1'},
+            {'statement': 'SELECT a FROM t WHERE x = 2', 'duration_ms': 7, 'route': 'r2',
+             'plan': ['SCAN t']},
+            {'statement': 'SELECT b FROM u', 'duration_ms': 10, 'route': None},
+        ]
+        summary = summarize(entries)
+        assert summary[0]['statement'] == 'SELECT a FROM t WHERE x = ?'
+        assert summary[0]['count'] == 2
+        assert summary[0]['max_ms'] == 7
+        assert summary[0]['plan'] == ['SCAN t']
+        assert summary[1]['routes'] == {'(no request)': 1}
+
+    def test_cli_summary(self, app, tmp_path):
+        """Test that the slow-queries command prints the worst statements."""
+        path = tmp_path / 'slow.log'
+        path.write_text(json.dumps({'statement': 'SELECT count(*) FROM wines GROUP BY rating',
+                                    'duration_ms': 250.0, 'route': 'api.get_stats',
+                                    'plan': ['SCAN wines']}) + '\n')
+        result = app.test_cli_runner().invoke(args=['slow-queries', '--log', str(path)])
+        assert result.exit_code == 0
+        assert 'GROUP BY rating' in result.output
+        assert 'api.get_stats (1)' in result.output
+        assert 'SCAN wines' in result.output
@@ -0,0 +1,113 @@
+import pytest
+
+from app import create_app
+from config import TestingConfig
+from extensions import db
+from models import Wine
+from querylog import read_entries
+
+
+def _add_wine(name):
+    db.session.add(Wine(wine_name=name, vineyard_name='Test Vineyard', vintage_year=2020, rating=4,
+                        image_path='uploads/primary.jpg', thumbnail_path='uploads/thumbnails/primary.jpg'))
+    db.session.commit()
+
+
+@pytest.fixture
+def replica_app(monkeypatch, tmp_path):
+    """App with a file primary and one file replica holding different rows."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_REPLICA_URIS', [f"sqlite:///{tmp_path / 'replica.db'}"])
+    monkeypatch.setattr(TestingConfig, 'SLOW_QUERY_LOG_ENABLED', True, raising=False)
+    monkeypatch.setattr(TestingConfig, 'SLOW_QUERY_LOG', str(tmp_path / 'slow.log'), raising=False)
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        replica = app.extensions['db_replicas'].engines[0]
+        Wine.metadata.create_all(replica)
+        _add_wine('Primary Wine')
+        with replica.begin() as conn:
+            conn.execute(db.insert(Wine), [{'wine_name': 'Replica Wine', 'vineyard_name': 'Test Vineyard',
+                                            'vintage_year': 2020, 'rating': 4,
+                                            'image_path': 'uploads/replica.jpg',
+                                            'thumbnail_path': 'uploads/thumbnails/replica.jpg',
+                                            'change_seq': 1}])
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+        replica.dispose()
+
+
+def _edit(client):
+    client.post('/wines/1/edit', data={'wine_name': 'Edited Wine', 'vineyard_name': 'Test Vineyard',
+                                       'vintage_year': 2021, 'rating': 5})
+
+
+def _names(client):
+    db.session.expire_all()
+    return [w['wine_name'] for w in client.get('/api/wines').get_json()['wines']]
+
+
+class TestReplicaRouting:
+    """Test read-replica routing, stickiness and fallback."""
+
+    def test_get_reads_from_replica(self, replica_app):
+        """Test that safe API requests are served from the replica."""
+        assert _names(replica_app.test_client()) == ['Replica Wine']
+
+    def test_writes_go_to_primary(self, replica_app):
+        """Test that an edit writes to the primary, not the replica."""
+        client = replica_app.test_client()
+        _edit(client)
+
+        with replica_app.extensions['db_replicas'].engines[0].connect() as conn:
+            replica_names = conn.execute(db.select(Wine.wine_name)).scalars().all()
+        assert replica_names == ['Replica Wine']
+        assert db.session.execute(db.select(Wine.wine_name)).scalars().all() == ['Edited Wine']
+
+    def test_read_your_writes_after_post(self, replica_app):
+        """Test that a client is pinned to the primary right after it writes."""
+        client = replica_app.test_client()
+        _edit(client)
+        assert _names(client) == ['Edited Wine']
+        # Another client without the sticky cookie still reads the replica
+        assert _names(replica_app.test_client()) == ['Replica Wine']
+
+    def test_sticky_window_expires(self, replica_app):
+        """Test that stickiness is disabled when the window is zero."""
+        replica_app.config['REPLICA_STICKY_SECONDS'] = 0
+        client = replica_app.test_client()
+        _edit(client)
+        assert _names(client) == ['Replica Wine']
+
+    def test_unhealthy_replica_falls_back_to_primary(self, replica_app):
+        """Test that reads use the primary while the replica is down."""
+        replicas = replica_app.extensions['db_replicas']
+        replicas.mark_down(replica_app.extensions['db_replicas'].engines[0])
+        assert _names(replica_app.test_client()) == ['Primary Wine']
+
+    @pytest.mark.parametrize('parallel', [False, True])
+    def test_batch_reads_from_replica(self, replica_app, parallel):
+        """Test that every sub-request of a batch reads from the replica."""
+        response = replica_app.test_client().post('/api/batch', json={
+            'requests': ['/api/wines', '/api/wines'], 'parallel': parallel})
+        names = [entry['body']['wines'][0]['wine_name'] for entry in response.get_json()['responses']]
+        assert names == ['Replica Wine', 'Replica Wine']
+
+    def test_other_blueprints_use_primary(self, replica_app):
+        """Test that blueprints not listed as read-only stay on the primary."""
+        response = replica_app.test_client().get('/wines/')
+        assert b'Primary Wine' in response.data
+        assert b'Replica Wine' not in response.data
+
+    def test_slow_query_log_covers_replicas(self, replica_app, tmp_path):
+        """Test that reads served by a replica reach the slow-query log, with their plan."""
+        log = replica_app.extensions['slow_query_log']
+        log.threshold = 0
+
+        assert _names(replica_app.test_client()) == ['Replica Wine']
+        log.close()
+
+        entries = [e for e in read_entries(str(tmp_path / 'slow.log')) if e['route'] == 'api.get_wines']
+        assert entries and all(e['engine'] == 'replica0' for e in entries)
+        assert any(e['plan'] for e in entries)
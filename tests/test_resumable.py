@@ -0,0 +1,226 @@
+import base64
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import resumable
+from extensions import db
+from models import ImageUpload, Wine
+from storage import collect_orphans
+
+
+@pytest.fixture
+def spool(app, temp_upload_dir):
+    """Spool folder next to the temporary upload folder."""
+    folder = os.path.join(os.path.dirname(temp_upload_dir), 'spool')
+    app.config['UPLOAD_SPOOL_FOLDER'] = folder
+    return folder
+
+
+@pytest.fixture
+def photo():
+    img = Image.effect_noise((400, 300), 64).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def b64(value):
+    return base64.b64encode(value if isinstance(value, bytes) else value.encode()).decode()
+
+
+def create(client, length, filename='label.jpg', **metadata):
+    pairs = [f'filename {b64(filename)}'] + [f'{key} {b64(value)}' for key, value in metadata.items()]
+    return client.post('/api/uploads', headers={'Tus-Resumable': '1.0.0', 'Upload-Length': str(length),
+                                                'Upload-Metadata': ','.join(pairs)})
+
+
+def patch(client, location, offset, chunk, checksum=None):
+    headers = {'Tus-Resumable': '1.0.0', 'Upload-Offset': str(offset)}
+    if checksum:
+        headers['Upload-Checksum'] = checksum
+    return client.patch(location, data=chunk, headers=headers, content_type='application/offset+octet-stream')
+
+
+def upload(client, data, chunk_size=4096):
+    location = create(client, len(data)).headers['Location']
+    for offset in range(0, len(data), chunk_size):
+        response = patch(client, location, offset, data[offset:offset + chunk_size])
+    return location, response
+
+
+class TestCreateUpload:
+    """Test starting and inspecting uploads."""
+
+    def test_create(self, app, client, spool):
+        """Test that a new upload starts at offset 0 with the tus headers."""
+        response = create(client, 1000)
+
+        assert response.status_code == 201
+        assert response.headers['Tus-Resumable'] == '1.0.0'
+        assert response.headers['Location'].startswith('/api/uploads/')
+
+        head = client.head(response.headers['Location'])
+        assert head.status_code == 200
+        assert (head.headers['Upload-Offset'], head.headers['Upload-Length']) == ('0', '1000')
+
+    def test_rejects_bad_requests(self, app, client, spool):
+        """Test length, size limit and filename validation."""
+        app.config['CHUNKED_UPLOAD_MAX_SIZE'] = 1000
+
+        assert create(client, 0).status_code == 400
+        assert create(client, 1001).status_code == 413
+        assert create(client, 100, filename='notes.txt').status_code == 400
+
+    def test_unknown_upload(self, app, client, spool):
+        """Test that unknown and malformed ids are 404s."""
+        assert client.head(f'/api/uploads/{"0" * 32}').status_code == 404
+        assert patch(client, '/api/uploads/not-an-upload', 0, b'x').status_code == 404
+
+
+class TestAppendChunks:
+    """Test PATCHing chunks into an upload."""
+
+    def test_chunks_assemble_into_image(self, app, client, spool, photo):
+        """Test that the last chunk processes the image and returns its image_id."""
+        location, response = upload(client, photo)
+
+        assert response.status_code == 201
+        upload_row = db.session.get(ImageUpload, response.get_json()['image_id'])
+        assert upload_row.label_hash is not None
+        assert os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(upload_row.image_path)))
+        assert not os.path.exists(os.path.join(spool, location.rsplit('/', 1)[1] + '.part'))
+
+    def test_intermediate_chunk(self, app, client, spool):
+        """Test that a chunk short of the end returns 204 and the new offset."""
+        location = create(client, 100).headers['Location']
+
+        response = patch(client, location, 0, b'x' * 40)
+
+        assert response.status_code == 204
+        assert response.headers['Upload-Offset'] == '40'
+        assert client.head(location).headers['Upload-Offset'] == '40'
+
+    def test_wrong_offset_conflicts(self, app, client, spool):
+        """Test that a chunk at the wrong offset is rejected with 409."""
+        location = create(client, 100).headers['Location']
+        patch(client, location, 0, b'x' * 40)
+
+        assert patch(client, location, 10, b'x' * 10).status_code == 409
+        assert client.head(location).headers['Upload-Offset'] == '40'
+
+    def test_requires_offset_content_type(self, app, client, spool):
+        """Test that chunks must be sent as application/offset+octet-stream."""
+        location = create(client, 100).headers['Location']
+
+        response = client.patch(location, data=b'x', headers={'Upload-Offset': '0'},
+                                content_type='application/octet-stream')
+
+        assert response.status_code == 415
+
+    def test_chunk_past_length(self, app, client, spool):
+        """Test that a chunk running past Upload-Length is rejected and discarded."""
+        location = create(client, 10).headers['Location']
+
+        assert patch(client, location, 0, b'x' * 11).status_code == 413
+        assert client.head(location).headers['Upload-Offset'] == '0'
+
+    def test_checksum_mismatch_discards_chunk(self, app, client, spool):
+        """Test that a chunk failing its Upload-Checksum is truncated away."""
+        location = create(client, 100).headers['Location']
+        wrong = 'sha256 ' + b64(hashlib.sha256(b'other').digest())
+        right = 'sha256 ' + b64(hashlib.sha256(b'x' * 40).digest())
+
+        assert patch(client, location, 0, b'x' * 40, checksum=wrong).status_code == 460
+        assert client.head(location).headers['Upload-Offset'] == '0'
+        assert patch(client, location, 0, b'x' * 40, checksum=right).status_code == 204
+
+    def test_whole_file_checksum(self, app, client, spool, photo):
+        """Test that a file not matching its sha256 metadata is dropped."""
+        location = create(client, len(photo), sha256=hashlib.sha256(b'other').hexdigest()).headers['Location']
+
+        response = patch(client, location, 0, photo)
+
+        assert response.status_code == 460
+        assert client.head(location).status_code == 404
+        assert patch(client, location, len(photo), b'').status_code == 404
+        assert os.listdir(spool) == []
+        assert ImageUpload.query.count() == 0
+
+    def test_whole_file_checksum_match(self, app, client, spool, photo):
+        """Test that a file matching its sha256 metadata is processed."""
+        location = create(client, len(photo), sha256=hashlib.sha256(photo).hexdigest()).headers['Location']
+
+        assert patch(client, location, 0, photo).status_code == 201
+
+    def test_repeated_final_chunk_returns_same_image(self, app, client, spool, photo):
+        """Test that a client can repeat the last PATCH after losing the response."""
+        location, first = upload(client, photo)
+
+        again = patch(client, location, len(photo), b'')
+
+        assert again.status_code == 201
+        assert again.get_json()['image_id'] == first.get_json()['image_id']
+        assert ImageUpload.query.count() == 1
+
+    def test_cancel(self, app, client, spool):
+        """Test that DELETE removes the upload."""
+        location = create(client, 100).headers['Location']
+
+        assert client.delete(location).status_code == 204
+        assert client.head(location).status_code == 404
+        assert os.listdir(spool) == []
+
+
+class TestAddFormWithUpload:
+    """Test the add form with a pre-uploaded image."""
+
+    def test_add_wine_with_image_id(self, app, client, spool, photo):
+        """Test that the add form attaches the upload and consumes it."""
+        _, response = upload(client, photo)
+        image_id = response.get_json()['image_id']
+
+        response = client.post('/wines/add', data={
+            'image_id': image_id, 'wine_name': 'Big Label', 'vineyard_name': 'Estate',
+            'vintage_year': 2018, 'rating': 4
+        })
+
+        assert response.status_code == 302
+        wine = Wine.query.filter_by(wine_name='Big Label').one()
+        assert wine.image_path.startswith('uploads/') and wine.placeholder
+        assert db.session.get(ImageUpload, image_id) is None
+
+    def test_add_wine_with_expired_image_id(self, app, client, spool):
+        """Test that an unknown image_id is reported instead of saving the wine."""
+        response = client.post('/wines/add', data={
+            'image_id': 'f' * 32, 'wine_name': 'Big Label', 'vineyard_name': 'Estate',
+            'vintage_year': 2018, 'rating': 4
+        }, follow_redirects=True)
+
+        assert b'expired' in response.data
+        assert Wine.query.count() == 0
+
+
+class TestExpireUploads:
+    """Test cleaning up abandoned uploads."""
+
+    def test_expire_uploads(self, app, client, spool):
+        """Test that uploads untouched past the expiry are removed by gc-images."""
+        old = create(client, 100).headers['Location'].rsplit('/', 1)[1]
+        patch(client, f'/api/uploads/{old}', 0, b'x' * 40)
+        create(client, 100)
+        stale = time.time() - 7200
+        for name in (f'{old}.json', f'{old}.part'):
+            os.utime(os.path.join(spool, name), (stale, stale))
+        app.config['CHUNKED_UPLOAD_EXPIRY'] = 3600
+
+        assert resumable.expire_uploads(dry_run=True)[0] == 1
+        report = collect_orphans()
+
+        assert report.expired_uploads == 1
+        assert not os.path.exists(os.path.join(spool, f'{old}.part'))
+        assert len(os.listdir(spool)) == 2
@@ -0,0 +1,23 @@
+from models import Wine
+
+
+class TestSeedData:
+    """Test the synthetic data generator."""
+
+    def test_seed_command_inserts_valid_wines(self, app, runner, temp_upload_dir):
+        """Test that seeded rows are batched, valid and share one image."""
+        result = runner.invoke(args=['seed-wines', '--count', '250', '--batch-size', '100',
+                                     '--seed', '7'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Seeded 250 wines.' in result.output
+        assert Wine.query.count() == 250
+        wines = Wine.query.all()
+        assert all(not wine.validate() for wine in wines)
+        assert len({wine.image_path for wine in wines}) == 1
+
+    def test_seed_placeholder_images(self, app, runner, temp_upload_dir):
+        """Test that placeholder mode cycles through several label images."""
+        runner.invoke(args=['seed-wines', '--count', '30', '--images', 'placeholder'])
+
+        assert Wine.query.with_entities(Wine.image_path).distinct().count() > 1
@@ -0,0 +1,143 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+from models import Wine
+from extensions import db
+from similarity import FEATURE_DIM, SimilarityIndex, build_index, extract_features, read_manifest
+
+
+def _label(color, box=(40, 60, 160, 120)):
+    img = Image.new('RGB', (200, 300), color='white')
+    ImageDraw.Draw(img).rectangle(box, fill=color)
+    return img
+
+
+def _add_wine(name, img):
+    wine = Wine(
+        wine_name=name,
+        vineyard_name='Test Vineyard',
+        vintage_year=2020,
+        rating=4,
+        image_path=f'uploads/{name}.jpg',
+        thumbnail_path=f'uploads/thumbnails/thumb_{name}.jpg',
+        label_features=extract_features(img).tobytes()
+    )
+    db.session.add(wine)
+    db.session.commit()
+    return wine
+
+
+class TestSimilaritySearch:
+    """Test visual similarity search over label features."""
+
+    def test_extract_features_unit_length(self):
+        """Test that feature vectors are unit length with a fixed size."""
+        vector = extract_features(_label('navy'))
+        assert vector.shape == (FEATURE_DIM,)
+        assert abs(float(np.linalg.norm(vector)) - 1.0) < 1e-5
+
+    def test_index_search_ranks_closest_first(self, app, tmp_path):
+        """Test that the memory-mapped index returns the closest label first."""
+        _add_wine('navy', _label('navy'))
+        _add_wine('red', _label('red', box=(10, 200, 60, 290)))
+        _add_wine('navy2', _label('navy', box=(42, 62, 158, 118)))
+
+        assert build_index(str(tmp_path)) == 3
+        index = SimilarityIndex(str(tmp_path))
+        results = index.search(extract_features(_label('navy')), limit=2)
+
+        names = [db.session.get(Wine, wine_id).wine_name for wine_id, _ in results]
+        assert names[0] in ('navy', 'navy2')
+        assert 'red' not in names
+
+    def test_partitioned_index_finds_match(self, app, tmp_path):
+        """Test that the coarse partition index still finds exact matches."""
+        rng = np.random.default_rng(1)
+        for i in range(80):
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            _add_wine(f'wine{i}', _label(color))
+
+        build_index(str(tmp_path), partition_threshold=50)
+        index = SimilarityIndex(str(tmp_path))
+        target = db.session.get(Wine, 17)
+        query = np.frombuffer(target.label_features, dtype=np.float32)
+        results = index.search(query, limit=1, nprobe=2)
+
+        assert len(index.centroids) > 1
+        assert results[0][0] == 17
+
+    def test_similar_endpoint_includes_unindexed_wines(self, app, client, tmp_path):
+        """Test that wines added after the last build are still returned."""
+        app.config['SIMILARITY_INDEX_DIR'] = str(tmp_path)
+        source = _add_wine('navy', _label('navy'))
+        _add_wine('red', _label('red', box=(10, 200, 60, 290)))
+        build_index(str(tmp_path))
+        _add_wine('navy2', _label('navy', box=(42, 62, 158, 118)))
+
+        response = client.get(f'/api/wines/{source.id}/similar?limit=2')
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['similar'][0]['wine_name'] == 'navy2'
+        assert all(item['id'] != source.id for item in data['similar'])
+
+    def test_similar_without_index_is_bounded(self, app, client, tmp_path):
+        """Test that without an index only the newest rows are scanned, and bad vectors are skipped."""
+        app.config['SIMILARITY_INDEX_DIR'] = str(tmp_path)
+        app.config['SIMILARITY_SCAN_LIMIT'] = 2
+        _add_wine('navy_old', _label('navy'))
+        broken = _add_wine('broken', _label('navy'))
+        broken.label_features = np.ones(FEATURE_DIM - 1, dtype=np.float32).tobytes()
+        db.session.commit()
+        source = _add_wine('navy', _label('navy'))
+
+        response = client.get(f'/api/wines/{source.id}/similar')
+
+        assert response.status_code == 200
+        assert json.loads(response.data)['similar'] == []
+
+    def test_rebuild_switches_builds_atomically(self, app, tmp_path):
+        """Test that each build gets its own directory and readers follow the manifest."""
+        _add_wine('navy', _label('navy'))
+        build_index(str(tmp_path))
+        first = read_manifest(str(tmp_path))['build']
+        index = SimilarityIndex(str(tmp_path))
+        assert len(index.search(extract_features(_label('navy')))) == 1
+
+        _add_wine('red', _label('red'))
+        build_index(str(tmp_path))
+        second = read_manifest(str(tmp_path))['build']
+        assert [wine_id for wine_id, _ in index.search(extract_features(_label('red')), limit=1)] == [2]
+        assert os.path.isdir(tmp_path / first)
+
+        build_index(str(tmp_path))
+        builds = sorted(name for name in os.listdir(tmp_path) if name.startswith('build-'))
+        assert first not in builds and second in builds and len(builds) == 2
+
+    def test_late_commit_with_earlier_timestamp_is_scanned(self, app, client, tmp_path):
+        """Test that the live scan follows change_seq, not date_modified."""
+        app.config['SIMILARITY_INDEX_DIR'] = str(tmp_path)
+        source = _add_wine('navy', _label('navy'))
+        build_index(str(tmp_path))
+        late = _add_wine('navy2', _label('navy', box=(42, 62, 158, 118)))
+        late.date_modified = datetime(2000, 1, 1)
+        db.session.commit()
+
+        response = client.get(f'/api/wines/{source.id}/similar')
+
+        assert [item['wine_name'] for item in json.loads(response.data)['similar']] == ['navy2']
+
+    def test_limit_is_at_least_one(self, app, client, tmp_path):
+        """Test that a negative limit is clamped instead of slicing from the end."""
+        app.config['SIMILARITY_INDEX_DIR'] = str(tmp_path)
+        source = _add_wine('navy', _label('navy'))
+        _add_wine('navy2', _label('navy', box=(42, 62, 158, 118)))
+        _add_wine('navy3', _label('navy', box=(44, 64, 156, 116)))
+
+        response = client.get(f'/api/wines/{source.id}/similar?limit=-1')
+
+        assert response.status_code == 200
+        assert len(json.loads(response.data)['similar']) == 1
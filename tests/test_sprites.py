@@ -0,0 +1,210 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+
+import sprites
+from extensions import db
+from models import Wine
+
+
+@pytest.fixture
+def sprite_dir(app, temp_upload_dir):
+    """Sprite sheets under the temporary upload folder, with a fresh index."""
+    folder = os.path.join(temp_upload_dir, 'sprites')
+    app.extensions['sprites'] = sprites.SpriteIndex(folder)
+    return folder
+
+
+def add_wines(app, count, start=0):
+    """Wines with real thumbnails, one day apart in date_added order."""
+    thumbnail_dir = app.config['THUMBNAIL_FOLDER']
+    base = datetime(2024, 1, 1)
+    wines = []
+    for i in range(start, start + count):
+        name = f'thumb_{i}.jpg'
+        Image.new('RGB', (300, 240), color=(i * 10 % 256, 50, 100)).save(os.path.join(thumbnail_dir, name))
+        wine = Wine(wine_name=f'Wine {i}', vineyard_name='Estate', vintage_year=2015, rating=4,
+                    image_path=f'uploads/{i}.jpg', thumbnail_path=f'uploads/thumbnails/{name}')
+        wine.date_added = base + timedelta(days=i)
+        wines.append(wine)
+    db.session.add_all(wines)
+    db.session.commit()
+    return wines
+
+
+def manifest(folder):
+    with open(os.path.join(folder, sprites.MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+class TestBuildSprites:
+    """Test packing thumbnails into sheets."""
+
+    def test_packs_id_buckets_of_sheet_size(self, app, sprite_dir):
+        """Test that wines are packed by id into sheets of SPRITE_SHEET_SIZE."""
+        wines = add_wines(app, 23)
+
+        report = sprites.build_sprites()
+
+        sheets = manifest(sprite_dir)['sheets']
+        assert report.built == 2 and len(sheets) == 2
+        layouts = sorted((len(sheet['cells']), sheet['columns'], sheet['rows']) for sheet in sheets.values())
+        assert layouts == [(3, 3, 1), (20, 5, 4)]
+        full = next(name for name, sheet in sheets.items() if len(sheet['cells']) == 20)
+        assert [cell[0] for cell in sheets[full]['cells']] == [wine.id for wine in wines[:20]]
+        with Image.open(os.path.join(sprite_dir, full)) as sheet:
+            assert sheet.format == 'WEBP'
+            assert sheet.size == (5 * 300, 4 * 200)
+
+    def test_new_wine_only_rebuilds_newest_sheet(self, app, sprite_dir):
+        """Test that unchanged sheets are kept on a rebuild."""
+        add_wines(app, 23)
+        sprites.build_sprites()
+        add_wines(app, 1, start=23)
+
+        report = sprites.build_sprites()
+
+        assert (report.built, report.kept) == (1, 1)
+
+    def test_deleted_wine_only_rebuilds_its_sheet(self, app, sprite_dir):
+        """Test that deleting an old wine does not shift later wines into other sheets."""
+        app.config['SPRITE_SHEET_SIZE'] = 5
+        wines = add_wines(app, 23)
+        sprites.build_sprites()
+        db.session.delete(wines[0])
+        db.session.commit()
+
+        report = sprites.build_sprites()
+
+        assert (report.built, report.kept) == (1, 4)
+        cells = sorted(len(sheet['cells']) for sheet in manifest(sprite_dir)['sheets'].values())
+        assert cells == [3, 4, 5, 5, 5]
+
+    def test_retired_sheets_are_kept_then_removed(self, app, sprite_dir):
+        """Test that replaced sheets survive one rebuild within the retention window."""
+        add_wines(app, 3)
+        sprites.build_sprites()
+        first = next(iter(manifest(sprite_dir)['sheets']))
+        add_wines(app, 1, start=3)
+
+        sprites.build_sprites()
+        assert os.path.exists(os.path.join(sprite_dir, first))
+        assert first in manifest(sprite_dir)['retired']
+
+        app.config['SPRITE_RETAIN_SECONDS'] = 0
+        report = sprites.build_sprites()
+        assert report.removed == 1
+        assert not os.path.exists(os.path.join(sprite_dir, first))
+
+    def test_build_if_changed_skips_when_nothing_changed(self, app, sprite_dir, monkeypatch):
+        """Test that the worker only rebuilds after the change counter moves."""
+        add_wines(app, 2)
+        seq = sprites.build_if_changed(-1)
+        calls = []
+        monkeypatch.setattr(sprites, 'build_sprites', lambda: calls.append(1))
+
+        assert sprites.build_if_changed(seq) == seq
+        assert calls == []
+
+    def test_build_sprites_command(self, app, runner, sprite_dir):
+        """Test the build-sprites CLI command."""
+        add_wines(app, 2)
+
+        result = runner.invoke(args=['build-sprites'])
+
+        assert result.exit_code == 0
+        assert 'Built 1 sheets' in result.output
+
+
+class TestSpriteCells:
+    """Test looking wines up in the built sheets."""
+
+    def test_cell_positions(self, app, sprite_dir):
+        """Test the CSS for the first and last cell of a full sheet."""
+        wines = add_wines(app, 20)
+        sprites.build_sprites()
+
+        cells = sprites.sprite_cells(wines)
+
+        assert cells[wines[0].id]['position'] == '0% 0%'
+        assert cells[wines[19].id]['position'] == '100% 100%'
+        assert cells[wines[6].id]['position'] == '25% 33.3333%'
+        assert cells[wines[0].id]['size'] == '500% 400%'
+        assert cells[wines[0].id]['url'].startswith('/uploads/sprites/sheet.')
+
+    def test_changed_thumbnail_falls_back(self, app, sprite_dir):
+        """Test that a wine whose thumbnail changed since the build is not drawn from the sheet."""
+        wines = add_wines(app, 2)
+        sprites.build_sprites()
+        wines[0].thumbnail_path = 'uploads/thumbnails/thumb_new.jpg'
+
+        cells = sprites.sprite_cells(wines)
+
+        assert wines[0].id not in cells and wines[1].id in cells
+
+    def test_too_many_sheets_falls_back(self, app, sprite_dir):
+        """Test that wines spread over many sheets use plain thumbnails."""
+        app.config['SPRITE_SHEET_SIZE'] = 1
+        app.config['SPRITE_MAX_SHEETS_PER_PAGE'] = 2
+        wines = add_wines(app, 3)
+        sprites.build_sprites()
+
+        assert len(sprites.sprite_cells(wines[:2])) == 2
+        assert sprites.sprite_cells(wines) == {}
+
+    def test_disabled(self, app, sprite_dir):
+        """Test that SPRITES_ENABLED=False always uses plain thumbnails."""
+        wines = add_wines(app, 2)
+        sprites.build_sprites()
+        app.config['SPRITES_ENABLED'] = False
+
+        assert sprites.sprite_cells(wines) == {}
+
+
+class TestSpritePages:
+    """Test sprite sheets on the list and search pages."""
+
+    def test_list_page_uses_sheet(self, app, client, sprite_dir):
+        """Test that the list page draws cards from the sheet."""
+        add_wines(app, 3)
+        sprites.build_sprites()
+        name = next(iter(manifest(sprite_dir)['sheets']))
+
+        response = client.get('/wines/')
+
+        assert response.status_code == 200
+        assert response.data.count(b'class="sprite-cell"') == 3
+        assert f'/uploads/sprites/{name}'.encode() in response.data
+        assert b'<img src="/uploads/thumbnails/' not in response.data
+
+    def test_list_page_without_sheets(self, app, client, sprite_dir):
+        """Test that the list page falls back to thumbnails before the first build."""
+        add_wines(app, 2)
+
+        response = client.get('/wines/')
+
+        assert b'sprite-cell' not in response.data
+        assert response.data.count(b'<img src="/uploads/thumbnails/') == 2
+
+    def test_search_api_includes_sprite(self, app, client, sprite_dir):
+        """Test that search results carry each wine's sheet cell."""
+        add_wines(app, 2)
+        sprites.build_sprites()
+
+        wines = client.get('/api/search?q=Wine').get_json()['wines']
+
+        assert all(wine['sprite']['url'].startswith('/uploads/sprites/') for wine in wines)
+
+    def test_serves_sheets_immutable(self, app, client, sprite_dir):
+        """Test that sheets are served with a long-lived cache and nothing else is."""
+        add_wines(app, 1)
+        sprites.build_sprites()
+        name = next(iter(manifest(sprite_dir)['sheets']))
+
+        response = client.get(f'/uploads/sprites/{name}')
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        assert client.get(f'/uploads/sprites/{sprites.MANIFEST_NAME}').status_code == 404
@@ -0,0 +1,48 @@
+import startup
+from app import create_app
+
+
+# Generous enough for slow CI machines; the app builds in well under a second
+# once image libraries are loaded lazily
+STARTUP_BUDGET_SECONDS = 3.0
+# Loaded on first image upload or similarity lookup, never by create_app()
+LAZY_PACKAGES = {'PIL', 'pillow_heif', 'numpy'}
+
+IMPORTTIME_SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        900 |     jinja2.utils
+import time:      1000 |       1900 |   jinja2
+import time:        50 |       1950 | flask
+"""
+
+
+class TestStartup:
+    """Test cold-start cost and the tools that report it."""
+
+    def test_parse_importtime(self):
+        """Test that rows keep names, nesting and times."""
+        rows = startup.parse_importtime(IMPORTTIME_SAMPLE)
+        assert [(r['module'], r['depth']) for r in rows] == [
+            ('_io', 1), ('jinja2.utils', 2), ('jinja2', 1), ('flask', 0)
+        ]
+        assert rows[1]['self_us'] == 300 and rows[1]['cumulative_us'] == 900
+        assert startup.by_package(rows) == [('jinja2', 1300), ('_io', 120), ('flask', 50)]
+
+    def test_startup_budget(self):
+        """Test that create_app() stays fast and leaves image libraries unloaded."""
+        seconds, rows = startup.measure_startup('testing')
+        loaded = {row['module'].split('.')[0] for row in rows}
+
+        assert not loaded & LAZY_PACKAGES, f'imported at startup: {loaded & LAZY_PACKAGES}'
+        assert seconds < STARTUP_BUDGET_SECONDS, f'create_app() took {seconds:.2f}s'
+
+    def test_jinja_bytecode_cache(self, monkeypatch, tmp_path):
+        """Test that rendered templates are compiled into the cache directory."""
+        from config import TestingConfig
+        monkeypatch.setattr(TestingConfig, 'JINJA_BYTECODE_CACHE', True)
+        monkeypatch.setattr(TestingConfig, 'JINJA_BYTECODE_CACHE_DIR', str(tmp_path))
+        app = create_app('testing')
+
+        assert app.test_client().get('/about').status_code == 200
+        assert any(tmp_path.iterdir())
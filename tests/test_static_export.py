@@ -0,0 +1,176 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import static_export
+from extensions import db
+from models import Wine
+
+
+def add_wines(count, start=0):
+    wines = [Wine(wine_name=f'Wine {i}', vineyard_name='Estate', vintage_year=2015, rating=4,
+                  image_path=f'uploads/{i}.jpg', thumbnail_path=f'uploads/thumbnails/thumb_{i}.jpg')
+             for i in range(start, start + count)]
+    db.session.add_all(wines)
+    db.session.commit()
+    return wines
+
+
+@pytest.fixture
+def output(tmp_path, temp_upload_dir):
+    with open(os.path.join(temp_upload_dir, 'label.jpg'), 'wb') as f:
+        f.write(b'jpeg')
+    return str(tmp_path / 'site')
+
+
+def read(output, path):
+    with open(os.path.join(output, path), encoding='utf-8') as f:
+        return f.read()
+
+
+class TestUrls:
+    """Test mapping app URLs to exported files."""
+
+    def test_public_url(self):
+        """Test that exported pages get trailing-slash URLs and others are left alone."""
+        assert static_export.public_url('/') == '/'
+        assert static_export.public_url('/gallery') == '/gallery/'
+        assert static_export.public_url('/wines/?page=1') == '/wines/'
+        assert static_export.public_url('/wines/?page=3') == '/wines/page/3/'
+        assert static_export.public_url('/wines/12') == '/wines/12/'
+        assert static_export.public_url('/wines/12/edit') is None
+        assert static_export.public_url('/search') is None
+
+    def test_output_path(self):
+        """Test the file each exported URL is written to."""
+        assert static_export.output_path('/') == 'index.html'
+        assert static_export.output_path('/wines/12') == 'wines/12/index.html'
+        assert static_export.output_path('/api/wines?page=1') == 'api/wines.json'
+        assert static_export.output_path('/api/wines?page=2') == 'api/wines/page/2.json'
+        assert static_export.output_path('/api/stats') == 'api/stats.json'
+
+    def test_rewrite_links(self):
+        """Test that links to exported pages are rewritten in place."""
+        html = '<a href="/wines/?page=2">Next</a> <a href="/wines/add">Add</a> <img src="/uploads/a.jpg">'
+
+        assert static_export.rewrite_links(html) == \
+            '<a href="/wines/page/2/">Next</a> <a href="/wines/add">Add</a> <img src="/uploads/a.jpg">'
+
+
+class TestExportSite:
+    """Test rendering the catalog into a directory."""
+
+    def test_full_export(self, app, output):
+        """Test that pages, JSON, static files and uploads are all written."""
+        wines = add_wines(21)
+
+        report = static_export.export_site(output)
+
+        for path in ('index.html', 'about/index.html', 'gallery/index.html', 'wines/index.html',
+                     'wines/page/2/index.html', f'wines/{wines[0].id}/index.html',
+                     'api/wines.json', 'api/wines/page/2.json', 'api/stats.json',
+                     'static/css/style.css', 'uploads/label.jpg'):
+            assert os.path.exists(os.path.join(output, path)), path
+        assert report.rendered == 8 + 21
+        assert json.loads(read(output, 'api/stats.json'))['total_wines'] == 21
+        assert json.loads(read(output, 'api/wines/page/2.json'))['page'] == 2
+        assert 'href="/wines/page/2/"' in read(output, 'wines/index.html')
+        assert f'href="/wines/{wines[0].id}/"' in read(output, 'gallery/index.html')
+        assert 'csrf_token' not in read(output, f'wines/{wines[0].id}/index.html')
+
+    def test_incremental_export_renders_modified_wines_only(self, app, output):
+        """Test that a second export only re-renders wine pages modified since the first."""
+        wines = add_wines(3)
+        static_export.export_site(output)
+        wine = db.session.get(Wine, wines[1].id)
+        wine.wine_name = 'Renamed'
+        db.session.commit()
+
+        report = static_export.export_site(output)
+
+        assert report.rendered == 6 + 1
+        assert 'Renamed' in read(output, f'wines/{wine.id}/index.html')
+
+    def test_late_commit_with_earlier_timestamp_is_rendered(self, app, output):
+        """Test that a change stamped before the last export but committed after it is picked up."""
+        wines = add_wines(2)
+        static_export.export_site(output)
+        wine = db.session.get(Wine, wines[0].id)
+        wine.wine_name = 'Late Edit'
+        wine.date_modified = datetime(2000, 1, 1)
+        db.session.commit()
+
+        report = static_export.export_site(output)
+
+        assert report.rendered == 6 + 1
+        assert 'Late Edit' in read(output, f'wines/{wine.id}/index.html')
+
+    def test_workers_build_the_current_config(self, app, output, monkeypatch):
+        """Test that pool workers default to the config of the app running the export."""
+        add_wines(3)
+        built = []
+
+        class Pool:
+            def __init__(self, max_workers, initializer, initargs):
+                built.append(initargs)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def map(self, fn, chunks, outputs):
+                return [static_export.render_urls(app.test_client(), urls, out) for urls, out in zip(chunks, outputs)]
+
+        monkeypatch.setattr(static_export, 'ProcessPoolExecutor', Pool)
+        monkeypatch.setattr(static_export, 'RENDER_CHUNK', 2)
+
+        static_export.export_site(output, workers=2)
+
+        assert built == [('testing',)]
+
+    def test_unchanged_pages_are_not_rewritten(self, app, output):
+        """Test that files whose content is unchanged keep their mtime."""
+        add_wines(2)
+        static_export.export_site(output)
+        path = os.path.join(output, 'about', 'index.html')
+        os.utime(path, (0, 0))
+
+        static_export.export_site(output, full=True)
+
+        assert os.path.getmtime(path) == 0
+
+    def test_deleted_wines_and_pages_are_removed(self, app, output):
+        """Test that pages of deleted wines and surplus list pages are removed."""
+        wines = add_wines(21)
+        static_export.export_site(output)
+        db.session.delete(db.session.get(Wine, wines[0].id))
+        db.session.commit()
+        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], 'label.jpg'))
+
+        static_export.export_site(output)
+
+        assert not os.path.exists(os.path.join(output, 'wines', str(wines[0].id)))
+        assert not os.path.exists(os.path.join(output, 'wines', 'page', '2'))
+        assert not os.path.exists(os.path.join(output, 'api', 'wines', 'page', '2.json'))
+        assert not os.path.exists(os.path.join(output, 'uploads', 'label.jpg'))
+
+    def test_template_change_rerenders_everything(self, app, output, monkeypatch):
+        """Test that a new site version invalidates every wine page."""
+        add_wines(2)
+        static_export.export_site(output)
+        monkeypatch.setattr(static_export, 'site_version', lambda app: 'changed')
+
+        assert static_export.export_site(output).rendered == 6 + 2
+
+    def test_export_static_command(self, app, runner, output):
+        """Test the export-static CLI command."""
+        add_wines(1)
+
+        result = runner.invoke(args=['export-static', output, '--workers', '1'])
+
+        assert result.exit_code == 0
+        assert 'Rendered 7 pages' in result.output
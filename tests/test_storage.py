@@ -0,0 +1,160 @@
+import os
+import time
+from datetime import datetime, timedelta, UTC
+import pytest
+from models import Wine, ImageUpload, PendingFileDelete
+from extensions import db
+from storage import BloomFilter, collect_orphans, queue_image_deletion, drain_pending_deletes
+
+
+def _touch(path, size=10, age=0):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+
+
+class TestImageGarbageCollection:
+    """Test orphaned upload cleanup."""
+
+    def test_bloom_filter_membership(self):
+        """Test that added keys are always reported present."""
+        bloom = BloomFilter(1000)
+        keys = [f'/uploads/{i}.jpg' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        assert all(key in bloom for key in keys)
+        false_positives = sum(f'/other/{i}.jpg' in bloom for i in range(1000))
+        assert false_positives < 20
+
+    def test_collect_orphans_removes_unreferenced(self, app, temp_upload_dir, sample_wine):
+        """Test that only unreferenced, expired files are removed."""
+        thumbs = app.config['THUMBNAIL_FOLDER']
+        _touch(os.path.join(temp_upload_dir, 'test_image.jpg'), age=7200)
+        _touch(os.path.join(thumbs, 'thumb_test_image.jpg'), age=7200)
+        _touch(os.path.join(temp_upload_dir, 'orphan.jpg'), size=100, age=7200)
+        _touch(os.path.join(thumbs, 'thumb_orphan.jpg'), size=50, age=7200)
+
+        report = collect_orphans(grace_period=3600)
+
+        assert report.orphaned == 2
+        assert report.removed == 2
+        assert report.bytes_reclaimed == 150
+        assert os.path.exists(os.path.join(temp_upload_dir, 'test_image.jpg'))
+        assert os.path.exists(os.path.join(thumbs, 'thumb_test_image.jpg'))
+        assert not os.path.exists(os.path.join(temp_upload_dir, 'orphan.jpg'))
+
+    def test_collect_orphans_respects_grace_period(self, app, temp_upload_dir):
+        """Test that recent files are kept even when unreferenced."""
+        _touch(os.path.join(temp_upload_dir, 'in_flight.jpg'))
+
+        report = collect_orphans(grace_period=3600)
+
+        assert report.orphaned == 0
+        assert os.path.exists(os.path.join(temp_upload_dir, 'in_flight.jpg'))
+
+    def test_collect_orphans_bloom_index(self, app, temp_upload_dir, sample_wine):
+        """Test that the Bloom filter index keeps referenced files."""
+        app.config['IMAGE_GC_BLOOM_THRESHOLD'] = 0
+        _touch(os.path.join(temp_upload_dir, 'test_image.jpg'), age=7200)
+        _touch(os.path.join(temp_upload_dir, 'orphan.jpg'), age=7200)
+
+        report = collect_orphans(grace_period=3600)
+
+        assert os.path.exists(os.path.join(temp_upload_dir, 'test_image.jpg'))
+        assert not os.path.exists(os.path.join(temp_upload_dir, 'orphan.jpg'))
+        assert report.removed == 1
+
+    def test_collect_orphans_expires_unclaimed_uploads(self, app, temp_upload_dir):
+        """Test that bulk-API uploads older than the grace period are forgotten."""
+        db.session.add_all([
+            ImageUpload(image_path='uploads/old.jpg', thumbnail_path='uploads/thumbnails/thumb_old.jpg',
+                        created_at=datetime.now(UTC) - timedelta(hours=2)),
+            ImageUpload(image_path='uploads/new.jpg', thumbnail_path='uploads/thumbnails/thumb_new.jpg'),
+        ])
+        db.session.commit()
+
+        collect_orphans(grace_period=3600)
+
+        assert [u.image_path for u in ImageUpload.query.all()] == ['uploads/new.jpg']
+        assert [p.image_path for p in PendingFileDelete.query.all()] == ['uploads/old.jpg']
+
+    def test_collect_orphans_keeps_files_of_pending_uploads(self, app, temp_upload_dir):
+        """Test that an upload's files stay on disk for as long as its record does."""
+        _touch(os.path.join(temp_upload_dir, 'pending.jpg'), age=7200)
+        db.session.add(ImageUpload(image_path='uploads/pending.jpg',
+                                   thumbnail_path='uploads/thumbnails/thumb_pending.jpg'))
+        db.session.commit()
+
+        report = collect_orphans(grace_period=3600)
+
+        assert report.orphaned == 0
+        assert os.path.exists(os.path.join(temp_upload_dir, 'pending.jpg'))
+
+    def test_gc_images_command_dry_run(self, app, runner, temp_upload_dir):
+        """Test the gc-images CLI command in dry-run mode."""
+        _touch(os.path.join(temp_upload_dir, 'orphan.jpg'), age=7200)
+
+        result = runner.invoke(args=['gc-images', '--grace-hours', '1', '--dry-run'])
+
+        assert result.exit_code == 0
+        assert 'Would remove 1 files' in result.output
+        assert os.path.exists(os.path.join(temp_upload_dir, 'orphan.jpg'))
+
+
+class TestDeferredDeletes:
+    """Test the transactional file deletion queue."""
+
+    def test_delete_wine_defers_file_removal(self, app, client, temp_upload_dir, sample_wine):
+        """Test that deleting a wine queues its files instead of removing them."""
+        image = os.path.join(temp_upload_dir, 'test_image.jpg')
+        _touch(image)
+
+        response = client.post(f'/wines/{sample_wine.id}/delete')
+
+        assert response.status_code == 302
+        assert os.path.exists(image)
+        assert PendingFileDelete.query.count() == 1
+
+        assert drain_pending_deletes() == 1
+        assert not os.path.exists(image)
+        assert PendingFileDelete.query.count() == 0
+
+    def test_rollback_discards_queued_deletes(self, app, temp_upload_dir, sample_wine):
+        """Test that a rolled back transaction keeps the row and its files."""
+        image = os.path.join(temp_upload_dir, 'test_image.jpg')
+        _touch(image)
+
+        queue_image_deletion(sample_wine.image_path, sample_wine.thumbnail_path)
+        db.session.delete(sample_wine)
+        db.session.rollback()
+
+        assert drain_pending_deletes() == 0
+        assert os.path.exists(image)
+        assert Wine.query.count() == 1
+
+    def test_drain_keeps_files_still_referenced(self, app, client, temp_upload_dir, sample_wine_data):
+        """Test that deleting one of several wines sharing a label keeps the label."""
+        image = os.path.join(temp_upload_dir, 'test_image.jpg')
+        _touch(image)
+        wines = [Wine(**sample_wine_data) for _ in range(2)]
+        db.session.add_all(wines)
+        db.session.commit()
+
+        client.post(f'/wines/{wines[0].id}/delete')
+        assert drain_pending_deletes() == 1
+        assert os.path.exists(image)
+
+        client.post(f'/wines/{wines[1].id}/delete')
+        assert drain_pending_deletes() == 1
+        assert not os.path.exists(image)
+
+    def test_drain_in_batches(self, app, temp_upload_dir):
+        """Test that the queue drains completely across several batches."""
+        for i in range(5):
+            queue_image_deletion(f'uploads/{i}.jpg', None)
+        db.session.commit()
+
+        assert drain_pending_deletes(batch_size=2) == 5
+        assert PendingFileDelete.query.count() == 0
@@ -4,7 +4,12 @@ import tempfile
 from PIL import Image
 from werkzeug.datastructures import FileStorage
 from io import BytesIO
-from utils import allowed_file, save_and_process_image, delete_image_files
+import base64
+from app import create_app
+from config import TestingConfig
+from models import Wine
+from extensions import db
+from utils import allowed_file, save_and_process_image, delete_image_files, make_placeholder, get_image_settings
 
 
 class TestImageUtils:
@@ -234,4 +239,111 @@ class TestImageUtils:
             image_path, thumbnail_path = save_and_process_image(file)
             
             assert image_path is None
-            assert thumbnail_path is None
\ No newline at end of file
+            assert thumbnail_path is None
+
+
+class TestImageSettings:
+    """Test the IMAGE_OPTIMIZE and IMAGE_RESAMPLING settings."""
+
+    def test_defaults(self, app):
+        """Test that images are optimized and resized with Lanczos by default."""
+        settings = get_image_settings()
+        assert settings['optimize'] is True
+        assert settings['resample'] == Image.Resampling.LANCZOS
+
+    @pytest.mark.parametrize('name, resample', [
+        ('bicubic', Image.Resampling.BICUBIC),
+        ('bilinear', Image.Resampling.BILINEAR),
+        ('box', Image.Resampling.BOX),
+    ])
+    def test_resampling_filters(self, app, name, resample):
+        """Test that each IMAGE_RESAMPLING name maps to its Pillow filter."""
+        app.config['IMAGE_RESAMPLING'] = name
+        assert get_image_settings()['resample'] == resample
+
+    def test_unknown_resampling_refuses_to_start(self, monkeypatch):
+        """Test that a misspelt IMAGE_RESAMPLING stops create_app instead of failing uploads."""
+        monkeypatch.setattr(TestingConfig, 'IMAGE_RESAMPLING', 'lanczo')
+        with pytest.raises(ValueError, match='lanczo'):
+            create_app('testing')
+
+    def test_resampling_name_is_case_insensitive(self, monkeypatch):
+        """Test that the filter name is normalised when the app is built."""
+        monkeypatch.setattr(TestingConfig, 'IMAGE_RESAMPLING', ' Bicubic ')
+        app = create_app('testing')
+        assert app.config['IMAGE_RESAMPLING'] == 'bicubic'
+        with app.app_context():
+            assert get_image_settings()['resample'] == Image.Resampling.BICUBIC
+
+    def test_pipeline_uses_settings(self, app, temp_upload_dir, monkeypatch):
+        """Test that uploads are resized and saved with the configured settings."""
+        app.config['IMAGE_OPTIMIZE'] = False
+        app.config['IMAGE_RESAMPLING'] = 'box'
+        calls = {'thumbnail': [], 'save': []}
+        original_thumbnail, original_save = Image.Image.thumbnail, Image.Image.save
+
+        def thumbnail(img, size, resample=Image.Resampling.BICUBIC, *args, **kwargs):
+            calls['thumbnail'].append(resample)
+            return original_thumbnail(img, size, resample, *args, **kwargs)
+
+        def save(img, fp, format=None, **params):
+            calls['save'].append(params.get('optimize'))
+            return original_save(img, fp, format, **params)
+
+        monkeypatch.setattr(Image.Image, 'thumbnail', thumbnail)
+        monkeypatch.setattr(Image.Image, 'save', save)
+        img_io = BytesIO()
+        Image.new('RGB', (800, 600), color='blue').save(img_io, 'JPEG')
+        img_io.seek(0)
+        calls['save'].clear()
+
+        save_and_process_image(FileStorage(stream=img_io, filename='wine.jpg', content_type='image/jpeg'))
+
+        assert calls['thumbnail'] == [Image.Resampling.BOX, Image.Resampling.BOX]
+        assert calls['save'] == [False, False]
+
+
+class TestPlaceholders:
+    """Test the inline low-quality image placeholders."""
+
+    def test_make_placeholder(self):
+        """Test that the placeholder is a tiny JPEG data URI."""
+        placeholder = make_placeholder(Image.new('RGBA', (600, 900), color='purple'))
+        prefix = 'data:image/jpeg;base64,'
+        assert placeholder.startswith(prefix)
+        assert len(placeholder) < 1024
+        img = Image.open(BytesIO(base64.b64decode(placeholder[len(prefix):])))
+        assert max(img.size) == 16
+
+    def test_metadata_includes_placeholder(self, app, temp_upload_dir):
+        """Test that processing an upload derives the placeholder with the other metadata."""
+        img_io = BytesIO()
+        Image.new('RGB', (800, 600), color='blue').save(img_io, 'JPEG')
+        img_io.seek(0)
+        metadata = {}
+        save_and_process_image(FileStorage(stream=img_io, filename='wine.jpg'), metadata)
+        assert metadata['placeholder'].startswith('data:image/jpeg;base64,')
+
+    def test_rendered_inline(self, client, sample_wine):
+        """Test that list views and the API carry the placeholder."""
+        db.session.get(Wine, sample_wine.id).placeholder = 'data:image/jpeg;base64,AAAA'
+        db.session.commit()
+
+        assert b"background-image: url('data:image/jpeg;base64,AAAA')" in client.get('/wines/').data
+        assert b"background-image: url('data:image/jpeg;base64,AAAA')" in client.get('/gallery').data
+        assert client.get(f'/api/wines/{sample_wine.id}').get_json()['placeholder'] == 'data:image/jpeg;base64,AAAA'
+
+    def test_backfill_command(self, app, runner, temp_upload_dir, sample_wine):
+        """Test that the backfill command fills in existing wines and marks them changed."""
+        thumb = os.path.join(app.config['THUMBNAIL_FOLDER'], 'thumb_test_image.jpg')
+        Image.new('RGB', (300, 200), color='green').save(thumb, 'JPEG')
+        seq = sample_wine.change_seq
+
+        result = runner.invoke(args=['backfill-placeholders', '--workers', '1'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Backfilled 1 placeholders' in result.output
+        db.session.expire_all()
+        wine = db.session.get(Wine, sample_wine.id)
+        assert wine.placeholder.startswith('data:image/jpeg;base64,')
+        assert wine.change_seq > seq
@@ -0,0 +1,77 @@
+import importlib
+import os
+import runpy
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app
+from config import TestingConfig
+from extensions import db
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def wsgi(monkeypatch):
+    """The wsgi module, imported fresh with the testing config."""
+    monkeypatch.setenv('FLASK_ENV', 'testing')
+    monkeypatch.delitem(sys.modules, 'wsgi', raising=False)
+    return importlib.import_module('wsgi')
+
+
+class TestProductionEntryPoint:
+    """Test the pre-fork server setup."""
+
+    def test_workers_start_after_fork(self, wsgi, monkeypatch):
+        """Test that the preloaded app starts no threads until init_worker runs."""
+        app = create_app('testing')
+        file_worker = app.extensions['file_worker']
+        monkeypatch.setitem(app.config, 'TESTING', False)
+        assert not file_worker.running
+
+        with app.app_context():
+            pool = db.engine.pool
+        wsgi.init_worker(app)
+        try:
+            assert file_worker.running
+            with app.app_context():
+                assert db.engine.pool is not pool
+        finally:
+            wsgi.shutdown_worker(app)
+        assert not file_worker.running
+
+    def test_image_libraries_loaded_before_fork(self):
+        """Test that importing the entry point loads the libraries create_app() defers."""
+        code = ('import sys, wsgi; '
+                "print(all(m in sys.modules for m in ('PIL.Image', 'pillow_heif', 'numpy')))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                                env={**os.environ, 'FLASK_ENV': 'testing'}, timeout=60)
+        assert result.stdout.strip() == 'True', result.stderr
+
+    def test_create_app_starts_no_worker(self, monkeypatch):
+        """Test that building an app (as every CLI command does) starts no thread."""
+        monkeypatch.setattr(TestingConfig, 'TESTING', False)
+        app = create_app('testing')
+        assert app.extensions['file_worker'].enabled
+        assert not app.extensions['file_worker'].running
+
+    def test_db_upgrade(self, app, runner):
+        """Test that tables are created by the separate migration step."""
+        db.drop_all()
+        result = runner.invoke(args=['db', 'upgrade'])
+        assert result.exit_code == 0, result.output
+        assert {'wines', 'alembic_version'} <= set(inspect(db.engine).get_table_names())
+
+    def test_gunicorn_config(self, monkeypatch, tmp_path):
+        """Test that the server config preloads and recycles workers."""
+        monkeypatch.setenv('WEB_CONCURRENCY', '3')
+        monkeypatch.setenv('METRICS_MULTIPROC_DIR', str(tmp_path))
+        settings = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+        assert settings['metrics_dir'] == str(tmp_path)
+        assert settings['workers'] == 3
+        assert settings['preload_app'] is True
+        assert settings['max_requests'] > 0 and settings['max_requests_jitter'] > 0
@@ -1,13 +1,72 @@
+import base64
+import io
 import os
+import threading
 import uuid
-from PIL import Image, ImageOps
 from werkzeug.utils import secure_filename
 from flask import current_app
-from config import Config
-import pillow_heif
+from config import Config, RESAMPLING_FILTERS
+from admission import upload_gate, estimate_decode_cost, UploadsBusy
+from metrics import timed
 
 
-pillow_heif.register_heif_opener()
+# Pillow, pillow_heif and numpy (via similarity) are imported on first use, so
+# workers and CLI commands that never process an image don't pay for them
+_heif_lock = threading.Lock()
+_heif_registered = False
+
+
+def load_image_libraries():
+    """Import Pillow with the HEIF opener registered; returns ``(Image, ImageOps)``."""
+    global _heif_registered
+    from PIL import Image, ImageOps
+
+    if not _heif_registered:
+        with _heif_lock:
+            if not _heif_registered:
+                import pillow_heif
+                pillow_heif.register_heif_opener()
+                _heif_registered = True
+    return Image, ImageOps
+
+
+def get_upload_folders():
+    """Return the (upload, thumbnail) folders for the active app, or Config defaults."""
+    if current_app:
+        return (current_app.config.get('UPLOAD_FOLDER', Config.UPLOAD_FOLDER),
+                current_app.config.get('THUMBNAIL_FOLDER', Config.THUMBNAIL_FOLDER))
+    return Config.UPLOAD_FOLDER, Config.THUMBNAIL_FOLDER
+
+
+def get_image_settings():
+    """Image pipeline settings from the active app, falling back to Config."""
+    from PIL import Image
+
+    source = current_app.config if current_app else {}
+
+    def setting(name):
+        return source.get(name, getattr(Config, name))
+
+    # Validated and lower-cased by Config.init_app
+    resampling = setting('IMAGE_RESAMPLING')
+    return {
+        'image_size': setting('IMAGE_SIZE'),
+        'thumbnail_size': setting('THUMBNAIL_SIZE'),
+        'image_quality': setting('IMAGE_QUALITY'),
+        'thumbnail_quality': setting('THUMBNAIL_QUALITY'),
+        'optimize': setting('IMAGE_OPTIMIZE'),
+        'resample': getattr(Image.Resampling, RESAMPLING_FILTERS[resampling]),
+    }
+
+
+def resolve_image_path(image_path, thumbnail=False):
+    """Map a stored ``uploads/...`` path to its location on disk."""
+    upload_folder, thumbnail_folder = get_upload_folders()
+    if thumbnail and image_path.startswith('uploads/thumbnails/'):
+        return os.path.join(thumbnail_folder, image_path[len('uploads/thumbnails/'):])
+    if not thumbnail and image_path.startswith('uploads/'):
+        return os.path.join(upload_folder, image_path[len('uploads/'):])
+    return image_path
 
 
 def allowed_file(filename):
@@ -15,10 +74,20 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 
-def save_and_process_image(file):
+def save_and_process_image(file, metadata=None):
+    """Store a resized image and thumbnail; returns their ``uploads/`` paths.
+
+    If ``metadata`` is a dict it is filled with values derived from the
+    decoded label (``label_hash`` and ``label_features``), so callers get them without a
+    second decode.
+    """
     if not file or not allowed_file(file.filename):
         return None, None
     
+    Image, ImageOps = load_image_libraries()
+    from label_index import dhash
+    from similarity import extract_features
+    
     filename = secure_filename(file.filename)
     unique_filename = f"{uuid.uuid4()}_{filename}"
     
@@ -26,30 +95,54 @@ def save_and_process_image(file):
     if ext in ['heic', 'heif', 'png']:
         unique_filename = unique_filename.rsplit('.', 1)[0] + '.jpg'
     
-    image_path = os.path.join(Config.UPLOAD_FOLDER, unique_filename)
+    upload_folder, thumbnail_folder = get_upload_folders()
+    settings = get_image_settings()
+    image_path = os.path.join(upload_folder, unique_filename)
     thumbnail_filename = f"thumb_{unique_filename}"
-    thumbnail_path = os.path.join(Config.THUMBNAIL_FOLDER, thumbnail_filename)
+    thumbnail_path = os.path.join(thumbnail_folder, thumbnail_filename)
     
     try:
         img = Image.open(file.stream)
         
-        # Apply EXIF orientation if present
-        img = ImageOps.exif_transpose(img)
-        
-        if img.mode in ('RGBA', 'LA', 'P'):
-            img = img.convert('RGB')
-        
-        img_copy = img.copy()
-        img.thumbnail(Config.IMAGE_SIZE, Image.Resampling.LANCZOS)
-        img.save(image_path, 'JPEG', quality=Config.IMAGE_QUALITY, optimize=True)
-        
-        img_copy.thumbnail(Config.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-        img_copy.save(thumbnail_path, 'JPEG', quality=Config.THUMBNAIL_QUALITY, optimize=True)
+        # Image.open only reads the header, so the decode cost is known
+        # before any pixels are loaded.
+        with upload_gate.admit(estimate_decode_cost(img)):
+            with timed('decode'):
+                img.load()
+                # Apply EXIF orientation if present
+                img = ImageOps.exif_transpose(img)
+                
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGB')
+            
+            with timed('resize'):
+                img.thumbnail(settings['image_size'], settings['resample'])
+            with timed('encode'):
+                img.save(image_path, 'JPEG', quality=settings['image_quality'],
+                         optimize=settings['optimize'])
+            
+            # Derive the thumbnail from the resized image rather than a copy
+            # of the full decode, so only one full-size bitmap is ever held.
+            with timed('resize'):
+                thumb = img.copy()
+                thumb.thumbnail(settings['thumbnail_size'], settings['resample'])
+            with timed('encode'):
+                thumb.save(thumbnail_path, 'JPEG', quality=settings['thumbnail_quality'],
+                           optimize=settings['optimize'])
+            
+            if metadata is not None:
+                with timed('analyze'):
+                    metadata['label_hash'] = dhash(thumb)
+                    metadata['label_features'] = extract_features(thumb).tobytes()
+                    metadata['placeholder'] = make_placeholder(thumb)
         
         return f"uploads/{unique_filename}", f"uploads/thumbnails/{thumbnail_filename}"
     
+    except UploadsBusy:
+        raise
     except Exception as e:
-        print(f"Error processing image: {e}")
+        if current_app:
+            current_app.logger.warning("Error processing image: %s", e)
         if os.path.exists(image_path):
             os.remove(image_path)
         if os.path.exists(thumbnail_path):
@@ -57,38 +150,52 @@ def save_and_process_image(file):
         return None, None
 
 
-def delete_image_files(image_path, thumbnail_path):
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 50
+
+
+def make_placeholder(img, size=PLACEHOLDER_SIZE):
+    """A tiny JPEG of ``img`` as a ``data:`` URI (typically well under 1 KB).
+
+    Pages inline it as the background of the image box, so a blurred preview
+    shows before the real image loads, without another request.
+    """
+    small = img.convert('RGB')
+    small.thumbnail((size, size))
+    buffer = io.BytesIO()
+    small.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def placeholder_for_file(path):
+    """Placeholder for an image on disk, or None if it cannot be read.
+
+    Top-level so it can be used with a process pool.
+    """
+    Image, _ = load_image_libraries()
     try:
-        # Get folders from app config if in app context, otherwise use Config
-        if current_app:
-            upload_folder = current_app.config.get('UPLOAD_FOLDER', Config.UPLOAD_FOLDER)
-            thumbnail_folder = current_app.config.get('THUMBNAIL_FOLDER', Config.THUMBNAIL_FOLDER)
-        else:
-            upload_folder = Config.UPLOAD_FOLDER
-            thumbnail_folder = Config.THUMBNAIL_FOLDER
-            
-        if image_path:
-            # Handle both relative and absolute paths
-            if image_path.startswith('uploads/'):
-                # Remove 'uploads/' prefix and join with UPLOAD_FOLDER
-                filename = image_path.replace('uploads/', '')
-                full_path = os.path.join(upload_folder, filename)
-            else:
-                full_path = image_path
-            
-            if os.path.exists(full_path):
-                os.remove(full_path)
-        
-        if thumbnail_path:
-            # Handle both relative and absolute paths
-            if thumbnail_path.startswith('uploads/thumbnails/'):
-                # Remove prefix and join with THUMBNAIL_FOLDER
-                filename = thumbnail_path.replace('uploads/thumbnails/', '')
-                full_path = os.path.join(thumbnail_folder, filename)
-            else:
-                full_path = thumbnail_path
-                
+        with Image.open(path) as img:
+            return make_placeholder(img)
+    except Exception:
+        return None
+
+
+def delete_image_files(image_path, thumbnail_path):
+    """Remove an image and its thumbnail; returns False if either removal failed.
+
+    Failures are logged rather than raised so a missing file never blocks a
+    database change. Anything left behind is picked up by ``flask gc-images``.
+    """
+    ok = True
+    for path, thumbnail in ((image_path, False), (thumbnail_path, True)):
+        if not path:
+            continue
+        full_path = resolve_image_path(path, thumbnail=thumbnail)
+        try:
             if os.path.exists(full_path):
                 os.remove(full_path)
-    except Exception as e:
-        print(f"Error deleting image files: {e}")
\ No newline at end of file
+        except OSError as e:
+            ok = False
+            if current_app:
+                current_app.logger.warning("Error deleting image file %s: %s", full_path, e)
+    return ok
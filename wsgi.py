@@ -0,0 +1,54 @@
+"""Production WSGI entry point.
+
+    flask --app wsgi db upgrade
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is built once in the server's master process (``preload_app``) and
+shared with the workers copy-on-write. Anything that cannot cross a fork
+(pooled database connections and background threads) is set up per worker
+in :func:`init_worker`, which ``gunicorn.conf.py`` calls from ``post_fork``.
+
+``create_app()`` leaves Pillow, pillow_heif and numpy unimported so CLI
+commands start fast; they are loaded here instead, before the fork, so the
+workers share one copy rather than each importing its own on first use.
+"""
+import os
+
+from app import create_app
+from extensions import db
+from utils import load_image_libraries
+
+
+app = create_app(os.environ.get('FLASK_ENV', 'production'))
+load_image_libraries()
+import similarity  # noqa: E402,F401  (numpy)
+
+
+def _engines(app):
+    with app.app_context():
+        yield db.engine
+    replicas = app.extensions.get('db_replicas')
+    if replicas is not None:
+        yield from replicas.engines
+
+
+def init_worker(app=app):
+    """Per-process setup, run in each worker right after it is forked."""
+    # Connections the master may have opened belong to it; close=False drops
+    # them from this process's pool without closing the parent's sockets
+    for engine in _engines(app):
+        engine.dispose(close=False)
+    file_worker = app.extensions['file_worker']
+    if file_worker.enabled:
+        file_worker.start()
+    metrics_store = app.extensions.get('metrics_store')
+    if metrics_store is not None:
+        metrics_store.start(app.extensions.get('metrics_collectors', []))
+
+
+def shutdown_worker(app=app, timeout=10):
+    """Let the background threads finish their current batch before exiting."""
+    app.extensions['file_worker'].stop(timeout=timeout)
+    metrics_store = app.extensions.get('metrics_store')
+    if metrics_store is not None:
+        metrics_store.stop()